@@ -1,11 +1,21 @@
-from django.contrib import admin
+from django import forms
+from django.conf import settings
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.db.models import Sum
+from django.http import FileResponse, Http404
+from django.template.response import TemplateResponse
 from django.utils.html import format_html
-from .models import Customer, Product, Order, OrderItem, Payment, StockAlert
+from .models import Customer, Product, Order, OrderItem, Payment, StockAlert, NumberSequence
+from .ordering import OutOfStock, change_order_status, order_quantities, set_stock_levels, stock_shortages
+from .profiling import capture_path, list_captures, load_capture
 
 
 @admin.register(Customer)
 class CustomerAdmin(admin.ModelAdmin):
-    list_display = ['customer_id', 'first_name', 'last_name', 'email', 'phone', 'created_at', 'get_total_orders']
+    list_display = ['customer_id', 'first_name', 'last_name', 'email', 'phone', 'created_at', 'get_total_orders',
+                    'get_total_spent']
+    list_select_related = ['summary']
     list_filter = ['created_at', 'city', 'state']
     search_fields = ['first_name', 'last_name', 'email', 'phone']
     readonly_fields = ['customer_id', 'created_at', 'updated_at']
@@ -24,12 +34,41 @@ class CustomerAdmin(admin.ModelAdmin):
     )
     
     def get_total_orders(self, obj):
-        return obj.get_total_orders()
+        summary = getattr(obj, 'summary', None)
+        return summary.order_count if summary else 0
     get_total_orders.short_description = 'Total Orders'
+    get_total_orders.admin_order_field = 'summary__order_count'
+    
+    def get_total_spent(self, obj):
+        summary = getattr(obj, 'summary', None)
+        return f"₱{summary.total_spent if summary else 0:,.2f}"
+    get_total_spent.short_description = 'Total Spent'
+    get_total_spent.admin_order_field = 'summary__total_spent'
+
+
+class ProductAdminForm(forms.ModelForm):
+    class Meta:
+        model = Product
+        fields = '__all__'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Post back the stock level the admin was shown, so a change is
+        # measured against it rather than against the row as it is now
+        self.fields['stock_quantity'].show_hidden_initial = True
+
+    def shown_stock_quantity(self):
+        field = self.fields['stock_quantity']
+        value = self.data.get(self.add_initial_prefix('stock_quantity'))
+        try:
+            return field.to_python(value) if value not in (None, '') else self.initial['stock_quantity']
+        except forms.ValidationError:
+            return self.initial['stock_quantity']
 
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
+    form = ProductAdminForm
     list_display = ['product_id', 'name', 'sku', 'category', 'price', 'stock_quantity', 
                     'get_stock_status', 'is_active', 'updated_at']
     list_filter = ['category', 'is_active', 'created_at']
@@ -53,6 +92,30 @@ class ProductAdmin(admin.ModelAdmin):
         }),
     )
     
+    def save_model(self, request, obj, form, change):
+        """
+        Write only the changed fields, then check for stock alerts.
+
+        Saving the whole row would put back the stock level shown in the
+        form, undoing orders placed meanwhile. A changed stock level is
+        applied as the difference from the level shown, through
+        set_stock_levels.
+        """
+        if not change:
+            super().save_model(request, obj, form, change)
+            StockAlert.check_and_create_alerts([obj.pk])
+            return
+        fields = [name for name in form.changed_data if name != 'stock_quantity']
+        if fields:
+            obj.save(update_fields=fields + ['updated_at'])
+        if 'stock_quantity' in form.changed_data:
+            delta = obj.stock_quantity - form.shown_stock_quantity()
+            result = set_stock_levels([{'product_id': obj.pk, 'delta': delta}])[0]
+            if not result['success']:
+                self.message_user(request, f"Stock not changed: {result['message']}", level=messages.ERROR)
+        else:
+            StockAlert.check_and_create_alerts([obj.pk])
+    
     def get_stock_status(self, obj):
         status = obj.get_stock_status()
         if status == "Out of Stock":
@@ -66,11 +129,7 @@ class ProductAdmin(admin.ModelAdmin):
             color, status
         )
     get_stock_status.short_description = 'Stock Status'
-    
-    def save_model(self, request, obj, form, change):
-        """Check for stock alerts after saving"""
-        super().save_model(request, obj, form, change)
-        StockAlert.check_and_create_alerts()
+
 
 
 class OrderItemInline(admin.TabularInline):
@@ -86,8 +145,25 @@ class OrderItemInline(admin.TabularInline):
     get_total.short_description = 'Total'
 
 
+class OrderAdminForm(forms.ModelForm):
+    class Meta:
+        model = Order
+        fields = '__all__'
+
+    def clean_status(self):
+        """A cancelled order can only be reopened while its items are in stock"""
+        status = self.cleaned_data['status']
+        order = self.instance
+        if order.pk and order.status == 'cancelled' and status != 'cancelled':
+            shortages = stock_shortages(order_quantities(order))
+            if shortages:
+                raise forms.ValidationError(str(OutOfStock(shortages)))
+        return status
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
+    form = OrderAdminForm
     list_display = ['order_number', 'customer', 'status', 'get_order_total', 'get_total_items', 
                     'created_at']
     list_filter = ['status', 'created_at']
@@ -112,9 +188,27 @@ class OrderAdmin(admin.ModelAdmin):
         return f"₱{obj.total:,.2f}"
     get_order_total.short_description = 'Total'
     
+    def get_queryset(self, request):
+        # Item counts for the whole changelist page in the same query
+        return super().get_queryset(request).annotate(total_items=Sum('items__quantity'))
+    
     def get_total_items(self, obj):
-        return obj.get_total_items()
+        return obj.total_items or 0
     get_total_items.short_description = 'Total Items'
+    get_total_items.admin_order_field = 'total_items'
+    
+    def save_model(self, request, obj, form, change):
+        """Cancelling/reopening an order releases/reserves its stock"""
+        if change and 'status' in form.changed_data:
+            try:
+                change_order_status(obj, obj.status)
+            except OutOfStock as e:
+                # Stock ran out after validation: keep the stored status, which
+                # calculate_totals() in save_formset writes back with the totals
+                obj.status = form.initial['status']
+                self.message_user(request, f'Status not changed: {e}', level=messages.ERROR)
+        else:
+            super().save_model(request, obj, form, change)
     
     def save_formset(self, request, form, formset, change):
         """Recalculate totals after saving order items"""
@@ -161,3 +255,52 @@ class StockAlertAdmin(admin.ModelAdmin):
     def has_add_permission(self, request):
         # Prevent manual creation of alerts
         return False
+
+
+@admin.register(NumberSequence)
+class NumberSequenceAdmin(admin.ModelAdmin):
+    list_display = ['name', 'last_value', 'updated_at']
+    search_fields = ['name']
+    readonly_fields = ['updated_at']
+
+
+# ========== PROFILER CAPTURES (see pages/profiling.py) ==========
+
+def _superuser_only(request):
+    if not request.user.is_superuser:
+        raise PermissionDenied
+
+
+def profile_captures_view(request):
+    """Recent ?profile=1 captures, newest first"""
+    _superuser_only(request)
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Profiler captures',
+        'captures': list_captures(),
+        'max_captures': getattr(settings, 'PROFILE_MAX_CAPTURES', 20),
+    }
+    return TemplateResponse(request, 'admin/profile_captures.html', context)
+
+
+def profile_capture_view(request, capture_id):
+    """Top cumulative functions and the SQL log of one capture"""
+    _superuser_only(request)
+    capture = load_capture(capture_id)
+    if capture is None:
+        raise Http404('No such capture')
+    context = {
+        **admin.site.each_context(request),
+        'title': f"{capture['method']} {capture['path']}",
+        'capture': capture,
+    }
+    return TemplateResponse(request, 'admin/profile_capture.html', context)
+
+
+def profile_download_view(request, capture_id):
+    """The pstats dump, for snakeviz, `python -m pstats` and the like"""
+    _superuser_only(request)
+    path = capture_path(capture_id, '.prof')
+    if not path.is_file():
+        raise Http404('No such capture')
+    return FileResponse(path.open('rb'), as_attachment=True, filename=path.name)
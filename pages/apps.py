@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class PagesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'pages'
+
+    def ready(self):
+        from . import db_tuning, signals  # noqa: F401
+        from .triggers import ensure_triggers
+        post_migrate.connect(ensure_triggers, sender=self)
@@ -0,0 +1,20 @@
+from django.core.cache import cache
+from django.utils import timezone
+
+
+def get_cache_version(key):
+    """Get the current version number stored under `key`, starting one if missing"""
+    version = cache.get(key)
+    if version is None:
+        bump_cache_version(key)
+        version = cache.get(key)
+    return version
+
+
+def bump_cache_version(key):
+    """Invalidate every cache entry built from the version stored under `key`"""
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Key missing or evicted: start a new version line that cannot collide with old entries
+        cache.set(key, int(timezone.now().timestamp() * 1000), None)
@@ -0,0 +1,93 @@
+"""
+In-process snapshot of the product catalog.
+
+The Product table is small and read far more often than it changes, so
+each worker keeps a compact copy for the product list endpoint, which
+filters and pages it in memory. It holds the descriptive columns only:
+stock levels (and updated_at) move with every order, so the list reads
+them by primary key for the rows of each page. Order placement and the
+type-ahead read the table instead, since they need current prices and
+stock.
+
+The snapshot is tagged with the 'pages_product:catalog' table version,
+which database triggers bump whenever a product is added, removed or has
+a snapshot column changed (migration 0011_catalog_version). Every use
+checks that counter with one indexed query and rebuilds the snapshot (with
+one more) when another process or a bulk UPDATE changed the catalog.
+"""
+import threading
+
+from django.db import router
+
+from . import metrics
+from .models import Product, TableVersion
+
+
+CATALOG_TABLE_VERSION = 'pages_product:catalog'
+
+
+def catalog_version():
+    """Read the catalog counter from the primary; a lagging replica would pin stale rows to a new version"""
+    return TableVersion.objects.using(router.db_for_write(TableVersion)).filter(
+        table=CATALOG_TABLE_VERSION
+    ).values_list('version', flat=True).first()
+
+
+class ProductRecord:
+    """Read-only copy of the descriptive columns of one Product row"""
+
+    FIELDS = (
+        'product_id', 'name', 'sku', 'category', 'price', 'cost_price',
+        'low_stock_threshold', 'unit', 'is_active', 'created_at',
+    )
+    __slots__ = FIELDS
+
+    def __init__(self, values):
+        for name, value in zip(self.FIELDS, values):
+            setattr(self, name, value)
+
+    @property
+    def pk(self):
+        return self.product_id
+
+    def as_dict(self, fields):
+        return {name: getattr(self, name) for name in fields}
+
+
+class CatalogSnapshot:
+    """All products in primary key order, as of one catalog version"""
+
+    __slots__ = ('version', 'records')
+
+    def __init__(self, version, records):
+        self.version = version
+        self.records = records
+
+
+_snapshot = None
+_lock = threading.Lock()
+
+
+def _is_current(snapshot, version):
+    return snapshot is not None and version is not None and snapshot.version == version
+
+
+def get_catalog():
+    """Get the current catalog snapshot, rebuilding it if the catalog changed"""
+    global _snapshot
+    version = catalog_version()
+    snapshot = _snapshot
+    if _is_current(snapshot, version):
+        metrics.cache_lookup('catalog_snapshot', hit=True)
+        return snapshot
+
+    with _lock:
+        # Another thread may have rebuilt it while we waited
+        if not _is_current(_snapshot, version):
+            metrics.cache_lookup('catalog_snapshot', hit=False)
+            # Read after the version: a write in between only makes the next use rebuild again
+            rows = Product.objects.using(router.db_for_write(Product)).order_by('pk').values_list(
+                *ProductRecord.FIELDS
+            )
+            _snapshot = CatalogSnapshot(version, [ProductRecord(row) for row in rows])
+        return _snapshot
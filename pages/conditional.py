@@ -0,0 +1,103 @@
+"""
+Conditional GET support: ETag / Last-Modified validators for the list and
+report views, answered with 304 before the view runs its queries.
+
+A resource is a set of tables. Its state is the write counter of each
+table (TableVersion, bumped by database triggers on every row inserted,
+updated or deleted), read with one indexed query, so any write to a table
+the page depends on changes the ETag without scanning the table.
+"""
+import hashlib
+
+from django.db import router
+from django.utils import timezone
+from django.views.decorators.http import condition
+
+from .models import (
+    Customer, CustomerSummary, DailyPaymentMethodSales, DailySales,
+    Order, OrderItem, Payment, Product, StockAlert, TableVersion,
+)
+
+
+# Tables behind the header notification counters shown on every admin page
+HEADER_TABLES = (Product, Payment, Customer)
+
+# Resource name -> tables the response is built from; each needs the
+# version triggers of migration 0010_table_versions
+RESOURCES = {
+    'products': (Product,),
+    'customers': (Customer,),
+    'dashboard': (Customer, Product, Order, OrderItem, Payment, StockAlert),
+    'inventory_page': HEADER_TABLES + (StockAlert,),
+    'orders_page': HEADER_TABLES + (Order, OrderItem),
+    'customers_page': HEADER_TABLES + (CustomerSummary, Order, OrderItem),
+    'payments_page': HEADER_TABLES + (Order,),
+    'reports': HEADER_TABLES + (Order, OrderItem, DailySales, DailyPaymentMethodSales),
+    'calendar': (Order, OrderItem, DailySales),
+}
+
+
+def compute_resource_state(name):
+    """Read the write counters of every table of resource `name` in one query"""
+    tables = sorted({model._meta.db_table for model in RESOURCES[name]})
+    versions = {
+        row.table: row
+        for row in TableVersion.objects.using(router.db_for_read(TableVersion)).filter(table__in=tables)
+    }
+    # A table missing its counter row (not tracked yet) shows up as '-'
+    return {
+        'token': '|'.join(
+            f"{table}:{versions[table].version}" if table in versions else f"{table}:-" for table in tables
+        ),
+        'last_modified': max(
+            (row.changed_at for row in versions.values() if row.changed_at), default=None
+        ),
+    }
+
+
+def resource_state(request, name):
+    """Get the state of resource `name`, computed at most once per request"""
+    states = request.__dict__.setdefault('_resource_states', {})
+    if name not in states:
+        states[name] = compute_resource_state(name)
+    return states[name]
+
+
+def resource_etag(name):
+    """Build an etag_func for `condition()` from the state of resource `name`"""
+    def etag_func(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return None
+        state = resource_state(request, name)
+        # Rendered pages depend on who asks (and embed their CSRF token),
+        # load-more fetches get JSON instead of HTML, and day-based counters
+        # roll over at local midnight
+        vary = [
+            name,
+            state['token'],
+            str(request.user.pk),
+            request.META.get('CSRF_COOKIE', ''),
+            request.headers.get('x-requested-with', ''),
+            timezone.localdate().isoformat(),
+        ]
+        return hashlib.sha1('\n'.join(vary).encode()).hexdigest()
+    return etag_func
+
+
+def resource_last_modified(name):
+    """Build a last_modified_func for `condition()` from the state of resource `name`"""
+    def last_modified_func(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return None
+        return resource_state(request, name)['last_modified']
+    return last_modified_func
+
+
+def conditional_resource(name):
+    """
+    Decorator: answer If-None-Match / If-Modified-Since for a view built from resource `name`.
+
+    The ETag is authoritative since it also covers deletes; Last-Modified
+    only moves forward when a row is written.
+    """
+    return condition(etag_func=resource_etag(name), last_modified_func=resource_last_modified(name))
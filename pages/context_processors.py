@@ -0,0 +1,68 @@
+from datetime import datetime, time
+
+from django.core.cache import cache
+from django.db import router
+from django.db.models import Count, F, Value
+from django.utils import timezone
+
+from . import metrics
+from .cache_versions import bump_cache_version, get_cache_version
+from .models import Customer, Payment, Product
+
+
+NOTIFICATION_VERSION_KEY = 'pages:notifications:version'
+# Writes only bump the version in this process's cache (LocMem), so other
+# workers may show stale counters until the entry expires
+NOTIFICATION_TIMEOUT = 30
+
+
+def bump_notification_version():
+    """Invalidate every cached set of notification counters"""
+    bump_cache_version(NOTIFICATION_VERSION_KEY)
+
+
+def compute_notification_counts():
+    """Count low stock products, pending payments and today's new customers in one query"""
+    today_start = timezone.make_aware(datetime.combine(timezone.localdate(), time.min))
+    counters = [
+        ('low_stock_count', Product.objects.filter(
+            is_active=True,
+            stock_quantity__lte=F('low_stock_threshold')
+        )),
+        ('pending_payments', Payment.objects.filter(payment_status='pending')),
+        ('new_customers_count', Customer.objects.filter(created_at__gte=today_start)),
+    ]
+
+    # From the primary, as in pages.catalog: the counters are cached under the
+    # current version, and a lagging replica would pin stale numbers to it.
+    # One (name, count) row per counter, joined with UNION ALL
+    db = router.db_for_write(Product)
+    parts = [
+        queryset.using(db).order_by()
+        .values(counter=Value(name))
+        .annotate(count=Count('pk'))
+        .values_list('counter', 'count')
+        for name, queryset in counters
+    ]
+    return dict(parts[0].union(*parts[1:], all=True))
+
+
+def get_notification_counts():
+    """Get the header counters, cached until the next Product/Payment/Customer write or for NOTIFICATION_TIMEOUT seconds"""
+    version = get_cache_version(NOTIFICATION_VERSION_KEY)
+
+    # New customers are counted per local day, so the day is part of the key
+    key = f'pages:notifications:{version}:{timezone.localdate().isoformat()}'
+    counts = cache.get(key)
+    metrics.cache_lookup('notifications', hit=counts is not None)
+    if counts is None:
+        counts = compute_notification_counts()
+        cache.set(key, counts, NOTIFICATION_TIMEOUT)
+    return counts
+
+
+def notifications(request):
+    """Context processor: header badge counters for the logged-in admin pages"""
+    if not getattr(request, 'user', None) or not request.user.is_authenticated:
+        return {}
+    return get_notification_counts()
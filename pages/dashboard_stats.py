@@ -0,0 +1,72 @@
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from . import metrics
+from .cache_versions import bump_cache_version, get_cache_version
+from .models import Customer, Order, Payment, Product
+
+
+DASHBOARD_VERSION_KEY = 'pages:dashboard:version'
+
+
+def bump_dashboard_version():
+    """Invalidate the cached dashboard statistics"""
+    bump_cache_version(DASHBOARD_VERSION_KEY)
+
+
+def compute_dashboard_stats():
+    """Compute the dashboard statistics block with one aggregate query per table"""
+    today = timezone.localdate()
+    week_start = timezone.make_aware(datetime.combine(today - timedelta(days=7), time.min))
+    month_start = timezone.make_aware(datetime.combine(today - timedelta(days=30), time.min))
+
+    # Primary only: whatever is computed here is cached as the current numbers
+    db = router.db_for_write(Order)
+    stats = Customer.objects.using(db).aggregate(total_customers=Count('customer_id'))
+    stats.update(Product.objects.using(db).aggregate(
+        total_products=Count('product_id', filter=Q(is_active=True)),
+        low_stock_count=Count('product_id', filter=Q(
+            is_active=True, stock_quantity__lte=F('low_stock_threshold')
+        )),
+        out_of_stock_count=Count('product_id', filter=Q(is_active=True, stock_quantity=0)),
+    ))
+    stats.update(Order.objects.using(db).aggregate(
+        total_orders=Count('order_id'),
+        pending_orders=Count('order_id', filter=Q(status='pending')),
+        completed_orders=Count('order_id', filter=Q(status='completed')),
+    ))
+    revenue = Payment.objects.using(db).filter(payment_status='completed').aggregate(
+        total_revenue=Sum('amount'),
+        weekly_revenue=Sum('amount', filter=Q(payment_date__gte=week_start)),
+        monthly_revenue=Sum('amount', filter=Q(payment_date__gte=month_start)),
+    )
+    stats.update({name: value or Decimal('0.00') for name, value in revenue.items()})
+    stats['computed_at'] = timezone.now()
+    return stats
+
+
+def get_dashboard_stats():
+    """
+    Get the dashboard statistics, cached for DASHBOARD_STATS_TTL seconds.
+
+    Any write to Customer, Product, Order or Payment invalidates the cache
+    before the TTL runs out. `stats_age` reports how old the numbers are.
+    """
+    ttl = getattr(settings, 'DASHBOARD_STATS_TTL', 30)
+    key = f'pages:dashboard:{get_cache_version(DASHBOARD_VERSION_KEY)}'
+    stats = cache.get(key) if ttl else None
+    if ttl:
+        metrics.cache_lookup('dashboard_stats', hit=stats is not None)
+    if stats is None:
+        stats = compute_dashboard_stats()
+        if ttl:
+            cache.set(key, stats, ttl)
+    stats = dict(stats)
+    stats['stats_age'] = int((timezone.now() - stats['computed_at']).total_seconds())
+    return stats
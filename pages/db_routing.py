@@ -0,0 +1,124 @@
+"""
+Read-replica routing for the reporting and list views.
+
+Views decorated with @read_replica read from the 'replica' database alias
+(when one is configured) so report and dashboard queries do not compete
+with order intake on the primary. Everything else, including every write
+and the AJAX mutators, stays on 'default'. After a write request the
+browser is pinned to the primary for REPLICA_STICKY_SECONDS, so staff see
+their own changes before the replica catches up.
+
+Locally the replica is a second SQLite file refreshed from the primary
+with the backup API (sync_replica / manage.py sync_replica).
+"""
+import sqlite3
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+
+
+PRIMARY_DB = 'default'
+REPLICA_DB = 'replica'
+
+STICKY_COOKIE = 'pin_primary'
+
+_reading_from_replica = ContextVar('reading_from_replica', default=False)
+
+
+def replica_configured():
+    return REPLICA_DB in settings.DATABASES
+
+
+class ReplicaRouter:
+    """
+    Send shop data reads made inside @read_replica views to the replica,
+    everything else to the primary. Sessions and users always come from the
+    primary: a login must not depend on the replica having caught up.
+    """
+
+    def db_for_read(self, model, **hints):
+        if _reading_from_replica.get() and model._meta.app_label == 'pages' and replica_configured():
+            return REPLICA_DB
+        return PRIMARY_DB
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY_DB
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema with the data when it is synced
+        return db == PRIMARY_DB
+
+
+def pinned_to_primary(request):
+    """Whether this browser wrote something within the last REPLICA_STICKY_SECONDS"""
+    try:
+        return float(request.COOKIES.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def _on_replica(content):
+    """Keep streamed content (e.g. CSV exports) reading from the replica while it is generated"""
+    previous = _reading_from_replica.get()
+    _reading_from_replica.set(True)
+    try:
+        yield from content
+    finally:
+        _reading_from_replica.set(previous)
+
+
+def read_replica(view):
+    """Run `view` (and its conditional GET checks) against the replica unless the browser is pinned to the primary"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not replica_configured() or pinned_to_primary(request):
+            return view(request, *args, **kwargs)
+        token = _reading_from_replica.set(True)
+        try:
+            response = view(request, *args, **kwargs)
+        finally:
+            _reading_from_replica.reset(token)
+        if response.streaming:
+            response.streaming_content = _on_replica(response.streaming_content)
+        return response
+    return wrapper
+
+
+class StickyPrimaryMiddleware:
+    """Pin a browser to the primary database for a while after any write request"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and replica_configured():
+            seconds = getattr(settings, 'REPLICA_STICKY_SECONDS', 10)
+            response.set_cookie(
+                STICKY_COOKIE, str(time.time() + seconds),
+                max_age=seconds, httponly=True, samesite='Lax'
+            )
+        return response
+
+
+def sync_replica():
+    """
+    Copy the primary SQLite database into the replica file with the backup
+    API, a consistent snapshot even while the primary is being written.
+    Returns the number of seconds the copy took.
+    """
+    started = time.monotonic()
+    source = sqlite3.connect(settings.DATABASES[PRIMARY_DB]['NAME'])
+    target = sqlite3.connect(settings.DATABASES[REPLICA_DB]['NAME'])
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+    return time.monotonic() - started
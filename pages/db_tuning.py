@@ -0,0 +1,40 @@
+"""
+SQLite tuning applied to every new database connection.
+
+WAL journaling lets staff keep reading while another request commits, and
+busy_timeout makes a writer wait for the lock instead of failing with
+"database is locked". The values come from settings.SQLITE_PRAGMAS, which
+are driven by environment variables (see storefront/settings.py).
+"""
+import re
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from .db_routing import REPLICA_DB
+
+
+PRAGMA_VALUE_RE = re.compile(r'^-?\w+$')
+
+
+def sqlite_pragmas():
+    """Get the configured PRAGMAs as (name, value) pairs, rejecting anything that is not a plain word or number"""
+    pragmas = []
+    for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+        if not (PRAGMA_VALUE_RE.match(name) and PRAGMA_VALUE_RE.match(str(value))):
+            raise ValueError(f'Invalid SQLite PRAGMA {name}={value}')
+        pragmas.append((name, value))
+    return pragmas
+
+
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    # Run on the raw connection so the PRAGMAs are not logged or counted as queries
+    for name, value in sqlite_pragmas():
+        connection.connection.execute(f'PRAGMA {name} = {value}')
+    if connection.alias == REPLICA_DB:
+        # Only sync_replica writes to the replica
+        connection.connection.execute('PRAGMA query_only = ON')
@@ -0,0 +1,204 @@
+"""
+CSV exports of orders, payments, customers and inventory.
+
+Rows are read through .iterator() and written out one chunk at a time, so
+memory stays flat however much history there is. Order line items are
+fetched with one query per chunk of orders, not one per order. Used by the
+export_csv view and the export_csv management command.
+"""
+import csv
+import io
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Customer, Order, OrderItem, Payment, Product
+
+
+EXPORT_CHUNK_SIZE = 1000
+
+
+class ExportError(ValueError):
+    """Invalid export name or filter; the message is safe to show to the user"""
+
+
+def parse_day(value, name='date'):
+    """Parse a YYYY-MM-DD business day; None when empty"""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ExportError(f'{name} must be a date in YYYY-MM-DD format')
+
+
+def _local(value):
+    return timezone.localtime(value).strftime('%Y-%m-%d %H:%M:%S') if value else ''
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _in_days(queryset, field, since, until):
+    """Keep rows whose `field` falls on a local business day from `since` to `until` (inclusive)"""
+    if since:
+        queryset = queryset.filter(**{f'{field}__gte': timezone.make_aware(datetime.combine(since, time.min))})
+    if until:
+        queryset = queryset.filter(**{
+            f'{field}__lt': timezone.make_aware(datetime.combine(until + timedelta(days=1), time.min))
+        })
+    return queryset
+
+
+# ── Orders (one row per line item) ────────────────────────────────────────────
+ORDER_HEADER = (
+    'order_number', 'created_at', 'status', 'customer_name', 'customer_email', 'customer_phone',
+    'delivery_date', 'subtotal', 'tax', 'discount', 'total',
+    'product_sku', 'product_name', 'quantity', 'unit_price', 'line_total',
+)
+
+
+def _order_rows(since, until, status, chunk_size):
+    orders = _in_days(Order.objects.all(), 'created_at', since, until)
+    if status:
+        orders = orders.filter(status=status)
+    orders = orders.order_by('pk').values_list(
+        'pk', 'order_number', 'created_at', 'status', 'customer__first_name', 'customer__last_name',
+        'customer__email', 'customer_phone', 'delivery_date', 'subtotal', 'tax', 'discount', 'total'
+    )
+
+    for chunk in _chunks(orders.iterator(chunk_size=chunk_size), chunk_size):
+        # One query for the items of the whole chunk; a pk range would also
+        # read the items of the orders in between that the filters left out
+        items = defaultdict(list)
+        for order_id, sku, name, quantity, unit_price in OrderItem.objects.filter(
+            order_id__in=[row[0] for row in chunk]
+        ).order_by('order_id', 'pk').values_list('order_id', 'product_sku', 'product_name', 'quantity', 'unit_price'):
+            items[order_id].append((sku, name, quantity, unit_price, quantity * unit_price))
+
+        for (pk, number, created_at, order_status, first_name, last_name, email, phone,
+             delivery_date, subtotal, tax, discount, total) in chunk:
+            order = (
+                number, _local(created_at), order_status, f'{first_name} {last_name}'.strip(), email, phone,
+                delivery_date or '', subtotal, tax, discount, total,
+            )
+            for item in items.get(pk) or [('',) * 5]:
+                yield order + item
+
+
+# ── Payments ──────────────────────────────────────────────────────────────────
+PAYMENT_HEADER = (
+    'payment_number', 'payment_date', 'order_number', 'customer_name', 'amount',
+    'payment_method', 'payment_status', 'transaction_id',
+)
+
+
+def _payment_rows(since, until, status, chunk_size):
+    payments = _in_days(Payment.objects.all(), 'payment_date', since, until)
+    if status:
+        payments = payments.filter(payment_status=status)
+    for (number, payment_date, order_number, first_name, last_name, amount,
+         method, payment_status, transaction_id) in payments.order_by('payment_date', 'pk').values_list(
+        'payment_number', 'payment_date', 'order__order_number', 'order__customer__first_name',
+        'order__customer__last_name', 'amount', 'payment_method', 'payment_status', 'transaction_id'
+    ).iterator(chunk_size=chunk_size):
+        yield (
+            number, _local(payment_date), order_number, f'{first_name} {last_name}'.strip(), amount,
+            method, payment_status, transaction_id,
+        )
+
+
+# ── Customers ─────────────────────────────────────────────────────────────────
+CUSTOMER_HEADER = (
+    'customer_id', 'first_name', 'last_name', 'email', 'phone', 'address', 'city', 'created_at',
+    'order_count', 'total_spent', 'total_paid', 'last_order_date',
+)
+
+
+def _customer_rows(since, until, status, chunk_size):
+    customers = _in_days(Customer.objects.all(), 'created_at', since, until)
+    for row in customers.order_by('pk').values_list(
+        'pk', 'first_name', 'last_name', 'email', 'phone', 'address', 'city', 'created_at',
+        'summary__order_count', 'summary__total_spent', 'summary__total_paid', 'summary__last_order_date'
+    ).iterator(chunk_size=chunk_size):
+        *customer, created_at, order_count, total_spent, total_paid, last_order_date = row
+        yield (*customer, _local(created_at), order_count or 0, total_spent or 0, total_paid or 0,
+               _local(last_order_date))
+
+
+# ── Inventory ─────────────────────────────────────────────────────────────────
+INVENTORY_HEADER = (
+    'product_id', 'sku', 'name', 'category', 'price', 'cost_price', 'stock_quantity',
+    'low_stock_threshold', 'unit', 'is_active', 'updated_at',
+)
+
+STOCK_STATUS_FILTERS = {
+    'in': {'stock_quantity__gt': F('low_stock_threshold')},
+    'low': {'stock_quantity__lte': F('low_stock_threshold')},
+    'out': {'stock_quantity': 0},
+}
+
+
+def _inventory_rows(since, until, status, chunk_size):
+    products = Product.objects.filter(is_active=True)
+    if status:
+        products = products.filter(**STOCK_STATUS_FILTERS[status])
+    for row in products.order_by('category', 'name', 'pk').values_list(
+        'pk', 'sku', 'name', 'category', 'price', 'cost_price', 'stock_quantity',
+        'low_stock_threshold', 'unit', 'is_active', 'updated_at'
+    ).iterator(chunk_size=chunk_size):
+        yield (*row[:-1], _local(row[-1]))
+
+
+# name -> (header, row generator, accepted statuses, has a date filter)
+EXPORTS = {
+    'orders': (ORDER_HEADER, _order_rows, dict(Order.STATUS_CHOICES), True),
+    'payments': (PAYMENT_HEADER, _payment_rows, dict(Payment.PAYMENT_STATUS_CHOICES), True),
+    'customers': (CUSTOMER_HEADER, _customer_rows, {}, True),
+    'inventory': (INVENTORY_HEADER, _inventory_rows, STOCK_STATUS_FILTERS, False),
+}
+
+
+def export_rows(name, since=None, until=None, status=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Get the header and a generator of rows for the `name` export.
+
+    `since`/`until` are local business days (inclusive); `status` is an
+    order/payment status or in/low/out for inventory. Raises ExportError
+    for an unknown export or a filter it does not support.
+    """
+    if name not in EXPORTS:
+        raise ExportError(f"Unknown export '{name}' (choose from {', '.join(EXPORTS)})")
+    header, rows, statuses, dated = EXPORTS[name]
+    if status and status not in statuses:
+        if not statuses:
+            raise ExportError(f'The {name} export has no status filter')
+        raise ExportError(f"Invalid status '{status}' (choose from {', '.join(statuses)})")
+    if (since or until) and not dated:
+        raise ExportError(f'The {name} export has no date filter')
+    if since and until and since > until:
+        raise ExportError('since must not be after until')
+    return header, rows(since, until, status, chunk_size)
+
+
+def stream_csv(header, rows, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield CSV text for `header` and `rows`, `chunk_size` rows at a time"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for chunk in _chunks(rows, chunk_size):
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
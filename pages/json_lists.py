@@ -0,0 +1,111 @@
+"""
+Plumbing for the JSON list endpoints: field selection, filters and either a
+keyset page or a streamed array of every matching row.
+"""
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+
+from .pagination import paginate_records, paginate_request
+
+
+STREAM_CHUNK_SIZE = 2000
+
+
+def parse_fields(request, allowed, default):
+    """
+    Get the columns requested with `?fields=a,b,c`.
+
+    The primary key is always included since it is the pagination key.
+    Raises ValueError for a field that is not in `allowed`.
+    """
+    requested = [name.strip() for name in request.GET.get('fields', '').split(',') if name.strip()]
+    unknown = [name for name in requested if name not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    fields = requested or list(default)
+    pk_name = allowed[0]
+    return fields if pk_name in fields else [pk_name] + fields
+
+
+def parse_bool(value):
+    """Parse a true/false query parameter; returns None when it is missing or 'all'"""
+    if value in (None, '', 'all'):
+        return None
+    if value.lower() in ('1', 'true', 'yes'):
+        return True
+    if value.lower() in ('0', 'false', 'no'):
+        return False
+    raise ValueError(f"Invalid boolean: {value}")
+
+
+def wants_stream(request):
+    return request.GET.get('stream', '').lower() in ('1', 'true', 'yes')
+
+
+def _stream_rows(queryset, chunk_size):
+    """Yield a JSON array of `queryset` rows without holding more than one chunk in memory"""
+    yield '['
+    first = True
+    buffer = []
+    for row in queryset.iterator(chunk_size=chunk_size):
+        buffer.append(json.dumps(row, cls=DjangoJSONEncoder))
+        if len(buffer) >= chunk_size:
+            yield ('' if first else ',') + ','.join(buffer)
+            first = False
+            buffer = []
+    if buffer:
+        yield ('' if first else ',') + ','.join(buffer)
+    yield ']'
+
+
+def list_response(request, queryset, fields, ordering):
+    """
+    Answer a list request for `queryset` restricted to `fields`.
+
+    With `?stream=1` every row is written out as a JSON array while it is
+    read from the database cursor; otherwise one keyset page is returned as
+    {success, results, next_cursor, has_next}.
+    """
+    rows = queryset.values(*fields)
+    if wants_stream(request):
+        return StreamingHttpResponse(
+            _stream_rows(rows.order_by(*ordering), STREAM_CHUNK_SIZE),
+            content_type='application/json'
+        )
+
+    page = paginate_request(request, rows, ordering)
+    return JsonResponse({
+        'success': True,
+        'results': page.object_list,
+        'next_cursor': page.next_cursor,
+        'has_next': page.has_next,
+    })
+
+
+def records_response(request, records, fields, model):
+    """
+    Answer a list request from in-memory records (see pages.catalog) with the same page format.
+
+    Fields the records do not hold are read from `model` for the rows of the
+    page, with one query.
+    """
+    page = paginate_records(request, records, model)
+    live_fields = [name for name in fields if page.object_list and name not in page.object_list[0].FIELDS]
+    live = {}
+    if live_fields:
+        live = model.objects.only(*live_fields).in_bulk([record.pk for record in page])
+    results = []
+    for record in page:
+        if live_fields and record.pk not in live:
+            continue  # deleted since the snapshot was taken
+        results.append({
+            name: getattr(live[record.pk] if name in live_fields else record, name) for name in fields
+        })
+    return JsonResponse({
+        'success': True,
+        'results': results,
+        'next_cursor': page.next_cursor,
+        'has_next': page.has_next,
+    })
@@ -0,0 +1,129 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+
+# Read views whose queries must be served by an index
+CHECKED_URLS = [
+    '/dashboard/',
+    '/customers/',
+    '/customers/?search=a',
+    '/inventory/',
+    '/inventory/?stock_status=low',
+    '/orders/',
+    '/orders/?status=pending',
+    '/orders/?view=completed',
+    '/payments/',
+    '/payments/?status=completed',
+    '/reports/',
+    '/ajax/products/list/',
+    '/ajax/customers/list/',
+    '/ajax/products/lookup/?q=ro',
+    '/ajax/customers/lookup/?q=a',
+    '/ajax/reports/calendar/?month=1',
+]
+
+# Tables that are read in full by design: the catalog snapshot loads every
+# product in one go and the daily rollups hold one row per day
+FULL_SCAN_ALLOWED = {'pages_product', 'pages_dailysales', 'pages_dailypaymentmethodsales'}
+
+# URL -> tables it aggregates in full on purpose, walking the smallest index:
+# the dashboard totals (cached for DASHBOARD_STATS_TTL), the customers with a
+# payment on the payments page and the all-time best sellers on the reports
+VIEW_SCANS_ALLOWED = {
+    '/dashboard/': {'pages_customer', 'pages_order'},
+    '/payments/': {'pages_payment'},
+    '/payments/?status=completed': {'pages_payment'},
+    '/reports/': {'pages_orderitem'},
+}
+
+# "SCAN t", "SCAN t USING [COVERING] INDEX i", "SEARCH t USING INDEX i (a=?)", ...
+PLAN_STEP_RE = re.compile(r'^(SCAN|SEARCH) (\w+)(?: AS \w+)?(?: (.*))?$')
+
+
+def unbounded_read(step):
+    """Describe how plan `step` reads its whole table, or return None if it is an index lookup"""
+    match = PLAN_STEP_RE.match(step)
+    if not match:
+        return None
+    kind, table, detail = match.groups()
+    detail = detail or ''
+    if kind == 'SCAN':
+        if detail.startswith('VIRTUAL TABLE'):
+            # Full text searches pass their MATCH to the module as the index string
+            return None if re.search(r'INDEX \d+:\S', detail) else f'full scan of virtual table {table}'
+        # Walking every entry of an index still reads the whole table
+        return f'full scan of {table}' + (f' ({detail})' if detail else '')
+    if not detail.startswith('USING') or 'AUTOMATIC' in detail:
+        return f'unindexed search of {table}' + (f' ({detail})' if detail else '')
+    return None
+
+
+class Command(BaseCommand):
+    help = "Run EXPLAIN QUERY PLAN on the queries of the main views and fail on full table scans"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--allow', action='append', default=[], metavar='TABLE',
+                            help='Also accept full scans of TABLE (repeatable)')
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every query plan')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('check_query_plans reads SQLite query plans')
+        allowed = FULL_SCAN_ALLOWED | set(options['allow'])
+        self.tables = set(connection.introspection.table_names())
+
+        failures = []
+        # Everything (the throwaway login included) is rolled back at the end
+        with transaction.atomic():
+            user = get_user_model().objects.create_superuser('query-plan-check', password=None)
+            client = Client(HTTP_HOST='localhost')
+            client.force_login(user)
+            cache.clear()
+
+            for url in CHECKED_URLS:
+                with CaptureQueriesContext(connection) as queries:
+                    response = client.get(url)
+                if response.status_code != 200:
+                    failures.append(f'{url}: HTTP {response.status_code}')
+                    continue
+                url_allowed = allowed | VIEW_SCANS_ALLOWED.get(url, set())
+                for query in queries.captured_queries:
+                    failures.extend(self.check_query(url, query['sql'], url_allowed, options['verbose_plans']))
+
+            transaction.set_rollback(True)
+
+        if failures:
+            for failure in failures:
+                self.stderr.write(failure)
+            raise CommandError(f'{len(failures)} queries read a whole table')
+        self.stdout.write(self.style.SUCCESS(f'Checked {len(CHECKED_URLS)} views: every query uses an index'))
+
+    def check_query(self, url, sql, allowed, verbose):
+        if not sql.lstrip().upper().startswith('SELECT'):
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            plan = [row[-1] for row in cursor.fetchall()]
+        if verbose:
+            self.stdout.write(f'{url}\n  {sql}\n' + ''.join(f'    {step}\n' for step in plan))
+
+        # Walking a table in the requested order and stopping at LIMIT is a bounded read
+        if ' LIMIT ' in sql and not any('TEMP B-TREE' in step for step in plan):
+            return []
+
+        failures = []
+        for step in plan:
+            match = PLAN_STEP_RE.match(step)
+            # Only real tables count; materialized subqueries show up as "SCAN subquery"
+            if not match or match.group(2) not in self.tables or match.group(2) in allowed:
+                continue
+            problem = unbounded_read(step)
+            if problem:
+                failures.append(f'{url}: {problem}\n  {sql}')
+        return failures
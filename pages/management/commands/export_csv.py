@@ -0,0 +1,39 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pages.exports import EXPORT_CHUNK_SIZE, EXPORTS, ExportError, export_rows, parse_day, stream_csv
+
+
+class Command(BaseCommand):
+    help = "Write orders, payments, customers or inventory as CSV, streaming rows from the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('export', choices=list(EXPORTS), help='What to export')
+        parser.add_argument('--since', help='First business day to include (YYYY-MM-DD)')
+        parser.add_argument('--until', help='Last business day to include (YYYY-MM-DD)')
+        parser.add_argument('--status', help='Order/payment status, or in/low/out for inventory')
+        parser.add_argument('--output', '-o', help='File to write; defaults to standard output')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE,
+                            help='Rows fetched and written per batch')
+
+    def handle(self, *args, **options):
+        try:
+            header, rows = export_rows(
+                options['export'],
+                since=parse_day(options['since'], '--since'),
+                until=parse_day(options['until'], '--until'),
+                status=options['status'],
+                chunk_size=options['chunk_size'],
+            )
+        except ExportError as e:
+            raise CommandError(str(e))
+
+        output = open(options['output'], 'w', newline='', encoding='utf-8') if options['output'] else sys.stdout
+        try:
+            for text in stream_csv(header, rows, options['chunk_size']):
+                output.write(text)
+        finally:
+            if options['output']:
+                output.close()
+                self.stderr.write(self.style.SUCCESS(f"Wrote {options['export']} to {options['output']}"))
@@ -0,0 +1,292 @@
+import random
+import re
+from bisect import bisect_right
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from pages.models import Customer, NumberSequence, Order, OrderItem, Payment, Product, StockAlert
+
+
+FIRST_NAMES = [
+    'Maria', 'Jose', 'Juan', 'Ana', 'Mark', 'Angel', 'John', 'Kristine', 'Paolo', 'Camille',
+    'Miguel', 'Andrea', 'Carlo', 'Patricia', 'Rafael', 'Bea', 'Joshua', 'Nicole', 'Gabriel', 'Jasmine',
+    'Daniel', 'Mae', 'Christian', 'Joy', 'Adrian', 'Grace', 'Kevin', 'Sofia', 'Ramon', 'Liza',
+]
+LAST_NAMES = [
+    'Santos', 'Reyes', 'Cruz', 'Bautista', 'Ocampo', 'Garcia', 'Mendoza', 'Torres', 'Tomas', 'Andrada',
+    'Castillo', 'Flores', 'Villanueva', 'Ramos', 'Castro', 'Rivera', 'Aquino', 'Navarro', 'Salazar', 'Mercado',
+    'Concepcion', 'Dela Cruz', 'Gonzales', 'Lopez', 'Aguilar', 'Pascual', 'Santiago', 'Soriano', 'Del Rosario', 'Valdez',
+]
+CITIES = ['Quezon City', 'Manila', 'Makati', 'Pasig', 'Taguig', 'Caloocan', 'Mandaluyong', 'Marikina', 'Paranaque']
+
+FLOWERS = [
+    ('Rose', ('Red', 'White', 'Pink', 'Yellow', 'Peach'), Decimal('45')),
+    ('Tulip', ('Red', 'White', 'Pink', 'Purple'), Decimal('120')),
+    ('Sunflower', ('',), Decimal('90')),
+    ('Lily', ('White', 'Pink', 'Orange'), Decimal('110')),
+    ('Carnation', ('Red', 'White', 'Pink'), Decimal('35')),
+    ('Orchid', ('White', 'Purple'), Decimal('250')),
+    ('Gerbera', ('Red', 'Orange', 'Yellow', 'Pink'), Decimal('40')),
+    ('Chrysanthemum', ('White', 'Yellow'), Decimal('30')),
+    ('Peony', ('Pink', 'White'), Decimal('320')),
+    ('Hydrangea', ('Blue', 'White'), Decimal('180')),
+    ('Lisianthus', ('Purple', 'White'), Decimal('95')),
+    ('Mums', ('Green', 'Yellow'), Decimal('25')),
+]
+FILLERS = [
+    ("Baby's Breath", Decimal('60')), ('Eucalyptus', Decimal('80')), ('Statice', Decimal('50')),
+    ('Leatherleaf Fern', Decimal('20')), ('Aster', Decimal('40')), ('Misty Blue', Decimal('55')),
+    ('Ruscus', Decimal('30')), ('Solidago', Decimal('35')),
+]
+
+# Method -> share of payments
+PAYMENT_METHODS = {
+    'cash': 35, 'gcash': 30, 'credit_card': 10, 'bank_transfer': 8, 'paymaya': 8, 'debit_card': 7, 'other': 2,
+}
+
+SCALE_RE = re.compile(r'^(\d+(?:\.\d+)?)([km]?)$', re.IGNORECASE)
+
+BATCH_SIZE = 5000
+
+
+def parse_scale(value):
+    """Parse an order count such as 10000, 10k, 100k or 1M"""
+    match = SCALE_RE.match(value.strip())
+    if not match:
+        raise CommandError(f'Invalid order count: {value} (use e.g. 10000, 10k, 100k or 1M)')
+    number, suffix = match.groups()
+    return int(float(number) * {'': 1, 'k': 1000, 'm': 1000000}[suffix.lower()])
+
+
+def mothers_day(year):
+    """Second Sunday of May"""
+    first = date(year, 5, 1)
+    return first + timedelta(days=(6 - first.weekday()) % 7 + 7)
+
+
+def day_weight(day):
+    """Relative order volume of a business day, with the florist's seasonal spikes"""
+    weight = 1.4 if day.weekday() >= 5 else 1.0
+    if day.month == 2 and 7 <= day.day <= 14:
+        weight *= 2 + 6 * (day.day - 7) / 7    # Valentine's build-up
+    if 0 <= (mothers_day(day.year) - day).days < 7:
+        weight *= 4
+    if (day.month == 10 and day.day >= 28) or (day.month == 11 and day.day <= 2):
+        weight *= 3                             # All Saints' Day (Undas)
+    if day.month == 12 and 15 <= day.day <= 24:
+        weight *= 2.5
+    return weight
+
+
+def insert_rows(model, fields, rows):
+    """
+    INSERT `rows` (tuples of `fields` values) in one executemany, bypassing
+    save() and signals; the other columns get their field defaults.
+    """
+    model_fields = [model._meta.get_field(name) for name in fields]
+    defaults = [field for field in model._meta.concrete_fields if field not in model_fields]
+    default_values = tuple(field.get_default() for field in defaults)
+    model_fields += defaults
+    rows = [row + default_values for row in rows]
+    quote = connection.ops.quote_name
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(model._meta.db_table),
+        ', '.join(quote(field.column) for field in model_fields),
+        ', '.join(['%s'] * len(model_fields)),
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [
+            [field.get_db_prep_save(value, connection) for field, value in zip(model_fields, row)]
+            for row in rows
+        ])
+
+
+def next_pk(model):
+    return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+
+class Command(BaseCommand):
+    help = "Bulk-generate a realistic synthetic store (catalog, customers, seasonal orders, payments, alerts)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', default='10k', help='Number of orders, e.g. 10k, 100k or 1M')
+        parser.add_argument('--customers', type=int, help='Number of customers; defaults to one per 8 orders')
+        parser.add_argument('--days', type=int, default=365, help='Days of history ending today')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed, for repeatable datasets')
+
+    def handle(self, *args, **options):
+        order_count = parse_scale(options['orders'])
+        customer_count = options['customers'] or max(order_count // 8, 50)
+        rng = random.Random(options['seed'])
+        today = timezone.localdate()
+        first_day = today - timedelta(days=options['days'] - 1)
+
+        products = self.create_catalog(rng)
+        customers = self.create_customers(rng, customer_count, first_day, today)
+        self.create_orders(rng, order_count, products, customers, first_day, today)
+
+        # Raw inserts skip the signals, so rebuild what they would have maintained
+        StockAlert.check_and_create_alerts()
+        call_command('rebuild_daily_sales', since=first_day.isoformat(), stdout=self.stdout)
+        call_command('rebuild_customer_summaries', stdout=self.stdout)
+
+        statements = connection.ops.sequence_reset_sql(no_style(), [Customer, Order, OrderItem, Payment])
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {customer_count} customers and {order_count} orders from {first_day} to {today}'
+        ))
+
+    def create_catalog(self, rng):
+        """Create the synthetic flower/filler catalog (once) and return (product_id, name, sku, price, weight) rows"""
+        catalog = []
+        for name, colors, price in FLOWERS:
+            for color in colors:
+                catalog.append((f'{color} {name}'.strip(), 'Flowers', price, 3))
+        for name, price in FILLERS:
+            catalog.append((name, 'Fillers', price, 1))
+
+        Product.objects.bulk_create([
+            Product(
+                name=name,
+                sku=f'SYN-{index:03d}',
+                category=category,
+                price=price,
+                cost_price=(price * Decimal('0.55')).quantize(Decimal('0.01')),
+                # A few products start low or out of stock so alerts exist
+                stock_quantity=rng.choice([0, 3, 8]) if rng.random() < 0.15 else rng.randint(40, 600),
+                low_stock_threshold=10,
+                unit='stem' if category == 'Flowers' else 'bunch',
+            )
+            for index, (name, category, price, _) in enumerate(catalog, 1)
+        ], ignore_conflicts=True)
+
+        weights = {f'SYN-{index:03d}': weight for index, (_, _, _, weight) in enumerate(catalog, 1)}
+        return [
+            (pk, name, sku, price, weights[sku])
+            for pk, name, sku, price in Product.objects.filter(sku__in=weights).values_list('pk', 'name', 'sku', 'price')
+        ]
+
+    def create_customers(self, rng, count, first_day, today):
+        """Create customers signed up over the period (and the quarter before it); returns sorted (created_at, pk) rows"""
+        start = timezone.make_aware(datetime.combine(first_day - timedelta(days=90), time(8)))
+        span = (timezone.make_aware(datetime.combine(today, time(20))) - start).total_seconds()
+        first_pk = next_pk(Customer)
+
+        rows = []
+        for offset in range(count):
+            pk = first_pk + offset
+            first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            created_at = start + timedelta(seconds=rng.random() * span)
+            rows.append((
+                pk, first_name, last_name,
+                f"{first_name}.{last_name.replace(' ', '')}.{pk}@example.com".lower(),
+                f'09{rng.randint(100000000, 999999999)}', f'{rng.randint(1, 999)} Sampaguita St.',
+                rng.choice(CITIES), created_at, created_at,
+            ))
+
+        for start_index in range(0, len(rows), BATCH_SIZE):
+            with transaction.atomic():
+                insert_rows(Customer, (
+                    'customer_id', 'first_name', 'last_name', 'email', 'phone', 'address', 'city',
+                    'created_at', 'updated_at',
+                ), rows[start_index:start_index + BATCH_SIZE])
+        self.stdout.write(f'Created {count} customers')
+        return sorted((row[-2], row[0]) for row in rows)
+
+    def create_orders(self, rng, count, products, customers, first_day, today):
+        """Create `count` orders with items and payments, spread over the days with seasonal spikes"""
+        days = [first_day + timedelta(days=offset) for offset in range((today - first_day).days + 1)]
+        per_day = Counter(rng.choices(days, weights=[day_weight(day) for day in days], k=count))
+        signup_times = [created_at for created_at, _ in customers]
+        product_weights = [product[4] for product in products]
+        methods, method_weights = list(PAYMENT_METHODS), list(PAYMENT_METHODS.values())
+
+        order_numbers = iter(NumberSequence.reserve('ORD', count))
+        order_pk, item_pk, payment_pk = next_pk(Order), next_pk(OrderItem), next_pk(Payment)
+        orders, items, payments = [], [], []
+        created = batches = 0
+
+        for day in days:
+            if not per_day[day]:
+                continue
+            age = (today - day).days
+            payment_numbers = iter(NumberSequence.reserve(f'PAY-{day:%Y%m%d}', per_day[day]))
+            moments = sorted(
+                timezone.make_aware(datetime.combine(day, time(8)) + timedelta(seconds=rng.randint(0, 12 * 3600)))
+                for _ in range(per_day[day])
+            )
+            for created_at in moments:
+                # Only customers who had signed up by then (the earliest one otherwise)
+                signed_up = bisect_right(signup_times, created_at)
+                customer_pk = customers[rng.randrange(signed_up) if signed_up else 0][1]
+
+                if age > 3:
+                    status = rng.choices(['completed', 'cancelled'], weights=[95, 5])[0]
+                else:
+                    status = rng.choices(['pending', 'processing', 'completed'], weights=[50, 30, 20])[0]
+
+                subtotal = Decimal('0')
+                for product_pk, name, sku, price, _ in rng.choices(products, weights=product_weights, k=rng.randint(1, 4)):
+                    quantity = rng.choice([1, 3, 6, 12, 12, 24]) if price < 100 else rng.randint(1, 6)
+                    items.append((item_pk, order_pk, product_pk, quantity, price, name, sku))
+                    item_pk += 1
+                    subtotal += quantity * price
+                discount = (subtotal * Decimal('0.05')).quantize(Decimal('0.01')) if rng.random() < 0.1 else Decimal('0')
+                total = subtotal - discount
+
+                # Stock levels are generated separately, so no order has its items reserved
+                orders.append((
+                    order_pk, customer_pk, f'ORD-{next(order_numbers):04d}-{day:%Y%m%d}', status,
+                    subtotal, Decimal('0'), discount, total, False, created_at, created_at,
+                ))
+                payment_status = {
+                    'completed': 'completed',
+                    'cancelled': 'refunded',
+                    'pending': 'pending',
+                    'processing': rng.choice(['completed', 'pending']),
+                }[status]
+                payments.append((
+                    payment_pk, order_pk, f'PAY-{day:%Y%m%d}-{next(payment_numbers):04d}', total,
+                    rng.choices(methods, weights=method_weights)[0], payment_status,
+                    f'Auto-generated payment for order {orders[-1][2]}', created_at, created_at, created_at,
+                ))
+                order_pk += 1
+                payment_pk += 1
+
+            if len(orders) >= BATCH_SIZE:
+                self.flush(orders, items, payments)
+                created += len(orders)
+                orders, items, payments = [], [], []
+                batches += 1
+                if batches % 10 == 0:
+                    self.stdout.write(f'  {created}/{count} orders')
+        self.flush(orders, items, payments)
+        self.stdout.write(f'Created {count} orders')
+
+    def flush(self, orders, items, payments):
+        if not orders:
+            return
+        with transaction.atomic():
+            insert_rows(Order, (
+                'order_id', 'customer', 'order_number', 'status', 'subtotal', 'tax', 'discount', 'total',
+                'stock_reserved', 'created_at', 'updated_at',
+            ), orders)
+            insert_rows(OrderItem, (
+                'id', 'order', 'product', 'quantity', 'unit_price', 'product_name', 'product_sku',
+            ), items)
+            insert_rows(Payment, (
+                'payment_id', 'order', 'payment_number', 'amount', 'payment_method', 'payment_status',
+                'notes', 'payment_date', 'created_at', 'updated_at',
+            ), payments)
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from pages.models import Customer, CustomerSummary
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized order count / lifetime spend summary of every customer"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of customers refreshed per statement batch')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        total = 0
+        batch = []
+        for customer_id in Customer.objects.order_by('customer_id').values_list('customer_id', flat=True).iterator():
+            batch.append(customer_id)
+            if len(batch) >= batch_size:
+                total += CustomerSummary.refresh_for(batch)
+                batch = []
+        if batch:
+            total += CustomerSummary.refresh_for(batch)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {total} customer summaries"))
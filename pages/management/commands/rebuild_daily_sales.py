@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+from pages.models import DailyPaymentMethodSales, DailySales, Order, Payment
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily sales / payment method rollups from the order and payment history"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='First business day to rebuild (YYYY-MM-DD); defaults to the oldest record')
+        parser.add_argument('--chunk-days', type=int, default=31,
+                            help='Number of business days recomputed per batch')
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        if options['since']:
+            try:
+                first_day = datetime.strptime(options['since'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('--since must be a date in YYYY-MM-DD format')
+        else:
+            oldest = [
+                Order.objects.aggregate(first=Min('created_at'))['first'],
+                Payment.objects.aggregate(first=Min('payment_date'))['first'],
+            ]
+            oldest = [value for value in oldest if value]
+            first_day = timezone.localdate(min(oldest)) if oldest else today
+
+        day = first_day
+        chunk = options['chunk_days']
+        while day <= today:
+            days = {day + timedelta(days=offset) for offset in range(chunk)}
+            days = {d for d in days if d <= today}
+            DailySales.refresh_days(days)
+            DailyPaymentMethodSales.refresh_days(days)
+            day += timedelta(days=chunk)
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt daily sales from {first_day} to {today}"))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from pages.models import StockAlert
+
+
+class Command(BaseCommand):
+    help = "Full scan of the catalog: create missing stock alerts and resolve alerts for restocked products"
+
+    def handle(self, *args, **options):
+        created, resolved = StockAlert.check_and_create_alerts()
+        self.stdout.write(self.style.SUCCESS(
+            f"Stock alerts reconciled: {created} created, {resolved} resolved"
+        ))
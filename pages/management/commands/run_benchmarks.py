@@ -0,0 +1,210 @@
+import json
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from pages.models import Customer, Order, OrderItem, Payment, Product
+
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'benchmarks' / 'baseline.json'
+
+# name -> URL of the read views and endpoints
+GET_BENCHMARKS = {
+    'dashboard': '/dashboard/',
+    'customers': '/customers/',
+    'customers_search': '/customers/?search=santos',
+    'inventory': '/inventory/',
+    'inventory_low_stock': '/inventory/?stock_status=low',
+    'orders': '/orders/',
+    'orders_pending': '/orders/?status=pending',
+    'orders_completed': '/orders/?view=completed',
+    'payments': '/payments/',
+    'reports': '/reports/',
+    'calendar_month': '/ajax/reports/calendar/?month={month}',
+    'products_list': '/ajax/products/list/',
+    'customers_list': '/ajax/customers/list/',
+    'products_lookup': '/ajax/products/lookup/?q=ros',
+    'customers_lookup': '/ajax/customers/lookup/?q=mar',
+    'export_orders_month': '/exports/orders.csv?since={month_start}',
+}
+
+
+class Command(BaseCommand):
+    help = "Time every view and AJAX endpoint in-process (wall time, queries, peak memory) and compare with a baseline"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per benchmark (the median is reported)')
+        parser.add_argument('--only', action='append', default=[], metavar='NAME', help='Run only these benchmarks')
+        parser.add_argument('--cold', action='store_true', help='Clear the cache before every run')
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE), help='Baseline JSON to compare against')
+        parser.add_argument('--update-baseline', action='store_true', help='Store these results as the new baseline')
+        parser.add_argument('--max-regression', type=float, default=25.0,
+                            help='Percent slowdown (median) tolerated before a benchmark counts as a regression')
+        parser.add_argument('--fail-on-regression', action='store_true', help='Exit with an error on any regression')
+
+    def handle(self, *args, **options):
+        results = {}
+        # Writes made by the benchmarks (and the throwaway login) are rolled back
+        with transaction.atomic():
+            user = get_user_model().objects.create_superuser('benchmark-runner', password=None)
+            client = Client(HTTP_HOST='localhost')
+            client.force_login(user)
+
+            for name, (method, url, payload) in self.benchmarks().items():
+                if options['only'] and name not in options['only']:
+                    continue
+                results[name] = self.measure(client, method, url, payload, options['repeat'], options['cold'])
+                self.stdout.write(self.format_result(name, results[name]))
+
+            transaction.set_rollback(True)
+
+        report = {
+            'created_at': timezone.now().isoformat(),
+            'dataset': {
+                'customers': Customer.objects.count(),
+                'products': Product.objects.count(),
+                'orders': Order.objects.count(),
+                'order_items': OrderItem.objects.count(),
+                'payments': Payment.objects.count(),
+            },
+            'repeat': options['repeat'],
+            'cold_cache': options['cold'],
+            'results': results,
+        }
+        if options['output']:
+            self.write_json(options['output'], report)
+        if options['update_baseline']:
+            self.write_json(options['baseline'], report)
+            return
+
+        baseline_path = Path(options['baseline'])
+        if baseline_path.exists():
+            regressions = self.compare(report, json.loads(baseline_path.read_text()), options['max_regression'])
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f"{len(regressions)} benchmarks regressed: {', '.join(regressions)}")
+
+    def benchmarks(self):
+        """name -> (method, url, JSON payload) for every benchmark, with payloads taken from the current data"""
+        today = timezone.localdate()
+        benchmarks = {
+            name: ('GET', url.format(month=today.month, month_start=today.replace(day=1).isoformat()), None)
+            for name, url in GET_BENCHMARKS.items()
+        }
+
+        products = list(Product.objects.filter(is_active=True, stock_quantity__gt=0).values('pk', 'name', 'price')[:3])
+        customer = Customer.objects.values('email', 'first_name', 'last_name').first()
+        order = Order.objects.exclude(status='cancelled').values('pk').first()
+        if products and customer:
+            benchmarks['order_create'] = ('POST', '/ajax/order/create/', {
+                'customer_email': customer['email'],
+                'customer_first_name': customer['first_name'],
+                'customer_last_name': customer['last_name'],
+                'customer_phone': '09170000000',
+                'customer_address': 'Benchmark St.',
+                'payment_method': 'cash',
+                'items': [
+                    {'product_id': product['pk'], 'product_name': product['name'], 'quantity': 1,
+                     'unit_price': str(product['price'])}
+                    for product in products
+                ],
+            })
+        if order:
+            benchmarks['order_update_status'] = ('POST', '/ajax/order/update-status/', {
+                'order_id': order['pk'], 'status': 'processing',
+            })
+        benchmarks['bulk_update_stock'] = ('POST', '/ajax/product/bulk-update-stock/', {
+            'items': [{'product_id': pk, 'delta': 1} for pk in Product.objects.values_list('pk', flat=True)[:50]],
+        })
+        return benchmarks
+
+    def request(self, client, method, url, payload):
+        if method == 'GET':
+            response = client.get(url)
+        else:
+            response = client.post(url, json.dumps(payload), content_type='application/json')
+        size = sum(len(chunk) for chunk in response.streaming_content) if response.streaming else len(response.content)
+        return response.status_code, size
+
+    def run_once(self, client, method, url, payload):
+        # Each run is wrapped in a savepoint that is rolled back, so POSTs leave the data as it was
+        # (the SAVEPOINT / ROLLBACK pair is included in the query counts)
+        with transaction.atomic():
+            result = self.request(client, method, url, payload)
+            transaction.set_rollback(True)
+        return result
+
+    def measure(self, client, method, url, payload, repeat, cold):
+        self.run_once(client, method, url, payload)  # warm-up
+
+        timings = []
+        for _ in range(repeat):
+            if cold:
+                cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                status, size = self.run_once(client, method, url, payload)
+                timings.append((time.perf_counter() - started) * 1000)
+            query_count = len(queries.captured_queries)
+
+        # Memory is measured on its own run; tracing slows everything down
+        if cold:
+            cache.clear()
+        tracemalloc.start()
+        try:
+            self.run_once(client, method, url, payload)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'method': method,
+            'url': url,
+            'status': status,
+            'bytes': size,
+            'median_ms': round(statistics.median(timings), 2),
+            'min_ms': round(min(timings), 2),
+            'max_ms': round(max(timings), 2),
+            'queries': query_count,
+            'peak_kb': round(peak / 1024, 1),
+        }
+
+    def format_result(self, name, result):
+        return (f"{name:<24} {result['status']:>3} {result['median_ms']:>9.1f} ms "
+                f"{result['queries']:>4} queries {result['peak_kb']:>9.1f} KiB peak")
+
+    def compare(self, report, baseline, max_regression):
+        """Print how each benchmark moved against `baseline`; returns the names of the regressions"""
+        self.stdout.write(f"\nCompared with the baseline of {baseline['created_at']} ({baseline['dataset']}):")
+        regressions = []
+        for name, result in report['results'].items():
+            before = baseline['results'].get(name)
+            if before is None:
+                continue
+            change = (result['median_ms'] - before['median_ms']) / before['median_ms'] * 100 if before['median_ms'] else 0
+            slower = change > max_regression
+            more_queries = result['queries'] > before['queries']
+            line = (f"{name:<24} {before['median_ms']:>9.1f} -> {result['median_ms']:>9.1f} ms ({change:+.0f}%)  "
+                    f"{before['queries']:>4} -> {result['queries']:>4} queries")
+            if slower or more_queries:
+                regressions.append(name)
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+        return regressions
+
+    def write_json(self, path, report):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(report, indent=2))
+        self.stdout.write(self.style.SUCCESS(f'Wrote {path}'))
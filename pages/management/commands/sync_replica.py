@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pages.db_routing import replica_configured, sync_replica
+
+
+class Command(BaseCommand):
+    help = "Copy the primary SQLite database into the read replica file (set DJANGO_REPLICA_DB_PATH)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Keep syncing every INTERVAL seconds instead of once')
+
+    def handle(self, *args, **options):
+        if not replica_configured():
+            raise CommandError('No replica database is configured; set DJANGO_REPLICA_DB_PATH')
+
+        while True:
+            elapsed = sync_replica()
+            self.stdout.write(self.style.SUCCESS(f"Replica synced in {elapsed:.2f}s"))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,239 @@
+"""
+In-process metrics, exposed in the Prometheus text format at /metrics/.
+
+Counters and fixed-bucket latency histograms live in a per-process
+registry guarded by a lock, so worker threads can update them freely.
+MetricsMiddleware records every request (by URL name) and the queries it
+ran; the cache lookups and business events are counted where they happen:
+
+    metrics.inc('orders_created_total')
+    metrics.cache_lookup('dashboard_stats', hit=True)
+
+With several worker processes, set METRICS_DIR to a directory shared by
+them. Each process then writes its registry to its own file in it every
+METRICS_FLUSH_SECONDS, and the scrape endpoint adds the files up. The
+counts are cumulative, so the files of exited workers are kept; clear the
+directory when the service starts.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+
+# name -> (type, help) of every metric
+METRICS = {
+    'http_requests_total': ('counter', 'Requests handled, by URL name, method and status'),
+    'http_request_duration_seconds': ('histogram', 'Time to build the response, by URL name'),
+    'db_queries_total': ('counter', 'Database queries run while handling requests, by URL name'),
+    'cache_lookups_total': ('counter', 'Cache lookups by cache and result (hit or miss)'),
+    'orders_created_total': ('counter', 'Orders placed'),
+    'stock_updates_total': ('counter', 'Product stock level changes, by reason'),
+}
+
+# Upper bounds (seconds) of the latency histogram buckets; +Inf is implied
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+FILE_PREFIX = 'metrics-'
+
+
+class Registry:
+    """Counters and histograms of this process, keyed by (name, sorted label pairs)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}  # key -> [count per bucket..., count above the last, sum]
+
+    def inc(self, name, amount=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = _key(name, labels)
+        bucket = next((i for i, bound in enumerate(LATENCY_BUCKETS) if value <= bound), len(LATENCY_BUCKETS))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [0] * (len(LATENCY_BUCKETS) + 2)
+            histogram[bucket] += 1
+            histogram[-1] += value
+
+    def snapshot(self):
+        """JSON-serializable copy of the registry"""
+        with self._lock:
+            return {
+                'counters': [[name, labels, value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, labels, list(values)] for (name, labels), values in self.histograms.items()],
+            }
+
+
+def _key(name, labels):
+    if name not in METRICS:
+        raise ValueError(f'Unknown metric: {name}')
+    return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+
+registry = Registry()
+
+
+def inc(name, amount=1, **labels):
+    registry.inc(name, amount, **labels)
+
+
+def observe(name, value, **labels):
+    registry.observe(name, value, **labels)
+
+
+def cache_lookup(cache_name, hit):
+    registry.inc('cache_lookups_total', cache=cache_name, result='hit' if hit else 'miss')
+
+
+# ---------- Cross-process aggregation ----------
+
+def _metrics_dir():
+    path = getattr(settings, 'METRICS_DIR', None)
+    return Path(path) if path else None
+
+
+def _own_file(directory):
+    return directory / f'{FILE_PREFIX}{os.getpid()}.json'
+
+
+def flush():
+    """Write this process's registry to its file in METRICS_DIR (if set)"""
+    directory = _metrics_dir()
+    if directory is None:
+        return
+    directory.mkdir(parents=True, exist_ok=True)
+    path = _own_file(directory)
+    temporary = path.with_suffix('.tmp')
+    temporary.write_text(json.dumps(registry.snapshot()))
+    # Readers see either the previous file or the new one, never a partial write
+    os.replace(temporary, path)
+
+
+atexit.register(flush)
+
+
+def collect():
+    """Snapshots of every process: this one from memory, the others from METRICS_DIR"""
+    snapshots = [registry.snapshot()]
+    directory = _metrics_dir()
+    if directory is not None and directory.is_dir():
+        own = _own_file(directory)
+        for path in directory.glob(f'{FILE_PREFIX}*.json'):
+            if path == own:
+                continue
+            try:
+                snapshots.append(json.loads(path.read_text()))
+            except (OSError, ValueError):
+                continue  # the process is writing or removing it
+    return snapshots
+
+
+def merge(snapshots):
+    """Add up snapshots into ({key: value}, {key: histogram values})"""
+    counters, histograms = {}, {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            key = name, tuple(map(tuple, labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, values in snapshot['histograms']:
+            key = name, tuple(map(tuple, labels))
+            total = histograms.setdefault(key, [0] * len(values))
+            for i, value in enumerate(values):
+                total[i] += value
+    return counters, histograms
+
+
+# ---------- Text format ----------
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{label}="{_escape(value)}"' for label, value in pairs) + '}'
+
+
+def _number(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render(snapshots):
+    """The merged snapshots in the Prometheus text exposition format"""
+    counters, histograms = merge(snapshots)
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'counter':
+            for (_, labels), value in sorted(item for item in counters.items() if item[0][0] == name):
+                lines.append(f'{name}{_labels(labels)} {_number(value)}')
+            continue
+
+        for (_, labels), values in sorted(item for item in histograms.items() if item[0][0] == name):
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), values[:-1]):
+                cumulative += count
+                le = bound if bound == '+Inf' else f'{bound:g}'
+                lines.append(f'{name}_bucket{_labels(labels + (("le", le),))} {_number(cumulative)}')
+            lines.append(f'{name}_sum{_labels(labels)} {_number(values[-1])}')
+            lines.append(f'{name}_count{_labels(labels)} {_number(cumulative)}')
+    return '\n'.join(lines) + '\n'
+
+
+# ---------- Request metrics ----------
+
+class QueryCounter:
+    """Execute wrapper counting the queries of one request"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """Count requests, their latency and queries per URL name; off when METRICS_ENABLED is False"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.flush_seconds = getattr(settings, 'METRICS_FLUSH_SECONDS', 5)
+        self.flushed_at = time.monotonic()
+
+    def __call__(self, request):
+        queries = QueryCounter()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(queries))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = request.resolver_match
+        view = match.view_name if match is not None else 'unmatched'
+        registry.inc('http_requests_total', view=view, method=request.method, status=response.status_code)
+        registry.observe('http_request_duration_seconds', elapsed, view=view)
+        registry.inc('db_queries_total', queries.count, view=view)
+
+        now = time.monotonic()
+        if now - self.flushed_at >= self.flush_seconds:
+            self.flushed_at = now
+            flush()
+        return response
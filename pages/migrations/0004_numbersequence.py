@@ -0,0 +1,53 @@
+from django.db import migrations, models
+
+
+def seed_sequences(apps, schema_editor):
+    """Start the counters after the highest order/payment numbers already issued"""
+    Order = apps.get_model('pages', 'Order')
+    Payment = apps.get_model('pages', 'Payment')
+    NumberSequence = apps.get_model('pages', 'NumberSequence')
+
+    # ORD-XXXX-YYYYMMDD: XXXX was derived from the previous order_id
+    last_order = 0
+    for order_id, order_number in Order.objects.values_list('order_id', 'order_number').iterator():
+        last_order = max(last_order, order_id)
+        parts = order_number.split('-')
+        if len(parts) == 3 and parts[1].isdigit():
+            last_order = max(last_order, int(parts[1]))
+    if last_order:
+        NumberSequence.objects.create(name='ORD', last_value=last_order)
+
+    # PAY-YYYYMMDD-XXXX: one counter per day
+    last_payment = {}
+    for payment_number in Payment.objects.values_list('payment_number', flat=True).iterator():
+        parts = payment_number.split('-')
+        if len(parts) == 3 and parts[2].isdigit():
+            key = f'PAY-{parts[1]}'
+            last_payment[key] = max(last_payment.get(key, 0), int(parts[2]))
+    NumberSequence.objects.bulk_create([
+        NumberSequence(name=key, last_value=value) for key, value in last_payment.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0003_merge_20260225_0105'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NumberSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Counter key, e.g. ORD or PAY-YYYYMMDD', max_length=50, unique=True)),
+                ('last_value', models.BigIntegerField(default=0, help_text='Last number handed out for this key')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Number Sequence',
+                'verbose_name_plural': 'Number Sequences',
+            },
+        ),
+        migrations.RunPython(seed_sequences, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+
+def build_summaries(apps, schema_editor):
+    """Backfill one summary row per existing customer"""
+    Customer = apps.get_model('pages', 'Customer')
+    Order = apps.get_model('pages', 'Order')
+    Payment = apps.get_model('pages', 'Payment')
+    CustomerSummary = apps.get_model('pages', 'CustomerSummary')
+
+    order_totals = {
+        row['customer_id']: row
+        for row in Order.objects.order_by().values('customer_id').annotate(
+            order_count=Count('order_id'),
+            total_spent=Sum('total'),
+            last_order_date=Max('created_at'),
+            latest_order_id=Max('order_id'),
+        )
+    }
+    paid_totals = dict(
+        Payment.objects.filter(payment_status='completed').order_by().values(
+            'order__customer_id'
+        ).annotate(total=Sum('amount')).values_list('order__customer_id', 'total')
+    )
+    summaries = []
+    for customer_id in Customer.objects.values_list('customer_id', flat=True).iterator():
+        row = order_totals.get(customer_id, {})
+        summaries.append(CustomerSummary(
+            customer_id=customer_id,
+            order_count=row.get('order_count', 0),
+            total_spent=row.get('total_spent') or 0,
+            total_paid=paid_totals.get(customer_id) or 0,
+            last_order_date=row.get('last_order_date'),
+            latest_order_id=row.get('latest_order_id'),
+        ))
+    CustomerSummary.objects.bulk_create(summaries, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0004_numbersequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerSummary',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='pages.customer')),
+                ('order_count', models.IntegerField(default=0)),
+                ('total_spent', models.DecimalField(decimal_places=2, default=0, help_text='Lifetime sum of order totals', max_digits=12)),
+                ('total_paid', models.DecimalField(decimal_places=2, default=0, help_text='Lifetime sum of completed payments', max_digits=12)),
+                ('last_order_date', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('latest_order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='pages.order')),
+            ],
+            options={
+                'verbose_name': 'Customer Summary',
+                'verbose_name_plural': 'Customer Summaries',
+            },
+        ),
+        migrations.RunPython(build_summaries, migrations.RunPython.noop),
+    ]
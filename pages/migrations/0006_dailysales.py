@@ -0,0 +1,88 @@
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def backfill_rollups(apps, schema_editor):
+    """Aggregate the existing order/payment history into the rollup tables"""
+    Order = apps.get_model('pages', 'Order')
+    OrderItem = apps.get_model('pages', 'OrderItem')
+    Payment = apps.get_model('pages', 'Payment')
+    DailySales = apps.get_model('pages', 'DailySales')
+    DailyPaymentMethodSales = apps.get_model('pages', 'DailyPaymentMethodSales')
+    tz = timezone.get_current_timezone()
+
+    items_sold = dict(
+        OrderItem.objects.filter(order__status='completed').annotate(
+            day=TruncDate('order__created_at', tzinfo=tz)
+        ).order_by().values('day').annotate(quantity=Sum('quantity')).values_list('day', 'quantity')
+    )
+    DailySales.objects.bulk_create([
+        DailySales(
+            business_date=row['day'],
+            order_count=row['order_count'],
+            revenue=row['revenue'] or 0,
+            items_sold=items_sold.get(row['day']) or 0,
+        )
+        for row in Order.objects.filter(status='completed').annotate(
+            day=TruncDate('created_at', tzinfo=tz)
+        ).order_by().values('day').annotate(order_count=Count('order_id'), revenue=Sum('total'))
+    ], batch_size=500)
+    DailyPaymentMethodSales.objects.bulk_create([
+        DailyPaymentMethodSales(
+            business_date=row['day'],
+            payment_method=row['payment_method'],
+            payment_count=row['payment_count'],
+            amount=row['amount'] or 0,
+        )
+        for row in Payment.objects.filter(payment_status='completed').annotate(
+            day=TruncDate('payment_date', tzinfo=tz)
+        ).order_by().values('day', 'payment_method').annotate(
+            payment_count=Count('payment_id'), amount=Sum('amount')
+        )
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0005_customersummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('business_date', models.DateField(help_text='Local (TIME_ZONE) calendar date', unique=True)),
+                ('order_count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, help_text='Sum of completed order totals', max_digits=12)),
+                ('items_sold', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Daily Sales',
+                'verbose_name_plural': 'Daily Sales',
+                'ordering': ['-business_date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyPaymentMethodSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('business_date', models.DateField(help_text='Local (TIME_ZONE) calendar date of the payment')),
+                ('payment_method', models.CharField(choices=[('cash', 'Cash'), ('credit_card', 'Credit Card'), ('debit_card', 'Debit Card'), ('bank_transfer', 'Bank Transfer'), ('gcash', 'GCash'), ('paymaya', 'PayMaya'), ('other', 'Other')], max_length=20)),
+                ('payment_count', models.IntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Daily Payment Method Sales',
+                'verbose_name_plural': 'Daily Payment Method Sales',
+                'ordering': ['-business_date', 'payment_method'],
+                'unique_together': {('business_date', 'payment_method')},
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+from django.db import migrations
+
+from pages import triggers
+
+
+# FTS5 tables keyed by the primary key of the row they index (rowid), kept
+# in sync by triggers (pages.triggers) so bulk updates and cascades are
+# covered as well.
+TOKENIZE = "tokenize = 'unicode61 remove_diacritics 2'"
+
+CREATE_SQL = [
+    f"CREATE VIRTUAL TABLE pages_search_customer USING fts5(first_name, last_name, email, phone, {TOKENIZE})",
+    f"CREATE VIRTUAL TABLE pages_search_product USING fts5(name, sku, {TOKENIZE})",
+    f"CREATE VIRTUAL TABLE pages_search_order USING fts5(order_number, customer_name, customer_email, {TOKENIZE})",
+    f"CREATE VIRTUAL TABLE pages_search_payment USING fts5(payment_number, order_number, transaction_id, {TOKENIZE})",
+]
+
+BACKFILL_SQL = [
+    """INSERT INTO pages_search_customer(rowid, first_name, last_name, email, phone)
+    SELECT customer_id, first_name, last_name, email, phone FROM pages_customer""",
+    """INSERT INTO pages_search_product(rowid, name, sku)
+    SELECT product_id, name, sku FROM pages_product""",
+    """INSERT INTO pages_search_order(rowid, order_number, customer_name, customer_email)
+    SELECT o.order_id, o.order_number, c.first_name || ' ' || c.last_name, c.email
+    FROM pages_order o JOIN pages_customer c ON c.customer_id = o.customer_id""",
+    """INSERT INTO pages_search_payment(rowid, payment_number, order_number, transaction_id)
+    SELECT p.payment_id, p.payment_number, o.order_number, p.transaction_id
+    FROM pages_payment p JOIN pages_order o ON o.order_id = p.order_id""",
+]
+
+DROP_SQL = [
+    f"DROP TABLE IF EXISTS pages_search_{table}"
+    for table in ('customer', 'product', 'order', 'payment')
+]
+
+
+def create_search_index(apps, schema_editor):
+    """FTS5 is SQLite only; other databases keep searching with icontains"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in CREATE_SQL:
+        schema_editor.execute(sql)
+    triggers.install(schema_editor.connection, triggers.SEARCH_TRIGGERS)
+    for sql in BACKFILL_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    triggers.uninstall(schema_editor.connection, triggers.SEARCH_TRIGGERS)
+    for sql in DROP_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0006_dailysales'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,67 @@
+from django.db import migrations, models
+
+
+def resolve_duplicate_alerts(apps, schema_editor):
+    """Keep only the newest active alert per product so the unique constraint can be added"""
+    StockAlert = apps.get_model('pages', 'StockAlert')
+    seen = set()
+    duplicates = []
+    for alert_id, product_id in StockAlert.objects.filter(
+        alert_status='active'
+    ).order_by('product_id', '-created_at', '-alert_id').values_list('alert_id', 'product_id'):
+        if product_id in seen:
+            duplicates.append(alert_id)
+        seen.add(product_id)
+    if duplicates:
+        StockAlert.objects.filter(alert_id__in=duplicates).update(alert_status='resolved')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0007_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['created_at'], name='customer_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['created_at'], name='order_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(fields=['product_name', 'product', 'quantity', 'unit_price'], name='orderitem_product_sales_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['payment_date'], name='payment_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['payment_status', 'payment_date'], name='payment_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', 'category', 'name'], name='product_active_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', 'stock_quantity'], name='product_active_stock_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockalert',
+            index=models.Index(fields=['product', 'alert_status'], name='stockalert_product_status_idx'),
+        ),
+        migrations.RunPython(resolve_duplicate_alerts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='stockalert',
+            constraint=models.UniqueConstraint(condition=models.Q(('alert_status', 'active')), fields=('product',), name='stockalert_one_active_per_product'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Order.stock_reserved, False for every existing order: their stock was
+    never taken out, so cancelling them must not put any back.
+
+    Added with a plain ADD COLUMN: the table rebuild Django does for this on
+    SQLite trips over the search index triggers on pages_order.
+    """
+
+    dependencies = [
+        ('pages', '0008_indexes'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    'ALTER TABLE pages_order ADD COLUMN stock_reserved bool DEFAULT 0 NOT NULL',
+                    'ALTER TABLE pages_order DROP COLUMN stock_reserved',
+                ),
+            ],
+            state_operations=[
+                migrations.AddField(
+                    model_name='order',
+                    name='stock_reserved',
+                    field=models.BooleanField(db_default=False, default=False, editable=False,
+                                              help_text='Whether the items of this order are taken out of stock'),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,42 @@
+from django.db import migrations, models
+
+from pages import triggers
+
+
+def create_versions(apps, schema_editor):
+    """One counter per tracked table, then the triggers that bump them (pages.triggers)"""
+    for table in triggers.VERSIONED_TABLES:
+        schema_editor.execute(
+            "INSERT INTO pages_tableversion (\"table\", version, changed_at) "
+            "VALUES (%s, 0, strftime('%%Y-%%m-%%d %%H:%%M:%%f', 'now'))",
+            [table],
+        )
+    triggers.install(schema_editor.connection, triggers.VERSION_TRIGGERS)
+
+
+def drop_versions(apps, schema_editor):
+    triggers.uninstall(schema_editor.connection, triggers.VERSION_TRIGGERS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0009_order_stock_reserved'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TableVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('table', models.CharField(help_text='Database table the counter follows', max_length=100, unique=True)),
+                ('version', models.BigIntegerField(default=0, help_text='Rows inserted, updated or deleted so far')),
+                ('changed_at', models.DateTimeField(blank=True, help_text='When the last row was written', null=True)),
+            ],
+            options={
+                'verbose_name': 'Table Version',
+                'verbose_name_plural': 'Table Versions',
+            },
+        ),
+        migrations.RunPython(create_versions, drop_versions),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations, models
+
+from pages import triggers
+
+
+def create_catalog_version(apps, schema_editor):
+    schema_editor.execute(
+        "INSERT INTO pages_tableversion (\"table\", version, changed_at) "
+        "VALUES ('pages_product:catalog', 0, strftime('%%Y-%%m-%%d %%H:%%M:%%f', 'now'))",
+        [],
+    )
+    triggers.install(schema_editor.connection, triggers.CATALOG_TRIGGERS)
+
+
+def drop_catalog_version(apps, schema_editor):
+    triggers.uninstall(schema_editor.connection, triggers.CATALOG_TRIGGERS)
+    schema_editor.execute("DELETE FROM pages_tableversion WHERE \"table\" = 'pages_product:catalog'")
+
+
+class Migration(migrations.Migration):
+    """
+    A 'pages_product:catalog' counter, bumped only when a product is added,
+    removed or has one of the snapshot columns changed (pages.triggers).
+    """
+
+    dependencies = [
+        ('pages', '0010_table_versions'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tableversion',
+            name='table',
+            field=models.CharField(help_text='Database table (or table:column group) the counter follows',
+                                   max_length=100, unique=True),
+        ),
+        migrations.RunPython(create_catalog_version, drop_catalog_version),
+    ]
@@ -22,6 +22,10 @@ class Customer(models.Model):
    
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Customer list order and "new today" counts
+            models.Index(fields=['created_at'], name='customer_created_idx'),
+        ]
         verbose_name = 'Customer'
         verbose_name_plural = 'Customers'
    
@@ -60,6 +64,12 @@ class Product(models.Model):
    
     class Meta:
         ordering = ['name']
+        indexes = [
+            # Inventory list: active products by category and name
+            models.Index(fields=['is_active', 'category', 'name'], name='product_active_category_idx'),
+            # Low / out of stock counts and alerts
+            models.Index(fields=['is_active', 'stock_quantity'], name='product_active_stock_idx'),
+        ]
         verbose_name = 'Product'
         verbose_name_plural = 'Products'
    
@@ -85,6 +95,78 @@ class Product(models.Model):
 
 
 
+class NumberSequence(models.Model):
+    """Number Sequence model - atomic counters used to allocate order/payment numbers"""
+    name = models.CharField(max_length=50, unique=True, help_text="Counter key, e.g. ORD or PAY-YYYYMMDD")
+    last_value = models.BigIntegerField(default=0, help_text="Last number handed out for this key")
+    updated_at = models.DateTimeField(auto_now=True)
+   
+    class Meta:
+        verbose_name = 'Number Sequence'
+        verbose_name_plural = 'Number Sequences'
+   
+    def __str__(self):
+        return f"{self.name}: {self.last_value}"
+   
+    @classmethod
+    def reserve(cls, name, count=1):
+        """
+        Reserve a block of `count` consecutive numbers for `name` and return them as a range.
+
+        The counter row is created or incremented with a single
+        INSERT ... ON CONFLICT DO UPDATE ... RETURNING statement, so concurrent
+        callers can never be handed the same number.
+        """
+        from django.db import connections, router, transaction
+
+        if count < 1:
+            raise ValueError("count must be at least 1")
+
+        using = router.db_for_write(cls)
+        connection = connections[using]
+        if connection.vendor in ('sqlite', 'postgresql'):
+            table = connection.ops.quote_name(cls._meta.db_table)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"INSERT INTO {table} (name, last_value, updated_at) VALUES (%s, %s, %s) "
+                    f"ON CONFLICT (name) DO UPDATE SET "
+                    f"last_value = {table}.last_value + excluded.last_value, "
+                    f"updated_at = excluded.updated_at "
+                    f"RETURNING last_value",
+                    [name, count, timezone.now()]
+                )
+                last_value = cursor.fetchone()[0]
+        else:
+            # Fallback for backends without upsert + RETURNING: lock the counter row
+            with transaction.atomic(using=using):
+                sequence, _ = cls.objects.using(using).select_for_update().get_or_create(name=name)
+                sequence.last_value += count
+                sequence.save(using=using, update_fields=['last_value', 'updated_at'])
+                last_value = sequence.last_value
+        return range(last_value - count + 1, last_value + 1)
+   
+    @classmethod
+    def next_value(cls, name):
+        """Get the next number for `name`"""
+        return cls.reserve(name, 1)[0]
+
+
+
+
+class TableVersion(models.Model):
+    """Table Version model - a change counter per table, bumped by database triggers on every row written"""
+    table = models.CharField(max_length=100, unique=True, help_text="Database table (or table:column group) the counter follows")
+    version = models.BigIntegerField(default=0, help_text="Rows inserted, updated or deleted so far")
+    changed_at = models.DateTimeField(null=True, blank=True, help_text="When the last row was written")
+   
+    class Meta:
+        verbose_name = 'Table Version'
+        verbose_name_plural = 'Table Versions'
+   
+    def __str__(self):
+        return f"{self.table}: {self.version}"
+
+
 class Order(models.Model):
     """Order model - stores order information"""
     STATUS_CHOICES = [
@@ -104,6 +186,8 @@ class Order(models.Model):
     customer_address = models.TextField(blank=True, help_text="Delivery address for this order")
     fulfilled_by = models.CharField(max_length=100, blank=True, default='',
                                     help_text="Who fulfilled the order (staff name)")
+    stock_reserved = models.BooleanField(default=False, db_default=False, editable=False,
+                                         help_text="Whether the items of this order are taken out of stock")
    
     # Order totals (calculated from order items)
     subtotal = models.DecimalField(max_digits=10, decimal_places=2, default=0)
@@ -116,6 +200,12 @@ class Order(models.Model):
    
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Order list (newest first) and date-range reports
+            models.Index(fields=['created_at'], name='order_created_idx'),
+            # Status filters and per-status counts, newest first
+            models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+        ]
         verbose_name = 'Order'
         verbose_name_plural = 'Orders'
    
@@ -125,18 +215,15 @@ class Order(models.Model):
     def save(self, *args, **kwargs):
         """Generate order number if not exists"""
         if not self.order_number:
-            # Generate order number: ORD-XXXX-YYYYMMDD
-            from django.utils import timezone
-            today = timezone.now().strftime('%Y%m%d')
-            last_order = Order.objects.order_by('-order_id').first()
-            if last_order:
-                last_num = int(last_order.order_id)
-                new_num = last_num + 1
-            else:
-                new_num = 1
-            self.order_number = f'ORD-{new_num:04d}-{today}'
+            self.order_number = Order.reserve_order_numbers(1)[0]
         super().save(*args, **kwargs)
    
+    @classmethod
+    def reserve_order_numbers(cls, count):
+        """Reserve `count` order numbers (ORD-XXXX-YYYYMMDD) in one round-trip, e.g. for bulk inserts"""
+        today = timezone.now().strftime('%Y%m%d')
+        return [f'ORD-{num:04d}-{today}' for num in NumberSequence.reserve('ORD', count)]
+   
     def calculate_totals(self):
         """Calculate order totals from order items"""
         items = self.items.all()
@@ -167,6 +254,13 @@ class OrderItem(models.Model):
     product_sku = models.CharField(max_length=100)
    
     class Meta:
+        indexes = [
+            # Covers the top products report (grouped by product, summing quantity and revenue)
+            models.Index(
+                fields=['product_name', 'product', 'quantity', 'unit_price'],
+                name='orderitem_product_sales_idx'
+            ),
+        ]
         verbose_name = 'Order Item'
         verbose_name_plural = 'Order Items'
    
@@ -223,6 +317,12 @@ class Payment(models.Model):
    
     class Meta:
         ordering = ['-payment_date']
+        indexes = [
+            # Payment list (latest first) and date-range reports
+            models.Index(fields=['payment_date'], name='payment_date_idx'),
+            # Revenue by status and period
+            models.Index(fields=['payment_status', 'payment_date'], name='payment_status_date_idx'),
+        ]
         verbose_name = 'Payment'
         verbose_name_plural = 'Payments'
    
@@ -232,16 +332,14 @@ class Payment(models.Model):
     def save(self, *args, **kwargs):
         """Generate payment number if not exists"""
         if not self.payment_number:
-            # Generate payment number: PAY-YYYYMMDD-XXXX
-            today = timezone.now().strftime('%Y%m%d')
-            last_payment = Payment.objects.filter(payment_number__startswith=f'PAY-{today}').order_by('-payment_number').first()
-            if last_payment:
-                last_num = int(last_payment.payment_number.split('-')[-1])
-                new_num = last_num + 1
-            else:
-                new_num = 1
-            self.payment_number = f'PAY-{today}-{new_num:04d}'
+            self.payment_number = Payment.reserve_payment_numbers(1)[0]
         super().save(*args, **kwargs)
+   
+    @classmethod
+    def reserve_payment_numbers(cls, count):
+        """Reserve `count` payment numbers (PAY-YYYYMMDD-XXXX) in one round-trip, e.g. for bulk inserts"""
+        today = timezone.now().strftime('%Y%m%d')
+        return [f'PAY-{today}-{num:04d}' for num in NumberSequence.reserve(f'PAY-{today}', count)]
 
 
 
@@ -270,6 +368,16 @@ class StockAlert(models.Model):
    
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['product', 'alert_status'], name='stockalert_product_status_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['product'],
+                condition=models.Q(alert_status='active'),
+                name='stockalert_one_active_per_product',
+            ),
+        ]
         verbose_name = 'Stock Alert'
         verbose_name_plural = 'Stock Alerts'
    
@@ -277,30 +385,272 @@ class StockAlert(models.Model):
         return f"{self.alert_type} - {self.product.name}"
    
     @classmethod
-    def check_and_create_alerts(cls):
-        """Check all products and create alerts for low/out of stock items"""
-        from django.db.models import Q
-       
-        products = Product.objects.filter(is_active=True)
-        for product in products:
-            # Check if there's already an active alert for this product
-            existing_alert = cls.objects.filter(
-                product=product,
-                alert_status='active'
-            ).exists()
-           
-            if not existing_alert:
-                if product.is_out_of_stock():
-                    cls.objects.create(
-                        product=product,
-                        alert_type='out_of_stock',
-                        stock_level_at_alert=product.stock_quantity,
-                        message=f"{product.name} is out of stock!"
+    def check_and_create_alerts(cls, product_ids=None):
+        """
+        Create alerts for low/out of stock products and resolve alerts for restocked ones.
+
+        Pass the IDs of the products that changed to only re-evaluate those;
+        leave it as None for a full scan (nightly reconciliation).
+        Returns a (created, resolved) tuple of counts.
+        """
+        from django.db.models import F, Q
+
+        if product_ids is not None:
+            product_ids = {int(pk) for pk in product_ids if pk is not None}
+            if not product_ids:
+                return 0, 0
+
+        # Active products at or below their threshold need an alert
+        low_products = Product.objects.filter(
+            is_active=True,
+            stock_quantity__lte=F('low_stock_threshold')
+        )
+        if product_ids is not None:
+            low_products = low_products.filter(product_id__in=product_ids)
+        low_products = list(low_products.values_list(
+            'product_id', 'name', 'unit', 'stock_quantity'
+        ))
+        low_ids = [row[0] for row in low_products]
+
+        already_alerted = set(cls.objects.filter(
+            product_id__in=low_ids,
+            alert_status='active'
+        ).values_list('product_id', flat=True)) if low_ids else set()
+
+        new_alerts = []
+        for product_id, name, unit, stock_quantity in low_products:
+            if product_id in already_alerted:
+                continue
+            if stock_quantity == 0:
+                new_alerts.append(cls(
+                    product_id=product_id,
+                    alert_type='out_of_stock',
+                    stock_level_at_alert=stock_quantity,
+                    message=f"{name} is out of stock!"
+                ))
+            else:
+                new_alerts.append(cls(
+                    product_id=product_id,
+                    alert_type='low_stock',
+                    stock_level_at_alert=stock_quantity,
+                    message=f"{name} stock is low ({stock_quantity} {unit} remaining)"
+                ))
+        if new_alerts:
+            # A concurrent evaluation may have alerted first; one active alert per product is enforced
+            cls.objects.bulk_create(new_alerts, ignore_conflicts=True)
+
+        # Auto-resolve active alerts for restocked or deactivated products
+        restocked = cls.objects.filter(alert_status='active').filter(
+            Q(product__stock_quantity__gt=F('product__low_stock_threshold')) |
+            Q(product__is_active=False)
+        )
+        if product_ids is not None:
+            restocked = restocked.filter(product_id__in=product_ids)
+        resolved = restocked.update(alert_status='resolved', resolved_at=timezone.now())
+
+        return len(new_alerts), resolved
+
+
+
+
+class CustomerSummary(models.Model):
+    """Customer Summary model - per-customer order aggregates maintained on write"""
+    customer = models.OneToOneField(Customer, on_delete=models.CASCADE, primary_key=True, related_name='summary')
+    order_count = models.IntegerField(default=0)
+    total_spent = models.DecimalField(max_digits=12, decimal_places=2, default=0,
+                                      help_text="Lifetime sum of order totals")
+    total_paid = models.DecimalField(max_digits=12, decimal_places=2, default=0,
+                                     help_text="Lifetime sum of completed payments")
+    last_order_date = models.DateTimeField(null=True, blank=True)
+    latest_order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    updated_at = models.DateTimeField(auto_now=True)
+   
+    class Meta:
+        verbose_name = 'Customer Summary'
+        verbose_name_plural = 'Customer Summaries'
+   
+    def __str__(self):
+        return f"Summary for customer {self.customer_id}"
+   
+    @classmethod
+    def refresh_for(cls, customer_ids):
+        """Recompute and store the summaries of the given customers in a few bulk statements"""
+        from django.db import transaction
+        from django.db.models import Count, Max, Sum
+
+        customer_ids = {int(pk) for pk in customer_ids if pk is not None}
+        if not customer_ids:
+            return 0
+
+        with transaction.atomic():
+            order_totals = {
+                row['customer_id']: row
+                for row in Order.objects.filter(customer_id__in=customer_ids).order_by().values(
+                    'customer_id'
+                ).annotate(
+                    order_count=Count('order_id'),
+                    total_spent=Sum('total'),
+                    last_order_date=Max('created_at'),
+                    latest_order_id=Max('order_id'),
+                )
+            }
+            paid_totals = dict(
+                Payment.objects.filter(
+                    order__customer_id__in=customer_ids,
+                    payment_status='completed'
+                ).order_by().values('order__customer_id').annotate(
+                    total=Sum('amount')
+                ).values_list('order__customer_id', 'total')
+            )
+            existing_ids = Customer.objects.filter(
+                customer_id__in=customer_ids
+            ).values_list('customer_id', flat=True)
+
+            summaries = []
+            for customer_id in existing_ids:
+                row = order_totals.get(customer_id, {})
+                summaries.append(cls(
+                    customer_id=customer_id,
+                    order_count=row.get('order_count', 0),
+                    total_spent=row.get('total_spent') or Decimal('0.00'),
+                    total_paid=paid_totals.get(customer_id) or Decimal('0.00'),
+                    last_order_date=row.get('last_order_date'),
+                    latest_order_id=row.get('latest_order_id'),
+                    updated_at=timezone.now(),
+                ))
+            cls.objects.bulk_create(
+                summaries,
+                update_conflicts=True,
+                unique_fields=['customer'],
+                update_fields=['order_count', 'total_spent', 'total_paid',
+                               'last_order_date', 'latest_order', 'updated_at'],
+            )
+        return len(summaries)
+
+
+
+
+class DailySales(models.Model):
+    """Daily Sales model - per business day rollup of completed orders"""
+    business_date = models.DateField(unique=True, help_text="Local (TIME_ZONE) calendar date")
+    order_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0,
+                                  help_text="Sum of completed order totals")
+    items_sold = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+   
+    class Meta:
+        ordering = ['-business_date']
+        verbose_name = 'Daily Sales'
+        verbose_name_plural = 'Daily Sales'
+   
+    def __str__(self):
+        return f"{self.business_date}: {self.order_count} orders, ₱{self.revenue:,.2f}"
+   
+    @staticmethod
+    def day_bounds(first_day, last_day=None):
+        """Get the aware [start, end) datetimes covering local dates first_day..last_day"""
+        from datetime import datetime, time, timedelta
+
+        last_day = last_day or first_day
+        start = timezone.make_aware(datetime.combine(first_day, time.min))
+        end = timezone.make_aware(datetime.combine(last_day + timedelta(days=1), time.min))
+        return start, end
+   
+    @classmethod
+    def refresh_days(cls, days):
+        """Recompute the completed-order rollups of the given business days"""
+        from django.db import transaction
+        from django.db.models import Count, Sum
+        from django.db.models.functions import TruncDate
+
+        days = {day for day in days if day is not None}
+        if not days:
+            return
+        start, end = cls.day_bounds(min(days), max(days))
+        tz = timezone.get_current_timezone()
+
+        with transaction.atomic():
+            orders = Order.objects.filter(
+                status='completed', created_at__gte=start, created_at__lt=end
+            ).annotate(day=TruncDate('created_at', tzinfo=tz)).order_by().values('day').annotate(
+                order_count=Count('order_id'), revenue=Sum('total')
+            )
+            order_totals = {row['day']: row for row in orders if row['day'] in days}
+
+            items = OrderItem.objects.filter(
+                order__status='completed', order__created_at__gte=start, order__created_at__lt=end
+            ).annotate(day=TruncDate('order__created_at', tzinfo=tz)).order_by().values('day').annotate(
+                quantity=Sum('quantity')
+            )
+            items_sold = {row['day']: row['quantity'] for row in items}
+
+            now = timezone.now()
+            cls.objects.bulk_create(
+                [
+                    cls(
+                        business_date=day,
+                        order_count=order_totals.get(day, {}).get('order_count', 0),
+                        revenue=order_totals.get(day, {}).get('revenue') or Decimal('0.00'),
+                        items_sold=items_sold.get(day) or 0,
+                        updated_at=now,
                     )
-                elif product.is_low_stock():
-                    cls.objects.create(
-                        product=product,
-                        alert_type='low_stock',
-                        stock_level_at_alert=product.stock_quantity,
-                        message=f"{product.name} stock is low ({product.stock_quantity} {product.unit} remaining)"
-                    )
\ No newline at end of file
+                    for day in days
+                ],
+                update_conflicts=True,
+                unique_fields=['business_date'],
+                update_fields=['order_count', 'revenue', 'items_sold', 'updated_at'],
+            )
+
+
+
+
+class DailyPaymentMethodSales(models.Model):
+    """Daily Payment Method Sales model - per business day and method rollup of completed payments"""
+    business_date = models.DateField(help_text="Local (TIME_ZONE) calendar date of the payment")
+    payment_method = models.CharField(max_length=20, choices=Payment.PAYMENT_METHOD_CHOICES)
+    payment_count = models.IntegerField(default=0)
+    amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+   
+    class Meta:
+        ordering = ['-business_date', 'payment_method']
+        unique_together = [('business_date', 'payment_method')]
+        verbose_name = 'Daily Payment Method Sales'
+        verbose_name_plural = 'Daily Payment Method Sales'
+   
+    def __str__(self):
+        return f"{self.business_date} {self.payment_method}: ₱{self.amount:,.2f}"
+   
+    @classmethod
+    def refresh_days(cls, days):
+        """Recompute the per-method payment rollups of the given business days"""
+        from django.db import transaction
+        from django.db.models import Count, Sum
+        from django.db.models.functions import TruncDate
+
+        days = {day for day in days if day is not None}
+        if not days:
+            return
+        start, end = DailySales.day_bounds(min(days), max(days))
+        tz = timezone.get_current_timezone()
+
+        with transaction.atomic():
+            payments = Payment.objects.filter(
+                payment_status='completed', payment_date__gte=start, payment_date__lt=end
+            ).annotate(day=TruncDate('payment_date', tzinfo=tz)).order_by().values(
+                'day', 'payment_method'
+            ).annotate(payment_count=Count('payment_id'), amount=Sum('amount'))
+
+            now = timezone.now()
+            cls.objects.filter(business_date__in=days).delete()
+            cls.objects.bulk_create([
+                cls(
+                    business_date=row['day'],
+                    payment_method=row['payment_method'],
+                    payment_count=row['payment_count'],
+                    amount=row['amount'] or Decimal('0.00'),
+                    updated_at=now,
+                )
+                for row in payments if row['day'] in days
+            ])
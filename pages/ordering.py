@@ -0,0 +1,378 @@
+"""
+Order placement: the write path behind order_create_ajax, plus the stock
+moves it shares with order status changes and bulk restocks.
+
+Everything happens in one transaction with a fixed number of queries,
+however many lines the order has: products are read with one query inside
+the transaction, stock is reserved with one conditional UPDATE, items are
+inserted with one bulk INSERT and totals are computed in memory, so the
+order and its payment are each written once.
+"""
+import time
+import uuid
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from . import metrics
+from .context_processors import bump_notification_version
+from .dashboard_stats import bump_dashboard_version
+from .models import Customer, Order, OrderItem, Payment, Product, StockAlert
+
+
+class OrderError(ValueError):
+    """Order input that cannot be placed; the message is safe to show to the user"""
+
+
+class OutOfStock(OrderError):
+    """Not enough stock for some of the products of an order"""
+
+    def __init__(self, shortages):
+        self.shortages = shortages
+        super().__init__('Not enough stock for ' + ', '.join(
+            f"{shortage['name']} ({shortage['available']} left, {shortage['requested']} requested)"
+            for shortage in shortages
+        ))
+
+
+class _Shortfall(Exception):
+    pass
+
+
+def _per_product(quantities):
+    """CASE expression giving the quantity of each product in `quantities`"""
+    return Case(
+        *[When(pk=pk, then=Value(quantity)) for pk, quantity in quantities.items()],
+        output_field=IntegerField()
+    )
+
+
+def _stock_changed(product_ids, reason):
+    """Feed products whose stock moved into the alert pipeline, the cached counters and the metrics"""
+    StockAlert.check_and_create_alerts(product_ids)
+    transaction.on_commit(bump_notification_version)
+    transaction.on_commit(bump_dashboard_version)
+    count = len(product_ids)
+    transaction.on_commit(lambda: metrics.inc('stock_updates_total', count, reason=reason))
+
+
+def reserve_stock(quantities):
+    """
+    Take `quantities` ({product_id: quantity}) out of stock, all or nothing.
+
+    One conditional UPDATE ... SET stock_quantity = stock_quantity - n
+    WHERE stock_quantity >= n covers every product, so concurrent orders
+    can never oversell or lose an update. Raises OutOfStock otherwise.
+    """
+    quantities = {pk: quantity for pk, quantity in quantities.items() if quantity > 0}
+    if not quantities:
+        return
+
+    needed = _per_product(quantities)
+    try:
+        with transaction.atomic():
+            reserved = Product.objects.filter(
+                pk__in=quantities,
+                stock_quantity__gte=needed
+            ).update(stock_quantity=F('stock_quantity') - needed, updated_at=timezone.now())
+            if reserved != len(quantities):
+                raise _Shortfall
+    except _Shortfall:
+        # The savepoint is rolled back, so these are the stock levels we ran into
+        raise OutOfStock(stock_shortages(quantities))
+
+    _stock_changed(quantities, 'reserve')
+
+
+def stock_shortages(quantities):
+    """Shortages (as in OutOfStock) of the products that cannot cover `quantities` right now"""
+    quantities = {pk: quantity for pk, quantity in quantities.items() if quantity > 0}
+    if not quantities:
+        return []
+    return [
+        {
+            'product_id': product['pk'],
+            'name': product['name'],
+            'available': product['stock_quantity'],
+            'requested': quantities[product['pk']],
+        }
+        for product in Product.objects.filter(
+            pk__in=quantities,
+            stock_quantity__lt=_per_product(quantities)
+        ).values('pk', 'name', 'stock_quantity')
+    ]
+
+
+def release_stock(quantities):
+    """Put `quantities` ({product_id: quantity}) back into stock with one UPDATE"""
+    quantities = {pk: quantity for pk, quantity in quantities.items() if quantity > 0}
+    if not quantities:
+        return
+
+    returned = _per_product(quantities)
+    Product.objects.filter(pk__in=quantities).update(
+        stock_quantity=F('stock_quantity') + returned,
+        updated_at=timezone.now()
+    )
+    _stock_changed(quantities, 'release')
+
+
+def set_stock_levels(changes):
+    """
+    Apply many stock corrections (e.g. a delivery) in one transaction.
+
+    Each change is {'product_id', 'stock_quantity'} for a new level or
+    {'product_id', 'delta'} to add to (or take from) the current one.
+    Changes that are invalid, unknown or would leave negative stock are
+    skipped. Every product that moved is written with one CASE UPDATE and
+    re-evaluated for alerts once. Returns one result dict per change.
+    """
+    results = [None] * len(changes)
+    parsed = []
+    for index, change in enumerate(changes):
+        try:
+            product_id = int(change['product_id'])
+            if 'stock_quantity' in change:
+                parsed.append((index, product_id, None, int(change['stock_quantity'])))
+            else:
+                parsed.append((index, product_id, int(change['delta']), None))
+        except (KeyError, TypeError, ValueError):
+            results[index] = {
+                'product_id': change.get('product_id') if isinstance(change, dict) else None,
+                'success': False,
+                'message': 'Each item needs a product_id and a stock_quantity or delta',
+            }
+
+    with transaction.atomic():
+        products = Product.objects.select_for_update().only(
+            'product_id', 'name', 'stock_quantity', 'low_stock_threshold'
+        ).in_bulk({product_id for _, product_id, _, _ in parsed})
+        original = {pk: product.stock_quantity for pk, product in products.items()}
+
+        for index, product_id, delta, level in parsed:
+            product = products.get(product_id)
+            if product is None:
+                results[index] = {'product_id': product_id, 'success': False, 'message': 'Product not found'}
+                continue
+            old_stock = product.stock_quantity
+            new_stock = level if delta is None else old_stock + delta
+            if new_stock < 0:
+                results[index] = {
+                    'product_id': product_id,
+                    'success': False,
+                    'message': f'{product.name} cannot go below zero ({old_stock} in stock)',
+                }
+                continue
+            product.stock_quantity = new_stock
+            results[index] = {
+                'product_id': product_id,
+                'success': True,
+                'name': product.name,
+                'old_stock': old_stock,
+                'stock_quantity': new_stock,
+                'stock_status': product.get_stock_status(),
+            }
+
+        changed = {
+            pk: product.stock_quantity
+            for pk, product in products.items()
+            if product.stock_quantity != original[pk]
+        }
+        if changed:
+            Product.objects.filter(pk__in=changed).update(
+                stock_quantity=_per_product(changed),
+                updated_at=timezone.now()
+            )
+            _stock_changed(changed, 'set')
+
+    return results
+
+
+def order_quantities(order):
+    """Get {product_id: quantity} for the items of `order`"""
+    return {
+        row['product_id']: row['quantity']
+        for row in OrderItem.objects.filter(order=order).values('product_id').annotate(quantity=Sum('quantity'))
+    }
+
+
+def change_order_status(order, new_status):
+    """
+    Set the status of `order`, releasing its stock when it is cancelled and
+    reserving it again when a cancelled order is reopened.
+
+    The transition is claimed with a conditional UPDATE on the order row,
+    which also flips stock_reserved, so two concurrent requests cannot
+    release (or reserve) the same stock twice. Orders whose stock was never
+    taken out (stock_reserved unset) give nothing back when cancelled.
+    Raises OutOfStock if a reopened order no longer fits in stock.
+    """
+    with transaction.atomic():
+        if new_status == 'cancelled':
+            released = Order.objects.filter(pk=order.pk, stock_reserved=True).exclude(status='cancelled').update(
+                status='cancelled', stock_reserved=False
+            )
+            if released:
+                release_stock(order_quantities(order))
+            order.stock_reserved = False
+        else:
+            reserved = Order.objects.filter(pk=order.pk, status='cancelled', stock_reserved=False).update(
+                status=new_status, stock_reserved=True
+            )
+            if reserved:
+                reserve_stock(order_quantities(order))
+                order.stock_reserved = True
+
+        order.status = new_status
+        order.save()
+
+
+def parse_lines(items_data):
+    """Validate the `items` of an order request into line dicts"""
+    if not isinstance(items_data, list) or not items_data:
+        raise OrderError('An order needs at least one item')
+
+    lines = []
+    for item_data in items_data:
+        try:
+            quantity = int(item_data.get('quantity', 1))
+            unit_price = Decimal(str(item_data.get('unit_price') or 0))
+        except (AttributeError, TypeError, ValueError, InvalidOperation):
+            raise OrderError('Invalid quantity or unit price')
+        if quantity < 1 or unit_price < 0:
+            raise OrderError('Quantity must be at least 1 and unit price cannot be negative')
+
+        lines.append({
+            'product_id': item_data.get('product_id') or None,
+            'product_name': (item_data.get('product_name') or 'Custom Product').strip(),
+            'quantity': quantity,
+            'unit_price': unit_price,
+        })
+    return lines
+
+
+def resolve_products(lines):
+    """
+    Attach a product to every line: by active product name (case-insensitive)
+    first, as the order form always did, else by product_id. A line with a
+    stale id but a known name thus gets the named product. The rows are read
+    with one query, so names and prices are those of the current
+    transaction. Unknown names become CUSTOM- products, created with one
+    bulk INSERT.
+    """
+    ids = set()
+    for line in lines:
+        try:
+            ids.add(int(line['product_id']))
+        except (TypeError, ValueError):
+            pass
+    names = {line['product_name'].lower() for line in lines}
+    by_id, by_name = {}, {}
+    # Names are not unique: the oldest active product wins, as in the order form
+    for product in Product.objects.annotate(name_key=Lower('name')).filter(
+        Q(pk__in=ids) | Q(is_active=True, name_key__in=names)
+    ).order_by('pk'):
+        by_id[product.pk] = product
+        if product.is_active:
+            by_name.setdefault(product.name_key, product)
+
+    missing = {}
+    for line in lines:
+        product = by_name.get(line['product_name'].lower())
+        if product is None:
+            try:
+                product = by_id.get(int(line['product_id']))
+            except (TypeError, ValueError):
+                pass
+        if product is None:
+            key = line['product_name'].lower()
+            if key not in missing:
+                missing[key] = Product(
+                    name=line['product_name'],
+                    sku=f'CUSTOM-{int(time.time())}-{uuid.uuid4().hex[:6].upper()}',
+                    price=line['unit_price'],
+                    stock_quantity=9999,
+                    low_stock_threshold=0,
+                    is_active=True,
+                )
+            product = missing[key]
+        line['product'] = product
+
+    if missing:
+        Product.objects.bulk_create(missing.values())
+    return lines
+
+
+def place_order(customer_data, items_data, payment_method='cash', payment_status='pending', **order_fields):
+    """
+    Create (or reuse) the customer, then the order with its items and payment.
+
+    `customer_data` holds email, first_name, last_name, phone, address;
+    `order_fields` are extra Order fields (notes, tax, discount, ...).
+    Returns (order, payment, customer_created). Raises OrderError for
+    invalid input and OutOfStock when a product cannot cover its lines;
+    nothing is written unless the whole order is.
+    """
+    lines = parse_lines(items_data)
+
+    with transaction.atomic():
+        customer, customer_created = Customer.objects.get_or_create(
+            email=customer_data['email'],
+            defaults={
+                'first_name': customer_data.get('first_name', ''),
+                'last_name': customer_data.get('last_name', ''),
+                'phone': customer_data.get('phone', ''),
+                'address': customer_data.get('address', ''),
+            }
+        )
+
+        resolve_products(lines)
+
+        # Fails the whole order (nothing written) when any product is short
+        quantities = {}
+        for line in lines:
+            quantities[line['product'].pk] = quantities.get(line['product'].pk, 0) + line['quantity']
+        reserve_stock(quantities)
+
+        items = []
+        for line in lines:
+            product = line['product']
+            items.append(OrderItem(
+                product_id=product.pk,
+                quantity=line['quantity'],
+                unit_price=line['unit_price'] if line['unit_price'] > 0 else product.price,
+                product_name=product.name,
+                product_sku=product.sku,
+            ))
+
+        tax = order_fields.pop('tax', Decimal('0'))
+        discount = order_fields.pop('discount', Decimal('0'))
+        subtotal = sum((item.get_total_price() for item in items), Decimal('0'))
+        order = Order.objects.create(
+            customer=customer,
+            status='pending',
+            subtotal=subtotal,
+            tax=tax,
+            discount=discount,
+            total=subtotal + tax - discount,
+            stock_reserved=True,
+            **order_fields
+        )
+
+        for item in items:
+            item.order = order
+        OrderItem.objects.bulk_create(items)
+
+        payment = Payment.objects.create(
+            order=order,
+            amount=order.total,
+            payment_method=payment_method,
+            payment_status=payment_status,
+            notes=f'Auto-generated payment for order {order.order_number}'
+        )
+        transaction.on_commit(lambda: metrics.inc('orders_created_total'))
+
+    return order, payment, customer_created
@@ -0,0 +1,145 @@
+"""
+Keyset (cursor) pagination for the list pages and their "load more" requests.
+
+Pages are addressed by the sort key of the last row already shown instead of
+an OFFSET, so fetching page 50 costs the same as fetching page 1.
+"""
+import base64
+import binascii
+import json
+from functools import reduce
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import JsonResponse
+from django.template.loader import render_to_string
+
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+
+class KeysetPage:
+    """One page of rows plus the cursor of the next page (None on the last page)"""
+
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+
+def _field_names(model, ordering):
+    return [model._meta.pk.name if key.lstrip('-') == 'pk' else key.lstrip('-') for key in ordering]
+
+
+def encode_cursor(values):
+    """Serialize the sort key values of a row into an opaque URL-safe token"""
+    payload = json.dumps([value.isoformat() if hasattr(value, 'isoformat') else value for value in values])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, model, ordering):
+    """Parse a cursor back into typed sort key values; returns None for a missing or invalid cursor"""
+    if not cursor:
+        return None
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        fields = [model._meta.get_field(name) for name in _field_names(model, ordering)]
+        if not isinstance(raw, list) or len(raw) != len(fields):
+            return None
+        return [field.to_python(value) for field, value in zip(fields, raw)]
+    except (ValueError, TypeError, ValidationError, binascii.Error, UnicodeDecodeError):
+        return None
+
+
+def _after(field_names, ordering, values):
+    """Build the lexicographic "comes after this row" filter for the given sort keys"""
+    conditions = []
+    for index, (name, key) in enumerate(zip(field_names, ordering)):
+        lookup = 'lt' if key.startswith('-') else 'gt'
+        equal = {field_names[i]: values[i] for i in range(index)}
+        conditions.append(Q(**equal, **{f'{name}__{lookup}': values[index]}))
+    return reduce(lambda a, b: a | b, conditions)
+
+
+def keyset_paginate(queryset, ordering, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Get the page of `queryset` sorted by `ordering` that follows `cursor`.
+
+    The last key of `ordering` must be unique (normally 'pk' / '-pk') so
+    every row has a distinct position. For a .values() queryset the
+    ordering fields must be among the selected columns.
+    """
+    model = queryset.model
+    field_names = _field_names(model, ordering)
+    queryset = queryset.order_by(*ordering)
+
+    values = decode_cursor(cursor, model, ordering)
+    if values is not None:
+        queryset = queryset.filter(_after(field_names, ordering, values))
+
+    rows = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        # Rows are model instances, or dicts for a .values() queryset
+        next_cursor = encode_cursor([
+            last[name] if isinstance(last, dict) else getattr(last, name) for name in field_names
+        ])
+    return KeysetPage(rows, next_cursor)
+
+
+def _page_size(request):
+    try:
+        return min(max(int(request.GET.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        return DEFAULT_PAGE_SIZE
+
+
+def paginate_request(request, queryset, ordering):
+    """Paginate `queryset` using the `cursor` and `limit` query parameters of `request`"""
+    return keyset_paginate(queryset, ordering, request.GET.get('cursor'), _page_size(request))
+
+
+def paginate_records(request, records, model):
+    """
+    Paginate an in-memory list of `model` records sorted by primary key,
+    with the same cursors as a queryset ordered by ('pk',).
+    """
+    page_size = _page_size(request)
+    values = decode_cursor(request.GET.get('cursor'), model, ('pk',))
+    rows = list(islice((record for record in records if values is None or record.pk > values[0]), page_size + 1))
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor([rows[-1].pk])
+    return KeysetPage(rows, next_cursor)
+
+
+def is_page_request(request):
+    """Check if `request` is a "load more" fetch that wants rendered rows instead of the whole page"""
+    return request.headers.get('x-requested-with') == 'XMLHttpRequest'
+
+
+def page_response(request, template_name, context, page):
+    """Render the rows of a page with `template_name` and return them with the next cursor as JSON"""
+    return JsonResponse({
+        'success': True,
+        'html': render_to_string(template_name, context, request=request),
+        'next_cursor': page.next_cursor,
+        'has_next': page.has_next,
+    })
@@ -0,0 +1,174 @@
+"""
+On-demand request profiling for superusers.
+
+A superuser adds ?profile=1 to a URL (or sends "X-Profile: 1") and that
+request runs under cProfile, with every SQL statement logged. The pstats
+dump and a JSON summary (request, timings, SQL log, top functions by
+cumulative time) go to PROFILE_DIR. Only the newest PROFILE_MAX_CAPTURES
+are kept. The response names its capture in X-Profile-Capture, and the
+captures are listed at /admin/profiles/.
+
+One request per process is profiled at a time; cProfile cannot run two
+profilers at once. The body of a streamed response is produced after the
+capture ends and is not profiled.
+"""
+import cProfile
+import json
+import pstats
+import threading
+import time
+import uuid
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+
+
+PROFILE_PARAM = 'profile'
+PROFILE_HEADER = 'X-Profile'
+
+_profiling = threading.Lock()
+
+
+def _profile_dir():
+    return Path(getattr(settings, 'PROFILE_DIR', Path(settings.BASE_DIR) / 'profiles'))
+
+
+def capture_path(capture_id, suffix):
+    return _profile_dir() / f'{capture_id}{suffix}'
+
+
+def top_functions(stats, limit):
+    """The `limit` functions with the most cumulative time, as dicts"""
+    stats.sort_stats('cumulative')
+    functions = []
+    for function in stats.fcn_list[:limit]:
+        primitive_calls, calls, own_time, cumulative_time, _ = stats.stats[function]
+        functions.append({
+            'function': pstats.func_std_string(function),
+            'calls': calls if calls == primitive_calls else f'{calls}/{primitive_calls}',
+            'own_ms': round(own_time * 1000, 2),
+            'cumulative_ms': round(cumulative_time * 1000, 2),
+        })
+    return functions
+
+
+def save_capture(profiler, summary):
+    """Write the pstats dump and `summary` of one capture, then drop the oldest captures over the limit"""
+    directory = _profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+
+    # Timestamp first, so captures sort by age
+    capture_id = f"{timezone.now().strftime('%Y%m%d-%H%M%S-%f')}-{uuid.uuid4().hex[:8]}"
+    profiler.dump_stats(capture_path(capture_id, '.prof'))
+    summary = {
+        'id': capture_id,
+        **summary,
+        'top_functions': top_functions(pstats.Stats(profiler), getattr(settings, 'PROFILE_TOP_FUNCTIONS', 40)),
+    }
+    capture_path(capture_id, '.json').write_text(json.dumps(summary, indent=1))
+
+    keep = getattr(settings, 'PROFILE_MAX_CAPTURES', 20)
+    for old in sorted(directory.glob('*.json'), reverse=True)[keep:]:
+        old.unlink(missing_ok=True)
+        old.with_suffix('.prof').unlink(missing_ok=True)
+    return capture_id
+
+
+def list_captures():
+    """Summaries of the stored captures, newest first"""
+    directory = _profile_dir()
+    if not directory.is_dir():
+        return []
+    captures = []
+    for path in sorted(directory.glob('*.json'), reverse=True):
+        try:
+            captures.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue  # pruned by another process meanwhile
+    return captures
+
+
+def load_capture(capture_id):
+    """The summary of one capture, or None"""
+    try:
+        return json.loads(capture_path(capture_id, '.json').read_text())
+    except (OSError, ValueError):
+        return None
+
+
+class SQLLog:
+    """Execute wrapper keeping the SQL and duration of every query"""
+
+    def __init__(self):
+        self.entries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.entries.append({
+                'sql': sql,
+                'ms': round((time.perf_counter() - started) * 1000, 3),
+                'database': context['connection'].alias,
+            })
+
+
+def wants_profile(request):
+    requested = request.GET.get(PROFILE_PARAM) == '1' or request.headers.get(PROFILE_HEADER) == '1'
+    return requested and request.user.is_superuser
+
+
+class ProfilerMiddleware:
+    """Profile the requests superusers ask for; list it after AuthenticationMiddleware"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILER_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not wants_profile(request):
+            return self.get_response(request)
+        if not _profiling.acquire(blocking=False):
+            response = self.get_response(request)
+            response[f'{PROFILE_HEADER}-Capture'] = 'busy'
+            return response
+        try:
+            return self.capture(request)
+        finally:
+            _profiling.release()
+
+    def capture(self, request):
+        sql_log = SQLLog()
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(sql_log))
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        match = request.resolver_match
+        response[f'{PROFILE_HEADER}-Capture'] = save_capture(profiler, {
+            'captured_at': timezone.now().isoformat(),
+            'method': request.method,
+            'path': request.get_full_path(),
+            'view': match.view_name if match is not None else '',
+            'status': response.status_code,
+            'streaming': response.streaming,
+            'user': request.user.get_username(),
+            'total_ms': round(elapsed_ms, 2),
+            'query_count': len(sql_log.entries),
+            'db_ms': round(sum(entry['ms'] for entry in sql_log.entries), 2),
+            'queries': sql_log.entries,
+        })
+        return response
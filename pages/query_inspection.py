@@ -0,0 +1,133 @@
+"""
+Development-time query inspection: N+1 detection and per-view query budgets.
+
+With settings.QUERY_INSPECTION set to 'warn' or 'raise', every request has
+its queries recorded. SELECTs of the same shape issued repeatedly from the
+same template tag or line of code (an N+1 pattern) are reported, as is a
+request that runs more queries than its view's @query_budget. 'warn' logs
+the problem; 'raise' fails the request, which is what the test suite uses.
+"""
+import logging
+import os
+import re
+import sys
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+# Collapses IN (%s, %s, ...) lists so the same query with more ids has the same shape
+PARAM_LIST_RE = re.compile(r'\((?:%s, )+%s\)')
+
+THIS_FILE = os.path.abspath(__file__)
+
+
+class NPlusOneError(RuntimeError):
+    """The same query shape ran repeatedly from one place during a request"""
+
+
+class QueryBudgetExceeded(RuntimeError):
+    """A request ran more queries than its view's budget"""
+
+
+def query_budget(limit):
+    """
+    Declare the most queries a request to this view may run, session and
+    user lookups included. Put it above the other decorators.
+    """
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+def _call_site():
+    """
+    Where the current query comes from: the innermost line of project code,
+    or the template tag being rendered if that is closer to the query.
+    """
+    base_dir = os.path.abspath(settings.BASE_DIR)
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if frame.f_code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            origin, token = getattr(node, 'origin', None), getattr(node, 'token', None)
+            if origin is not None and token is not None:
+                return f'{origin.template_name or origin.name}:{token.lineno}'
+        elif filename.startswith(base_dir) and filename != THIS_FILE and 'site-packages' not in filename:
+            return f'{os.path.relpath(filename, base_dir)}:{frame.f_lineno}'
+        frame = frame.f_back
+    return 'unknown'
+
+
+class QueryLog:
+    """Execute wrapper counting the queries of a request by (shape, call site)"""
+
+    def __init__(self):
+        self.count = 0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        if sql.lstrip()[:6].upper() == 'SELECT':
+            self.shapes[(PARAM_LIST_RE.sub('(%s...)', sql), _call_site())] += 1
+        return execute(sql, params, many, context)
+
+    def repeated(self, threshold):
+        """(count, sql, site) of every query shape run at least `threshold` times from one site"""
+        return sorted(
+            ((count, sql, site) for (sql, site), count in self.shapes.items() if count >= threshold),
+            reverse=True
+        )
+
+
+@contextmanager
+def record_queries():
+    """Record the queries run on every database connection inside the block"""
+    log = QueryLog()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(log))
+        yield log
+
+
+def check_queries(log, label, budget=None):
+    """Report repeated query shapes and a blown budget according to settings.QUERY_INSPECTION"""
+    mode = getattr(settings, 'QUERY_INSPECTION', 'off')
+    threshold = getattr(settings, 'QUERY_REPEAT_THRESHOLD', 3)
+
+    for count, sql, site in log.repeated(threshold):
+        message = f'{label}: possible N+1, {count} x "{sql[:200]}" from {site}'
+        if mode == 'raise':
+            raise NPlusOneError(message)
+        logger.warning(message)
+
+    if budget is not None and log.count > budget:
+        message = f'{label}: {log.count} queries, over the budget of {budget}'
+        if mode == 'raise':
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+class QueryInspectionMiddleware:
+    """Inspect the queries of each request when settings.QUERY_INSPECTION is 'warn' or 'raise'"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if getattr(settings, 'QUERY_INSPECTION', 'off') == 'off':
+            return self.get_response(request)
+
+        with record_queries() as log:
+            response = self.get_response(request)
+        check_queries(log, f'{request.method} {request.path}', getattr(request, 'query_budget', None))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = getattr(view_func, 'query_budget', None)
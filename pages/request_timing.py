@@ -0,0 +1,152 @@
+"""
+Per-request timing: where the time of a request goes.
+
+RequestTimingMiddleware adds a Server-Timing header to the responses of
+staff users (SERVER_TIMING_HEADER: 'staff', 'all' or 'off'), which browser
+devtools show as a breakdown of the request:
+
+    total  the whole middleware stack
+    view   from URL resolution until the response leaves the inner middleware
+    db     time spent in queries (desc: how many)
+    tpl    template rendering (queries run from templates count here too)
+
+Requests slower than SLOW_REQUEST_MS and queries slower than SLOW_QUERY_MS
+are logged with the view that ran them and, for queries, the SQL, whoever
+made the request.
+
+With REQUEST_TIMING off the middleware removes itself at startup, and the
+template backend only checks a context variable per render.
+"""
+import logging
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+
+logger = logging.getLogger(__name__)
+
+_current_timer = ContextVar('current_request_timer', default=None)
+
+
+def _ms_since(started):
+    return (time.perf_counter() - started) * 1000
+
+
+class RequestTimer:
+    """Timings of one request; also the execute wrapper that times its queries"""
+
+    def __init__(self, slow_query_ms):
+        self.slow_query_ms = slow_query_ms
+        self.view_name = None
+        self.view_started = None
+        self.view_ms = 0.0
+        self.db_ms = 0.0
+        self.queries = 0
+        self.template_ms = 0.0
+        self.template_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = _ms_since(started)
+            self.db_ms += elapsed
+            self.queries += 1
+            if elapsed >= self.slow_query_ms:
+                logger.warning('Slow query: %.1f ms in %s on %s: %s',
+                               elapsed, self.view_name or '-', context['connection'].alias, sql)
+
+    def server_timing(self, total_ms):
+        return ', '.join([
+            f'total;dur={total_ms:.1f}',
+            f'view;dur={self.view_ms:.1f}',
+            f'db;dur={self.db_ms:.1f};desc="{self.queries} queries"',
+            f'tpl;dur={self.template_ms:.1f}',
+        ])
+
+
+class TimedTemplate(Template):
+    """Django template that adds its render time to the current request's timer"""
+
+    def render(self, context=None, request=None):
+        timer = _current_timer.get()
+        if timer is None:
+            return super().render(context, request)
+
+        # A template rendered while another one is (e.g. from a template tag) is already timed
+        timer.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timer.template_depth -= 1
+            if not timer.template_depth:
+                timer.template_ms += _ms_since(started)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, with render times reported to RequestTimingMiddleware"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+class RequestTimingMiddleware:
+    """Slow request/query log and Server-Timing header; list it first in MIDDLEWARE"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_TIMING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_request_ms = getattr(settings, 'SLOW_REQUEST_MS', 500)
+        self.slow_query_ms = getattr(settings, 'SLOW_QUERY_MS', 100)
+        self.header_for = getattr(settings, 'SERVER_TIMING_HEADER', 'staff')
+
+    def __call__(self, request):
+        timer = RequestTimer(self.slow_query_ms)
+        token = _current_timer.set(timer)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timer))
+                response = self.get_response(request)
+        finally:
+            _current_timer.reset(token)
+
+        total_ms = _ms_since(started)
+        if timer.view_started is not None:
+            timer.view_ms = _ms_since(timer.view_started)
+        # Streamed bodies are produced after this point; the header covers building the response
+        if self.wants_header(request):
+            response['Server-Timing'] = timer.server_timing(total_ms)
+
+        if total_ms >= self.slow_request_ms:
+            logger.warning(
+                'Slow request: %.1f ms for %s %s (%s, status %s): view %.1f ms, %d queries in %.1f ms, templates %.1f ms',
+                total_ms, request.method, request.get_full_path(), timer.view_name or '-', response.status_code,
+                timer.view_ms, timer.queries, timer.db_ms, timer.template_ms
+            )
+        return response
+
+    def wants_header(self, request):
+        if self.header_for == 'all':
+            return True
+        # request.user is set further down the stack, and missing if a middleware answered early
+        user = getattr(request, 'user', None)
+        return self.header_for == 'staff' and user is not None and user.is_staff
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timer = _current_timer.get()
+        if timer is not None:
+            timer.view_name = f'{view_func.__module__}.{view_func.__qualname__}'
+            timer.view_started = time.perf_counter()
@@ -0,0 +1,94 @@
+"""
+Full-text search over customers, products, orders and payments.
+
+On SQLite the lookups go through the FTS5 tables created by migration
+0007_search_index, kept in sync by the triggers in pages.triggers. Every
+word of the query is matched as a prefix, so "ros" finds "Roses" and
+"ord-00" finds "ORD-0042-20260101". Other databases fall back to
+icontains filters.
+"""
+import re
+
+from django.db import connections, router
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Customer, Order, Payment, Product
+
+
+# Model -> FTS5 table and the fields an icontains fallback searches
+SEARCH_INDEXES = {
+    Customer: ('pages_search_customer', ('first_name', 'last_name', 'email', 'phone')),
+    Product: ('pages_search_product', ('name', 'sku')),
+    Order: ('pages_search_order', (
+        'order_number', 'customer__first_name', 'customer__last_name', 'customer__email'
+    )),
+    Payment: ('pages_search_payment', ('payment_number', 'order__order_number', 'transaction_id')),
+}
+
+TERM_RE = re.compile(r'\w+')
+
+
+def build_match_query(text):
+    """Turn free text into an FTS5 query matching every word as a prefix; None if it has no words"""
+    terms = TERM_RE.findall(text or '')
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def uses_fts(model):
+    return connections[router.db_for_read(model)].vendor == 'sqlite'
+
+
+def _fallback_filter(queryset, text):
+    _, fields = SEARCH_INDEXES[queryset.model]
+    condition = Q()
+    for field in fields:
+        condition |= Q(**{f'{field}__icontains': text})
+    return queryset.filter(condition)
+
+
+def filter_search(queryset, text):
+    """Restrict `queryset` to rows matching `text`, keeping its own ordering"""
+    table, _ = SEARCH_INDEXES[queryset.model]
+    match = build_match_query(text)
+    if match is None or not uses_fts(queryset.model):
+        return _fallback_filter(queryset, text)
+    return queryset.filter(pk__in=RawSQL(f"SELECT rowid FROM {table} WHERE {table} MATCH %s", (match,)))
+
+
+def ranked_ids(model, text, limit=20, queryset=None):
+    """
+    Get the primary keys of the best `limit` matches for `text`, best match first.
+
+    If `queryset` is given only its rows are considered (e.g. active products).
+    """
+    table, _ = SEARCH_INDEXES[model]
+    match = build_match_query(text)
+    if match is None:
+        return []
+    if queryset is None:
+        queryset = model.objects.all()
+    if not uses_fts(model):
+        return list(_fallback_filter(queryset, text).values_list('pk', flat=True)[:limit])
+
+    # The triggers keep one index row per table row, so an unfiltered
+    # queryset needs no scope (and no walk over the whole table)
+    scope, scope_params = '', []
+    if queryset.query.where:
+        scope_sql, scope_params = queryset.order_by().values('pk').query.sql_with_params()
+        scope = f"AND rowid IN ({scope_sql}) "
+    with connections[router.db_for_read(model)].cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {table} WHERE {table} MATCH %s {scope}ORDER BY rank LIMIT %s",
+            [match, *scope_params, limit]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def ranked_matches(queryset, text, limit=20):
+    """Get the best `limit` rows of `queryset` matching `text`, best match first"""
+    ids = ranked_ids(queryset.model, text, limit, queryset)
+    rows = queryset.in_bulk(ids)
+    return [rows[pk] for pk in ids if pk in rows]
@@ -0,0 +1,125 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .context_processors import bump_notification_version
+from .dashboard_stats import bump_dashboard_version
+from .models import Customer, CustomerSummary, DailyPaymentMethodSales, DailySales, Order, Payment, Product
+
+
+def _cascading_from(origin, *models):
+    """Check if a delete signal was triggered by deleting one of `models` (instance or queryset)"""
+    return isinstance(origin, models) or getattr(origin, 'model', None) in models
+
+
+# ============================================================================
+# CUSTOMER SUMMARY MAINTENANCE
+# ============================================================================
+@receiver(post_save, sender=Customer)
+def create_customer_summary(sender, instance, created, raw=False, **kwargs):
+    """Every customer gets an (empty) summary row so pages can always join it"""
+    if created and not raw:
+        CustomerSummary.objects.get_or_create(customer=instance)
+
+
+@receiver(post_save, sender=Order)
+def refresh_summary_on_order_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        CustomerSummary.refresh_for([instance.customer_id])
+
+
+@receiver(post_delete, sender=Order)
+def refresh_summary_on_order_delete(sender, instance, origin=None, **kwargs):
+    # The summary goes away together with the customer
+    if not _cascading_from(origin, Customer):
+        CustomerSummary.refresh_for([instance.customer_id])
+
+
+@receiver(post_save, sender=Payment)
+def refresh_summary_on_payment_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        CustomerSummary.refresh_for([instance.order.customer_id])
+
+
+@receiver(post_delete, sender=Payment)
+def refresh_summary_on_payment_delete(sender, instance, origin=None, **kwargs):
+    # Deleting the order/customer refreshes (or drops) the summary itself
+    if not _cascading_from(origin, Customer, Order):
+        CustomerSummary.refresh_for([instance.order.customer_id])
+
+
+# ============================================================================
+# DAILY SALES ROLLUP MAINTENANCE
+# ============================================================================
+def _business_day(value):
+    return timezone.localdate(value) if value else None
+
+
+@receiver(post_init, sender=Order)
+def remember_order_status(sender, instance, **kwargs):
+    # __dict__ lookup so deferred fields are not loaded
+    instance._rollup_status = instance.__dict__.get('status')
+
+
+@receiver(post_save, sender=Order)
+def refresh_rollup_on_order_save(sender, instance, raw=False, **kwargs):
+    was_completed = instance._rollup_status == 'completed'
+    instance._rollup_status = instance.status
+    if not raw and (was_completed or instance.status == 'completed'):
+        DailySales.refresh_days({_business_day(instance.created_at)})
+
+
+@receiver(post_delete, sender=Order)
+def refresh_rollup_on_order_delete(sender, instance, **kwargs):
+    if instance.status == 'completed':
+        DailySales.refresh_days({_business_day(instance.created_at)})
+
+
+@receiver(post_init, sender=Payment)
+def remember_payment_state(sender, instance, **kwargs):
+    instance._rollup_status = instance.__dict__.get('payment_status')
+    instance._rollup_date = instance.__dict__.get('payment_date')
+
+
+@receiver(post_save, sender=Payment)
+def refresh_rollup_on_payment_save(sender, instance, raw=False, **kwargs):
+    was_completed = instance._rollup_status == 'completed'
+    old_date = instance._rollup_date
+    instance._rollup_status = instance.payment_status
+    instance._rollup_date = instance.payment_date
+    if not raw and (was_completed or instance.payment_status == 'completed'):
+        DailyPaymentMethodSales.refresh_days({
+            _business_day(instance.payment_date),
+            _business_day(old_date) if was_completed else None,
+        })
+
+
+@receiver(post_delete, sender=Payment)
+def refresh_rollup_on_payment_delete(sender, instance, **kwargs):
+    if instance.payment_status == 'completed':
+        DailyPaymentMethodSales.refresh_days({_business_day(instance.payment_date)})
+
+
+# ============================================================================
+# CACHED COUNTERS (HEADER NOTIFICATIONS, DASHBOARD STATISTICS)
+# ============================================================================
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+def invalidate_notification_counts(sender, **kwargs):
+    bump_notification_version()
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+def invalidate_dashboard_stats(sender, **kwargs):
+    bump_dashboard_version()
@@ -1,3 +1,1004 @@
-from django.test import TestCase
+import csv
+import json
+import tempfile
+import time
+import warnings
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections, router
+from django.db.models import F, Sum
+from django.http import HttpResponse, StreamingHttpResponse
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from . import metrics, triggers
+from .catalog import get_catalog
+from .context_processors import compute_notification_counts
+from .db_routing import PRIMARY_DB, REPLICA_DB, STICKY_COOKIE, StickyPrimaryMiddleware, read_replica
+from .db_tuning import sqlite_pragmas
+from .exports import ORDER_HEADER, ExportError, export_rows
+from .json_lists import _stream_rows
+from .management.commands.check_query_plans import unbounded_read
+from .models import (
+    Customer, CustomerSummary, DailyPaymentMethodSales, DailySales, NumberSequence, Order, OrderItem, Payment,
+    Product, StockAlert,
+)
+from .ordering import OutOfStock, change_order_status, place_order
+from .query_inspection import NPlusOneError, QueryBudgetExceeded, check_queries, record_queries
+from .search import filter_search, ranked_ids
+
+
+def create_store():
+    """A few customers, products and orders with several items each"""
+    products = [
+        Product.objects.create(name=f'Product {n}', sku=f'SKU-{n}', category='General',
+                               price=Decimal('10.00') + n, stock_quantity=100)
+        for n in range(5)
+    ]
+    for n in range(4):
+        place_order(
+            {'email': f'customer{n}@example.com', 'first_name': f'First{n}', 'last_name': f'Last{n}'},
+            [{'product_id': product.pk, 'product_name': product.name, 'quantity': 1, 'unit_price': str(product.price)}
+             for product in products[:3]],
+        )
+    return products
+
+
+
+class StockReservationTests(TestCase):
+    """Orders take their items out of stock; cancelling gives them back once"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser('staff', 'staff@example.com', 'password')
+
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(name='Rice', sku='RICE', price=Decimal('50.00'), stock_quantity=10)
+
+    def order(self, quantity):
+        order, _, _ = place_order({'email': 'buyer@example.com'}, [{'product_id': self.product.pk, 'quantity': quantity}])
+        return order
+
+    def stock(self):
+        self.product.refresh_from_db()
+        return self.product.stock_quantity
+
+    def test_order_reserves_stock(self):
+        order = self.order(4)
+        self.assertTrue(order.stock_reserved)
+        self.assertEqual(self.stock(), 6)
+
+    def test_name_wins_over_stale_id(self):
+        other = Product.objects.create(name='Corn', sku='CORN', price=Decimal('20.00'), stock_quantity=10)
+        order, _, _ = place_order({'email': 'buyer@example.com'},
+                                  [{'product_id': other.pk, 'product_name': 'rice', 'quantity': 1}])
+        self.assertEqual(order.items.get().product_id, self.product.pk)
+
+    def test_oversell_is_refused(self):
+        self.order(8)
+        with self.assertRaises(OutOfStock) as raised:
+            self.order(3)
+        self.assertEqual(raised.exception.shortages[0]['available'], 2)
+        self.assertEqual(self.stock(), 2)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_cancel_twice_releases_once(self):
+        order = self.order(4)
+        change_order_status(order, 'cancelled')
+        change_order_status(Order.objects.get(pk=order.pk), 'cancelled')
+        self.assertEqual(self.stock(), 10)
+        self.assertFalse(Order.objects.get(pk=order.pk).stock_reserved)
+
+    def test_reopen_reserves_again(self):
+        order = self.order(4)
+        change_order_status(order, 'cancelled')
+        change_order_status(order, 'processing')
+        self.assertEqual(self.stock(), 6)
+        self.assertTrue(Order.objects.get(pk=order.pk).stock_reserved)
+
+    def test_reopen_out_of_stock(self):
+        order = self.order(4)
+        change_order_status(order, 'cancelled')
+        self.order(8)
+        with self.assertRaises(OutOfStock):
+            change_order_status(Order.objects.get(pk=order.pk), 'pending')
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.stock_reserved), ('cancelled', False))
+        self.assertEqual(self.stock(), 2)
+
+    def test_unreserved_order_releases_nothing(self):
+        order = self.order(4)
+        Order.objects.filter(pk=order.pk).update(stock_reserved=False)  # e.g. placed before reservations
+        change_order_status(Order.objects.get(pk=order.pk), 'cancelled')
+        self.assertEqual(self.stock(), 6)
+
+    def test_admin_refuses_reopen_without_stock(self):
+        order = self.order(4)
+        change_order_status(order, 'cancelled')
+        self.order(8)
+        request = RequestFactory().post('/')
+        request.user = self.user
+        form_class = admin.site._registry[Order].get_form(request, order, change=True)
+        form = form_class({'customer': order.customer_id, 'status': 'pending', 'notes': '',
+                           'tax': '0', 'discount': '0'}, instance=Order.objects.get(pk=order.pk))
+        self.assertFalse(form.is_valid())
+        self.assertIn('Not enough stock', form.errors['status'][0])
+
+    def admin_save(self, **changes):
+        """Post the admin change form as shown before any order below, with `changes` applied"""
+        data = {
+            'name': self.product.name, 'description': '', 'sku': self.product.sku, 'category': '',
+            'price': '50.00', 'cost_price': '0', 'stock_quantity': '10', 'initial-stock_quantity': '10',
+            'low_stock_threshold': '10', 'unit': 'pcs', 'is_active': 'on', '_save': 'Save',
+        }
+        data.update(changes)
+        self.client.force_login(self.user)
+        return self.client.post(reverse('admin:pages_product_change', args=[self.product.pk]), data)
+
+    def test_admin_edit_keeps_reservations(self):
+        self.order(4)
+        response = self.admin_save(name='Brown Rice')
+        self.assertEqual(response.status_code, 302)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.name, self.product.stock_quantity), ('Brown Rice', 6))
+
+    def test_admin_restock_adds_to_current_level(self):
+        self.order(4)
+        self.admin_save(stock_quantity='15')
+        self.assertEqual(self.stock(), 11)
+
+    def test_admin_edit_checks_alerts(self):
+        self.admin_save(low_stock_threshold='20')
+        self.assertTrue(StockAlert.objects.filter(product=self.product, alert_status='active').exists())
+
+    def test_product_edit_keeps_stock_unless_changed(self):
+        self.client.force_login(self.user)
+        self.order(4)
+        response = self.client.post('/ajax/product/edit/', json.dumps({'product_id': self.product.pk, 'name': 'Brown Rice'}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.name, self.product.stock_quantity), ('Brown Rice', 6))
+
+        response = self.client.post('/ajax/product/edit/', json.dumps({'product_id': self.product.pk, 'stock_quantity': 2}),
+                                    content_type='application/json')
+        self.assertEqual(response.json()['product']['stock_quantity'], 2)
+        self.assertTrue(StockAlert.objects.filter(product=self.product, alert_status='active').exists())
+
+    def test_update_stock(self):
+        self.client.force_login(self.user)
+        response = self.client.post('/ajax/product/update-stock/',
+                                    json.dumps({'product_id': self.product.pk, 'stock_quantity': 25}),
+                                    content_type='application/json')
+        self.assertEqual(response.json()['product']['stock_quantity'], 25)
+        self.assertEqual(self.stock(), 25)
+        response = self.client.post('/ajax/product/update-stock/', json.dumps({'product_id': 0, 'stock_quantity': 1}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+
+
+
+class StockAlertTests(TestCase):
+    """check_and_create_alerts opens one alert per low product and resolves restocked ones"""
+
+    def setUp(self):
+        self.products = [
+            Product.objects.create(name=f'Item {n}', sku=f'ITEM-{n}', price=Decimal('1.00'), stock_quantity=50)
+            for n in range(3)
+        ]
+
+    def set_stock(self, product, quantity):
+        Product.objects.filter(pk=product.pk).update(stock_quantity=quantity)
+
+    def test_created_and_resolved_counts(self):
+        self.set_stock(self.products[0], 0)
+        self.set_stock(self.products[1], 4)
+        self.assertEqual(StockAlert.check_and_create_alerts(), (2, 0))
+        self.assertEqual(
+            dict(StockAlert.objects.values_list('product__sku', 'alert_type')),
+            {'ITEM-0': 'out_of_stock', 'ITEM-1': 'low_stock'},
+        )
+
+        # Products already alerted are not alerted twice
+        self.assertEqual(StockAlert.check_and_create_alerts(), (0, 0))
+
+        self.set_stock(self.products[0], 30)
+        Product.objects.filter(pk=self.products[1].pk).update(is_active=False)
+        self.assertEqual(StockAlert.check_and_create_alerts(), (0, 2))
+        self.assertFalse(StockAlert.objects.filter(alert_status='active').exists())
+
+    def test_only_given_products(self):
+        self.set_stock(self.products[0], 0)
+        self.set_stock(self.products[1], 0)
+        self.assertEqual(StockAlert.check_and_create_alerts([self.products[0].pk]), (1, 0))
+        self.assertEqual(StockAlert.check_and_create_alerts([]), (0, 0))
+
+        self.set_stock(self.products[0], 30)
+        self.assertEqual(StockAlert.check_and_create_alerts([self.products[1].pk]), (1, 0))
+        self.assertEqual(StockAlert.check_and_create_alerts([self.products[0].pk]), (0, 1))
+
+
+class NumberSequenceTests(TestCase):
+    """Numbers are handed out once, in order, per counter key"""
+
+    def test_reserve_blocks(self):
+        self.assertEqual(NumberSequence.reserve('TEST', 3), range(1, 4))
+        self.assertEqual(NumberSequence.next_value('TEST'), 4)
+        self.assertEqual(NumberSequence.reserve('TEST', 2), range(5, 7))
+        self.assertEqual(NumberSequence.next_value('OTHER'), 1)
+        self.assertEqual(NumberSequence.objects.get(name='TEST').last_value, 6)
+        with self.assertRaises(ValueError):
+            NumberSequence.reserve('TEST', 0)
+
+    def test_order_and_payment_numbers(self):
+        today = timezone.now().strftime('%Y%m%d')
+        self.assertEqual(Order.reserve_order_numbers(2), [f'ORD-0001-{today}', f'ORD-0002-{today}'])
+        self.assertEqual(Payment.reserve_payment_numbers(1), [f'PAY-{today}-0001'])
+
+        product = Product.objects.create(name='Tea', sku='TEA', price=Decimal('3.00'), stock_quantity=5)
+        order, _, _ = place_order({'email': 'numbers@example.com'}, [{'product_id': product.pk, 'quantity': 1}])
+        self.assertEqual(order.order_number, f'ORD-0003-{today}')
+
+
+class SummaryUpkeepTests(TestCase):
+    """Customer summaries and daily rollups follow payment and order status changes"""
+
+    def setUp(self):
+        product = Product.objects.create(name='Soap', sku='SOAP', price=Decimal('10.00'), stock_quantity=20)
+        self.order, self.payment, _ = place_order({'email': 'summary@example.com'},
+                                                  [{'product_id': product.pk, 'quantity': 2}])
+        self.today = timezone.localdate()
+
+    def summary(self):
+        return CustomerSummary.objects.get(customer_id=self.order.customer_id)
+
+    def test_payment_completion_updates_paid_total(self):
+        summary = self.summary()
+        self.assertEqual((summary.order_count, summary.total_spent, summary.total_paid),
+                         (1, Decimal('20.00'), Decimal('0.00')))
+        self.assertEqual(summary.latest_order_id, self.order.pk)
+
+        self.payment.payment_status = 'completed'
+        self.payment.save()
+        self.assertEqual(self.summary().total_paid, Decimal('20.00'))
+        rollup = DailyPaymentMethodSales.objects.get(business_date=self.today, payment_method='cash')
+        self.assertEqual((rollup.payment_count, rollup.amount), (1, Decimal('20.00')))
+
+        self.payment.payment_status = 'refunded'
+        self.payment.save()
+        self.assertEqual(self.summary().total_paid, Decimal('0.00'))
+        self.assertFalse(DailyPaymentMethodSales.objects.filter(payment_count__gt=0).exists())
+
+    def test_order_completion_updates_daily_sales(self):
+        self.assertFalse(DailySales.objects.filter(order_count__gt=0).exists())
+
+        change_order_status(self.order, 'completed')
+        day = DailySales.objects.get(business_date=self.today)
+        self.assertEqual((day.order_count, day.revenue, day.items_sold), (1, Decimal('20.00'), 2))
+
+        change_order_status(self.order, 'cancelled')
+        self.assertFalse(DailySales.objects.filter(order_count__gt=0).exists())
+
+
+class GenerateStoreDataTests(TestCase):
+
+    def test_small_store(self):
+        call_command('generate_store_data', orders='200', customers=40, days=30, stdout=StringIO())
+
+        self.assertEqual(Order.objects.count(), 200)
+        self.assertEqual(Payment.objects.count(), 200)
+        self.assertGreaterEqual(OrderItem.objects.count(), 200)
+        self.assertFalse(Order.objects.filter(stock_reserved=True).exists())
+
+        completed = Order.objects.filter(status='completed')
+        rollup = DailySales.objects.aggregate(orders=Sum('order_count'), revenue=Sum('revenue'))
+        self.assertEqual(rollup['orders'], completed.count())
+        self.assertEqual(rollup['revenue'], completed.aggregate(total=Sum('total'))['total'])
+        self.assertEqual(CustomerSummary.objects.aggregate(orders=Sum('order_count'))['orders'], 200)
+
+        # New orders still get numbers and primary keys after the raw inserts
+        order, _, _ = place_order({'email': 'after@example.com'}, [{'product_name': 'Bouquet', 'quantity': 1}])
+        self.assertEqual(Order.objects.count(), 201)
+        self.assertTrue(order.order_number.startswith('ORD-'))
+
+
+class CatalogSnapshotTests(TestCase):
+    """The snapshot follows catalog edits from anywhere, but not stock moves"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser('staff', 'staff@example.com', 'password')
+        cls.products = create_store()
+
+    def test_stock_moves_keep_snapshot(self):
+        snapshot = get_catalog()
+        Product.objects.filter(pk=self.products[0].pk).update(stock_quantity=F('stock_quantity') - 1)
+        self.assertIs(get_catalog(), snapshot)
+
+    def test_bulk_edits_rebuild_snapshot(self):
+        snapshot = get_catalog()
+        Product.objects.filter(pk=self.products[0].pk).update(name='Renamed')
+        self.assertIsNot(get_catalog(), snapshot)
+        self.assertEqual(get_catalog().records[0].name, 'Renamed')
+
+    def test_list_reads_live_stock(self):
+        self.client.force_login(self.user)
+        get_catalog()
+        Product.objects.filter(pk=self.products[0].pk).update(stock_quantity=7)
+        results = self.client.get(reverse('pages:get_products_ajax')).json()['results']
+        self.assertEqual(results[0]['stock_quantity'], 7)
+
+    def test_orders_use_current_prices(self):
+        get_catalog()
+        Product.objects.filter(pk=self.products[0].pk).update(price=Decimal('42.00'))
+        order, _, _ = place_order({'email': 'price@example.com'},
+                                  [{'product_id': self.products[0].pk, 'quantity': 1}])
+        self.assertEqual(order.items.get().unit_price, Decimal('42.00'))
+
+
+class SearchTests(TestCase):
+    """Every word of a search matches as a prefix, and the index follows edits"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = create_store()
+        cls.customer = Customer.objects.get(email='customer1@example.com')
+        cls.order = cls.customer.orders.get()
+
+    def search(self, model, text):
+        return set(filter_search(model.objects.all(), text).values_list('pk', flat=True))
+
+    def test_prefix_words(self):
+        self.assertEqual(self.search(Customer, 'firs lAST1'), {self.customer.pk})
+        self.assertEqual(self.search(Customer, 'customer1@example'), {self.customer.pk})
+        self.assertEqual(self.search(Product, 'sku-3'), {self.products[3].pk})
+        self.assertEqual(self.search(Order, 'first1'), {self.order.pk})
+        self.assertEqual(self.search(Payment, self.order.order_number[:8]), {self.order.payments.get().pk})
+        self.assertEqual(self.search(Product, 'nothing'), set())
+
+    def test_index_follows_edits(self):
+        Customer.objects.filter(pk=self.customer.pk).update(last_name='Renamed')
+        self.assertEqual(self.search(Customer, 'last1'), set())
+        self.assertEqual(self.search(Customer, 'renamed'), {self.customer.pk})
+        # Orders are indexed under their customer's name
+        self.assertEqual(self.search(Order, 'renamed'), {self.order.pk})
+
+        Product.objects.filter(pk=self.products[4].pk).delete()
+        self.assertEqual(self.search(Product, 'sku-4'), set())
+
+    def test_keeps_queryset(self):
+        products = Product.objects.filter(pk__in=[p.pk for p in self.products[1:]]).order_by('-pk')
+        self.assertEqual(list(filter_search(products, 'product').values_list('pk', flat=True)),
+                         [p.pk for p in reversed(self.products[1:])])
+        self.assertEqual(ranked_ids(Product, 'product', queryset=products.filter(sku='SKU-2')),
+                         [self.products[2].pk])
+        self.assertEqual(len(ranked_ids(Product, 'product', limit=2)), 2)
+
+    def test_text_without_words(self):
+        # No FTS query to build: falls back to icontains
+        self.assertEqual(self.search(Customer, '@'), set(Customer.objects.values_list('pk', flat=True)))
+        self.assertEqual(ranked_ids(Customer, '@'), [])
+
+
+class LookupRankingTests(TestCase):
+    """The type-ahead lists the best matches first, not the oldest rows"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser('staff', 'staff@example.com', 'password')
+        for name, sku, active in [
+            ('Garden gloves with rose print for the whole family', 'GLOVE-1', True),
+            ('Dried rose petals in a small jar', 'PETAL-1', True),
+            ('Rose', 'ROSE-1', True),
+            ('Rose bush', 'ROSE-2', False),
+            ('Tulip', 'TULIP-1', True),
+        ]:
+            Product.objects.create(name=name, sku=sku, price=Decimal('4.00'), is_active=active)
+        for first_name, last_name, email in [
+            ('Ann', 'Rosenberg', 'ann.rosenberg@example.com'),
+            ('Bob', 'Smith', 'bob@example.com'),
+            ('Rosa', 'Ros', 'rosa.ros@example.com'),
+        ]:
+            Customer.objects.create(first_name=first_name, last_name=last_name, email=email)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def lookup(self, name, key, **params):
+        results = self.client.get(reverse(f'pages:{name}'), params).json()['results']
+        return [result[key] for result in results]
+
+    def test_products(self):
+        self.assertEqual(self.lookup('lookup_products_ajax', 'sku', q='rose'), ['ROSE-1', 'PETAL-1', 'GLOVE-1'])
+        self.assertEqual(self.lookup('lookup_products_ajax', 'sku', q='rose', limit=1), ['ROSE-1'])
+        self.assertEqual(self.lookup('lookup_products_ajax', 'sku', q='rose pet'), ['PETAL-1'])
+        self.assertEqual(self.lookup('lookup_products_ajax', 'sku', q=''), [])
+
+    def test_customers(self):
+        self.assertEqual(self.lookup('lookup_customers_ajax', 'email', q='ros'),
+                         ['rosa.ros@example.com', 'ann.rosenberg@example.com'])
+        self.assertEqual(self.lookup('lookup_customers_ajax', 'email', q='bob'), ['bob@example.com'])
+
+
+class ExportTests(TestCase):
+    """CSV exports have one row per order line and honour their filters"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser('staff', 'staff@example.com', 'password')
+        cls.products = create_store()
+        cls.orders = list(Order.objects.order_by('pk'))
+        change_order_status(cls.orders[1], 'completed')
+
+    def download(self, name, **params):
+        response = self.client.get(reverse('pages:export_csv', args=[name]), params)
+        self.assertEqual(response.status_code, 200)
+        return list(csv.reader(StringIO(b''.join(response.streaming_content).decode())))
+
+    def test_order_rows(self):
+        self.client.force_login(self.user)
+        header, *rows = self.download('orders')
+        self.assertEqual(tuple(header), ORDER_HEADER)
+        self.assertEqual(len(rows), 12)
+        first = dict(zip(header, rows[0]))
+        self.assertEqual(first['order_number'], self.orders[0].order_number)
+        self.assertEqual(first['customer_name'], 'First0 Last0')
+        self.assertEqual((first['product_sku'], first['quantity'], first['line_total']), ('SKU-0', '1', '10.00'))
+        self.assertEqual([row[12] for row in rows[:3]], ['Product 0', 'Product 1', 'Product 2'])
+
+        header, *rows = self.download('orders', status='completed')
+        self.assertEqual({row[0] for row in rows}, {self.orders[1].order_number})
+
+    def test_items_follow_their_order_across_chunks(self):
+        OrderItem.objects.filter(order=self.orders[2]).delete()
+        for chunk_size in (1, 2, 1000):
+            with self.subTest(chunk_size=chunk_size):
+                _, rows = export_rows('orders', chunk_size=chunk_size)
+                rows = list(rows)
+                self.assertEqual([row[0] for row in rows], [
+                    order.order_number for order in self.orders for _ in range(1 if order == self.orders[2] else 3)
+                ])
+                # An order without items still gets a row, with empty item columns
+                self.assertEqual(rows[6][11:], ('',) * 5)
+
+    def test_filters(self):
+        today = timezone.localdate()
+        _, rows = export_rows('payments', since=today, until=today)
+        self.assertEqual(len(list(rows)), 4)
+        _, rows = export_rows('payments', until=today - timedelta(days=1))
+        self.assertEqual(list(rows), [])
+        _, rows = export_rows('inventory', status='in')
+        self.assertEqual([row[1] for row in rows], [f'SKU-{n}' for n in range(5)])
+
+        for name, options in [('reports', {}), ('customers', {'status': 'completed'}),
+                              ('inventory', {'since': today}), ('orders', {'status': 'lost'}),
+                              ('orders', {'since': today, 'until': today - timedelta(days=1)})]:
+            with self.subTest(name=name, **options), self.assertRaises(ExportError):
+                export_rows(name, **options)
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('pages:export_csv', args=['orders']), {'since': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+
+
+class TriggerTests(TestCase):
+    """The search and table version triggers are in place after migrate, even after a table rebuild"""
+
+    def expected(self):
+        return {name for group in triggers.TRIGGER_GROUPS.values() for name in group}
+
+    def test_installed_by_migrations(self):
+        self.assertLessEqual(self.expected(), triggers.installed_triggers(connection))
+
+    def test_migrate_puts_back_dropped_triggers(self):
+        # What a table rebuild (AlterField on SQLite) leaves behind
+        triggers.uninstall(connection, triggers.SEARCH_TRIGGERS)
+        triggers.uninstall(connection, triggers.CATALOG_TRIGGERS)
+        call_command('migrate', verbosity=0)
+        self.assertLessEqual(self.expected(), triggers.installed_triggers(connection))
+
+        product = Product.objects.create(name='Zinnia', sku='ZIN', price=Decimal('5.00'))
+        self.assertEqual(ranked_ids(Product, 'zinn'), [product.pk])
+
+
+class StreamModeTests(TestCase):
+    """?stream=1 writes every matching row as one JSON array, in primary key order"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser('staff', 'staff@example.com', 'password')
+        cls.products = create_store()
+        Product.objects.filter(pk=cls.products[4].pk).update(is_active=False)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def stream(self, url, **params):
+        response = self.client.get(url, {'stream': '1', **params})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        return json.loads(b''.join(response.streaming_content))
+
+    def test_products(self):
+        rows = self.stream(reverse('pages:get_products_ajax'), fields='sku,stock_quantity')
+        self.assertEqual(rows, [
+            {'product_id': product.pk, 'sku': product.sku, 'stock_quantity': 96}
+            for product in self.products[:3]
+        ] + [{'product_id': self.products[3].pk, 'sku': 'SKU-3', 'stock_quantity': 100}])
+
+        rows = self.stream(reverse('pages:get_products_ajax'), fields='sku', active='all')
+        self.assertEqual([row['sku'] for row in rows], [f'SKU-{n}' for n in range(5)])
+
+    def test_customers(self):
+        rows = self.stream(reverse('pages:get_customers_ajax'), fields='email', search='customer2')
+        self.assertEqual(rows, [{'customer_id': Customer.objects.get(email='customer2@example.com').pk,
+                                 'email': 'customer2@example.com'}])
+        self.assertEqual(self.stream(reverse('pages:get_customers_ajax'), search='nobody'), [])
+
+    def test_chunks_join_into_one_array(self):
+        rows = Product.objects.order_by('pk').values('sku')
+        for chunk_size in (1, 2, 5, 10):
+            with self.subTest(chunk_size=chunk_size):
+                body = ''.join(_stream_rows(rows, chunk_size))
+                self.assertEqual(json.loads(body), list(rows))
+
+
+class ReplicaRoutingTests(TestCase):
+    """@read_replica views read shop data from the replica unless the browser wrote something just now"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    @contextmanager
+    def replica(self):
+        # Only the alias has to exist for the router; no query reaches it here
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', UserWarning)  # "Overriding setting DATABASES ..."
+            with override_settings(DATABASES={**settings.DATABASES, REPLICA_DB: settings.DATABASES['default']}):
+                yield
+
+    @staticmethod
+    @read_replica
+    def view(request):
+        return HttpResponse(' '.join([
+            router.db_for_read(Product), router.db_for_read(get_user_model()), router.db_for_write(Product),
+        ]))
+
+    @staticmethod
+    @read_replica
+    def streaming_view(request):
+        return StreamingHttpResponse(router.db_for_read(Product) for _ in range(2))
+
+    def test_router_selection(self):
+        with self.replica():
+            self.assertEqual(self.view(self.factory.get('/')).content, b'replica default default')
+            response = self.streaming_view(self.factory.get('/'))
+            self.assertEqual(b''.join(response.streaming_content), b'replicareplica')
+            # Outside the decorated views
+            self.assertEqual(router.db_for_read(Product), PRIMARY_DB)
+
+        self.assertEqual(self.view(self.factory.get('/')).content, b'default default default')
+
+    def test_sticky_cookie_pins_primary(self):
+        cases = [(time.time() + 60, b'default'), (time.time() - 60, b'replica'), ('garbage', b'replica')]
+        with self.replica():
+            for value, database in cases:
+                with self.subTest(cookie=value):
+                    self.factory.cookies[STICKY_COOKIE] = str(value)
+                    self.assertEqual(self.view(self.factory.get('/')).content.split()[0], database)
+
+    @override_settings(REPLICA_STICKY_SECONDS=15)
+    def test_writes_set_sticky_cookie(self):
+        middleware = StickyPrimaryMiddleware(lambda request: HttpResponse())
+        self.assertNotIn(STICKY_COOKIE, middleware(self.factory.post('/')).cookies)
+
+        with self.replica():
+            self.assertNotIn(STICKY_COOKIE, middleware(self.factory.get('/')).cookies)
+            cookie = middleware(self.factory.post('/')).cookies[STICKY_COOKIE]
+        self.assertEqual(cookie['max-age'], 15)
+        self.assertTrue(cookie['httponly'])
+        self.assertAlmostEqual(float(cookie.value), time.time() + 15, delta=5)
+
+
+class SqlitePragmaTests(TestCase):
+    """Every new SQLite connection gets the PRAGMAs of settings.SQLITE_PRAGMAS"""
+
+    def connect(self, alias='default'):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        primary = connections['default']
+        wrapper = type(primary)({**primary.settings_dict, 'NAME': str(Path(directory.name) / 'db.sqlite3')}, alias)
+        self.addCleanup(wrapper.close)
+        wrapper.ensure_connection()
+        return wrapper
+
+    def pragma(self, wrapper, name):
+        return wrapper.connection.execute(f'PRAGMA {name}').fetchone()[0]
+
+    @override_settings(SQLITE_PRAGMAS={
+        'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'busy_timeout': 5000,
+        'cache_size': -65536, 'temp_store': 'MEMORY',
+    })
+    def test_applied_on_connect(self):
+        wrapper = self.connect()
+        self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(wrapper, 'synchronous'), 1)  # NORMAL
+        self.assertEqual(self.pragma(wrapper, 'busy_timeout'), 5000)
+        self.assertEqual(self.pragma(wrapper, 'cache_size'), -65536)
+        self.assertEqual(self.pragma(wrapper, 'temp_store'), 2)  # MEMORY
+        self.assertEqual(self.pragma(wrapper, 'query_only'), 0)
+
+    @override_settings(SQLITE_PRAGMAS={'busy_timeout': 250})
+    def test_replica_is_read_only(self):
+        wrapper = self.connect(REPLICA_DB)
+        self.assertEqual(self.pragma(wrapper, 'busy_timeout'), 250)
+        self.assertEqual(self.pragma(wrapper, 'query_only'), 1)
+
+    def test_rejects_anything_but_a_word_or_number(self):
+        for pragmas in ({'busy_timeout': '1; DROP TABLE pages_order'}, {'cache size': 10}):
+            with self.subTest(pragmas=pragmas), override_settings(SQLITE_PRAGMAS=pragmas):
+                with self.assertRaises(ValueError):
+                    sqlite_pragmas()
+
+
+class ConditionalGetTests(TestCase):
+    """List views answer 304 until a table they are built from is written"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser('staff', 'staff@example.com', 'password')
+        cls.products = create_store()
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_etag_follows_writes(self):
+        url = reverse('pages:get_products_ajax')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Bulk UPDATEs skip save() and signals, the triggers still see them
+        Product.objects.filter(pk=self.products[0].pk).update(price=Decimal('99.00'))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_unrelated_writes_keep_etag(self):
+        url = reverse('pages:get_products_ajax')
+        etag = self.client.get(url)['ETag']
+        Payment.objects.update(notes='checked')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+class NotificationCountTests(TestCase):
+    """The header counters come from one query and count zero when nothing matches"""
+
+    def test_counts(self):
+        products = create_store()
+        Product.objects.filter(pk=products[0].pk).update(stock_quantity=2)
+        with self.assertNumQueries(1):
+            counts = compute_notification_counts()
+        self.assertEqual(counts, {
+            'low_stock_count': 1,
+            'pending_payments': Payment.objects.filter(payment_status='pending').count(),
+            'new_customers_count': 4,
+        })
+
+    def test_empty_store(self):
+        self.assertEqual(compute_notification_counts(),
+                         {'low_stock_count': 0, 'pending_payments': 0, 'new_customers_count': 0})
+
+
+@override_settings(QUERY_INSPECTION='raise')
+class QueryBudgetTests(TestCase):
+    """Every main view stays within its @query_budget and has no N+1 pattern"""
+
+    GET_URLS = [
+        '/dashboard/',
+        '/customers/',
+        '/customers/?search=first',
+        '/inventory/',
+        '/orders/',
+        '/orders/?view=completed',
+        '/payments/',
+        '/reports/',
+        '/ajax/products/list/',
+        '/ajax/customers/list/',
+        '/ajax/products/lookup/?q=prod',
+        '/ajax/customers/lookup/?q=first',
+        '/ajax/reports/calendar/?month=1',
+        '/exports/orders.csv',
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser('staff', 'staff@example.com', 'password')
+        cls.products = create_store()
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_views_declare_a_budget(self):
+        for url in self.GET_URLS:
+            with self.subTest(url=url):
+                self.assertIsNotNone(getattr(resolve(url.split('?')[0]).func, 'query_budget', None))
+
+    def test_get_views_within_budget(self):
+        for url in self.GET_URLS:
+            with self.subTest(url=url):
+                cache.clear()
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+    def test_order_create_within_budget(self):
+        payload = {
+            'customer_email': 'new@example.com',
+            'customer_first_name': 'New',
+            'customer_last_name': 'Customer',
+            'customer_phone': '09170000000',
+            'customer_address': 'Main St.',
+            'payment_method': 'cash',
+            'items': [
+                {'product_id': product.pk, 'product_name': product.name, 'quantity': 1, 'unit_price': str(product.price)}
+                for product in self.products
+            ],
+        }
+        response = self.client.post(reverse('pages:order_create_ajax'), json.dumps(payload), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['success'])
+
+    def test_customer_orders_on_demand(self):
+        customer = Order.objects.select_related('customer').first().customer
+        url = reverse('pages:customer_orders_ajax', args=[customer.pk])
+        self.assertContains(self.client.get('/customers/'), url)
+        with self.assertNumQueries(4):
+            orders = self.client.get(url).json()['orders']
+        self.assertEqual(orders[0]['items'], ['Product 0', 'Product 1', 'Product 2'])
+
+    def test_calendar_rejects_out_of_range_dates(self):
+        for query in ['?year=99999999999999999999&month=1', '?year=9999&month=12', '?month=2&day=30']:
+            with self.subTest(query=query):
+                self.assertEqual(self.client.get('/ajax/reports/calendar/' + query).status_code, 400)
+
+    def test_bulk_update_stock_within_budget(self):
+        payload = {'items': [{'product_id': product.pk, 'delta': 1} for product in self.products]}
+        response = self.client.post(reverse('pages:product_bulk_update_stock_ajax'), json.dumps(payload),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+
+class QueryPlanCheckTests(TestCase):
+
+    def test_unbounded_reads(self):
+        for step in ['SCAN pages_order', 'SCAN pages_order USING INDEX order_status_idx',
+                     'SCAN pages_order USING COVERING INDEX order_status_idx', 'SEARCH pages_order',
+                     'SEARCH pages_order USING AUTOMATIC COVERING INDEX (status=?)',
+                     'SCAN pages_search_order VIRTUAL TABLE INDEX 0:']:
+            with self.subTest(step=step):
+                self.assertIsNotNone(unbounded_read(step))
+        for step in ['SEARCH pages_order USING INDEX order_status_idx (status=?)',
+                     'SEARCH pages_order USING INTEGER PRIMARY KEY (rowid=?)',
+                     'SCAN pages_search_order VIRTUAL TABLE INDEX 0:M1', 'USE TEMP B-TREE FOR ORDER BY']:
+            with self.subTest(step=step):
+                self.assertIsNone(unbounded_read(step))
+
+
+@override_settings(QUERY_INSPECTION='raise')
+class NPlusOneDetectorTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_store()
+
+    def render_items(self, orders):
+        template = Template('{% for order in orders %}{% for item in order.items.all %}{{ item.product_name }}{% endfor %}{% endfor %}')
+        with record_queries() as log:
+            template.render(Context({'orders': orders}))
+        return log
+
+    def test_detects_lazy_loads_in_a_template_loop(self):
+        log = self.render_items(Order.objects.all())
+        with self.assertRaisesMessage(NPlusOneError, '<unknown source>'):
+            check_queries(log, 'order items')
+
+    def test_prefetched_loop_passes(self):
+        log = self.render_items(Order.objects.prefetch_related('items'))
+        self.assertEqual(log.count, 2)
+        check_queries(log, 'order items')
+
+    def test_budget(self):
+        log = self.render_items(Order.objects.prefetch_related('items'))
+        with self.assertRaises(QueryBudgetExceeded):
+            check_queries(log, 'order items', budget=1)
+
+    @override_settings(QUERY_INSPECTION='warn')
+    def test_warn_mode_logs(self):
+        log = self.render_items(Order.objects.all())
+        with self.assertLogs('pages.query_inspection', level='WARNING') as logs:
+            check_queries(log, 'order items', budget=1)
+        self.assertEqual(len(logs.output), 2)
+
+
+@override_settings(REQUEST_TIMING=True, SLOW_REQUEST_MS=60000, SLOW_QUERY_MS=60000)
+class RequestTimingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser('staff', 'staff@example.com', 'password')
+        create_store()
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def server_timing(self, response):
+        """metric name -> its parameters, from the Server-Timing header"""
+        metrics = {}
+        for metric in response['Server-Timing'].split(', '):
+            name, *params = metric.split(';')
+            metrics[name] = dict(param.split('=', 1) for param in params)
+        return metrics
+
+    def test_server_timing_header(self):
+        metrics = self.server_timing(self.client.get('/orders/'))
+        self.assertEqual(set(metrics), {'total', 'view', 'db', 'tpl'})
+        self.assertGreater(float(metrics['tpl']['dur']), 0)
+        self.assertRegex(metrics['db']['desc'], r'^"[1-9]\d* queries"$')
+        self.assertGreaterEqual(float(metrics['total']['dur']), float(metrics['view']['dur']))
+
+    @override_settings(SLOW_REQUEST_MS=0, SLOW_QUERY_MS=0)
+    def test_slow_log(self):
+        with self.assertLogs('pages.request_timing', level='WARNING') as logs:
+            self.client.get('/orders/')
+        self.assertTrue(any('Slow query' in line and 'pages.views.orders' in line and 'SELECT' in line
+                            for line in logs.output))
+        self.assertTrue(any('Slow request' in line and 'GET /orders/' in line for line in logs.output))
+
+    @override_settings(SLOW_REQUEST_MS=0)
+    def test_no_header_for_visitors(self):
+        self.client.logout()
+        with self.assertLogs('pages.request_timing', level='WARNING') as logs:
+            response = self.client.get('/login/')
+        self.assertNotIn('Server-Timing', response)
+        self.assertTrue(any('Slow request' in line for line in logs.output))
+
+    @override_settings(SERVER_TIMING_HEADER='off')
+    def test_header_off(self):
+        self.assertNotIn('Server-Timing', self.client.get('/orders/'))
+
+    @override_settings(REQUEST_TIMING=False)
+    def test_disabled(self):
+        self.assertNotIn('Server-Timing', self.client.get('/orders/'))
+
+
+class MetricsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser('staff', 'staff@example.com', 'password')
+        cls.products = create_store()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_histogram_rendering(self):
+        registry = metrics.Registry()
+        registry.observe('http_request_duration_seconds', 0.003, view='pages:orders')
+        registry.observe('http_request_duration_seconds', 0.2, view='pages:orders')
+        registry.observe('http_request_duration_seconds', 60, view='pages:orders')
+        text = metrics.render([registry.snapshot()])
+        self.assertIn('# TYPE http_request_duration_seconds histogram', text)
+        self.assertIn('http_request_duration_seconds_bucket{view="pages:orders",le="0.005"} 1', text)
+        self.assertIn('http_request_duration_seconds_bucket{view="pages:orders",le="0.25"} 2', text)
+        self.assertIn('http_request_duration_seconds_bucket{view="pages:orders",le="10"} 2', text)
+        self.assertIn('http_request_duration_seconds_bucket{view="pages:orders",le="+Inf"} 3', text)
+        self.assertIn('http_request_duration_seconds_count{view="pages:orders"} 3', text)
+        self.assertIn('http_request_duration_seconds_sum{view="pages:orders"} 60.203', text)
+
+    def test_unknown_metric(self):
+        with self.assertRaises(ValueError):
+            metrics.inc('no_such_metric')
+
+    def test_processes_are_added_up(self):
+        other = metrics.Registry()
+        other.inc('orders_created_total', 1000)
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            (Path(directory) / 'metrics-999999.json').write_text(json.dumps(other.snapshot()))
+            metrics.inc('orders_created_total')
+            counters, _ = metrics.merge(metrics.collect())
+            own, _ = metrics.merge([metrics.registry.snapshot()])
+            key = ('orders_created_total', ())
+            self.assertEqual(counters[key], own[key] + 1000)
+            metrics.flush()
+            self.assertTrue(any(path.name != 'metrics-999999.json' for path in Path(directory).iterdir()))
+
+    def test_business_counters(self):
+        def value(key):
+            counters, _ = metrics.merge([metrics.registry.snapshot()])
+            return counters.get(key, 0)
+
+        orders_before = value(('orders_created_total', ()))
+        reserved_before = value(('stock_updates_total', (('reason', 'reserve'),)))
+        with self.captureOnCommitCallbacks(execute=True):
+            place_order({'email': 'metrics@example.com'}, [
+                {'product_id': product.pk, 'quantity': 1} for product in self.products[:2]
+            ])
+        self.assertEqual(value(('orders_created_total', ())), orders_before + 1)
+        self.assertEqual(value(('stock_updates_total', (('reason', 'reserve'),))), reserved_before + 2)
+
+    def test_endpoint_requires_staff_or_token(self):
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+        with override_settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+            self.assertEqual(self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+    def test_endpoint_reports_requests(self):
+        self.client.force_login(self.user)
+        self.client.get('/orders/')
+        self.client.get('/dashboard/')
+        text = self.client.get('/metrics/').content.decode()
+        self.assertIn('http_requests_total{method="GET",status="200",view="pages:orders"}', text)
+        self.assertIn('http_request_duration_seconds_count{view="pages:dashboard"}', text)
+        self.assertIn('db_queries_total{view="pages:orders"}', text)
+        self.assertIn('cache_lookups_total{cache="dashboard_stats",result="miss"}', text)
+
+
+class ProfilerTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser('root', 'root@example.com', 'password')
+        cls.staff = get_user_model().objects.create_user('clerk', 'clerk@example.com', 'password', is_staff=True)
+        create_store()
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        settings_override = override_settings(PROFILE_DIR=self.directory, PROFILE_MAX_CAPTURES=2)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_superuser_capture(self):
+        self.client.force_login(self.user)
+        response = self.client.get('/reports/?profile=1')
+        capture_id = response['X-Profile-Capture']
+        self.assertTrue((self.directory / f'{capture_id}.prof').is_file())
+
+        capture = json.loads((self.directory / f'{capture_id}.json').read_text())
+        self.assertEqual(capture['view'], 'pages:reports')
+        self.assertEqual(capture['query_count'], len(capture['queries']))
+        self.assertGreater(capture['query_count'], 0)
+        self.assertTrue(any('reports' in function['function'] for function in capture['top_functions']))
+
+        self.assertContains(self.client.get('/admin/profiles/'), '/reports/?profile=1')
+        self.assertContains(self.client.get(f'/admin/profiles/{capture_id}/'), 'Top functions by cumulative time')
+        self.assertEqual(self.client.get(f'/admin/profiles/{capture_id}.prof').status_code, 200)
+
+    def test_only_superusers_are_profiled(self):
+        self.client.force_login(self.staff)
+        response = self.client.get('/orders/', HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Capture', response)
+        self.assertEqual(list(self.directory.iterdir()), [])
+        self.assertEqual(self.client.get('/admin/profiles/').status_code, 403)
+
+    def test_ring_buffer(self):
+        self.client.force_login(self.user)
+        capture_ids = [self.client.get('/orders/', HTTP_X_PROFILE='1')['X-Profile-Capture'] for _ in range(3)]
+        self.assertEqual(sorted(path.stem for path in self.directory.glob('*.json')), sorted(capture_ids[1:]))
+        self.assertEqual(len(list(self.directory.glob('*.prof'))), 2)
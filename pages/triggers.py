@@ -0,0 +1,181 @@
+"""
+The SQLite triggers of the app, in one place.
+
+    search    keep the FTS5 tables of pages.search in sync (0007_search_index)
+    versions  count the writes to the tables behind pages.conditional (0010_table_versions)
+    catalog   count the edits of the columns pages.catalog keeps (0011_catalog_version)
+
+To alter a table on SQLite Django builds a new one, copies the rows and
+drops the old one. Triggers on the table are lost with it, and a trigger
+on another table that names it makes the rename fail ("error in trigger
+...: no such table"). So a migration that alters one of these tables
+starts with
+
+    migrations.RunPython(triggers.drop_triggers, triggers.create_triggers)
+
+and after every `migrate` the post_migrate handler (ensure_triggers)
+re-creates whichever triggers of an applied group are missing.
+"""
+from django.db import connections
+from django.db.migrations.recorder import MigrationRecorder
+
+
+VERSIONED_TABLES = [
+    'pages_customer', 'pages_product', 'pages_order', 'pages_orderitem', 'pages_payment',
+    'pages_stockalert', 'pages_customersummary', 'pages_dailysales', 'pages_dailypaymentmethodsales',
+]
+
+# Columns of pages.catalog.ProductRecord; stock moves leave them alone
+_CATALOG_COLUMNS = [
+    'product_id', 'name', 'sku', 'category', 'price', 'cost_price',
+    'low_stock_threshold', 'unit', 'is_active', 'created_at',
+]
+
+
+def _bump(counter):
+    return (
+        "UPDATE pages_tableversion SET version = version + 1, "
+        f"changed_at = strftime('%Y-%m-%d %H:%M:%f', 'now') WHERE \"table\" = '{counter}';"
+    )
+
+
+SEARCH_TRIGGERS = {
+    # Customers: name, email, phone
+    'pages_search_customer_ai': """AFTER INSERT ON pages_customer BEGIN
+        INSERT INTO pages_search_customer(rowid, first_name, last_name, email, phone)
+        VALUES (new.customer_id, new.first_name, new.last_name, new.email, new.phone);
+    END""",
+    'pages_search_customer_au': """AFTER UPDATE OF first_name, last_name, email, phone ON pages_customer BEGIN
+        DELETE FROM pages_search_customer WHERE rowid = old.customer_id;
+        INSERT INTO pages_search_customer(rowid, first_name, last_name, email, phone)
+        VALUES (new.customer_id, new.first_name, new.last_name, new.email, new.phone);
+        UPDATE pages_search_order
+        SET customer_name = new.first_name || ' ' || new.last_name, customer_email = new.email
+        WHERE rowid IN (SELECT order_id FROM pages_order WHERE customer_id = new.customer_id);
+    END""",
+    'pages_search_customer_ad': """AFTER DELETE ON pages_customer BEGIN
+        DELETE FROM pages_search_customer WHERE rowid = old.customer_id;
+    END""",
+
+    # Products: name, SKU
+    'pages_search_product_ai': """AFTER INSERT ON pages_product BEGIN
+        INSERT INTO pages_search_product(rowid, name, sku) VALUES (new.product_id, new.name, new.sku);
+    END""",
+    'pages_search_product_au': """AFTER UPDATE OF name, sku ON pages_product BEGIN
+        DELETE FROM pages_search_product WHERE rowid = old.product_id;
+        INSERT INTO pages_search_product(rowid, name, sku) VALUES (new.product_id, new.name, new.sku);
+    END""",
+    'pages_search_product_ad': """AFTER DELETE ON pages_product BEGIN
+        DELETE FROM pages_search_product WHERE rowid = old.product_id;
+    END""",
+
+    # Orders: order number plus the customer's name and email
+    'pages_search_order_ai': """AFTER INSERT ON pages_order BEGIN
+        INSERT INTO pages_search_order(rowid, order_number, customer_name, customer_email)
+        SELECT new.order_id, new.order_number, c.first_name || ' ' || c.last_name, c.email
+        FROM pages_customer c WHERE c.customer_id = new.customer_id;
+    END""",
+    'pages_search_order_au': """AFTER UPDATE OF order_number, customer_id ON pages_order BEGIN
+        DELETE FROM pages_search_order WHERE rowid = old.order_id;
+        INSERT INTO pages_search_order(rowid, order_number, customer_name, customer_email)
+        SELECT new.order_id, new.order_number, c.first_name || ' ' || c.last_name, c.email
+        FROM pages_customer c WHERE c.customer_id = new.customer_id;
+        UPDATE pages_search_payment SET order_number = new.order_number
+        WHERE rowid IN (SELECT payment_id FROM pages_payment WHERE order_id = new.order_id);
+    END""",
+    'pages_search_order_ad': """AFTER DELETE ON pages_order BEGIN
+        DELETE FROM pages_search_order WHERE rowid = old.order_id;
+    END""",
+
+    # Payments: payment number, order number, transaction ID
+    'pages_search_payment_ai': """AFTER INSERT ON pages_payment BEGIN
+        INSERT INTO pages_search_payment(rowid, payment_number, order_number, transaction_id)
+        SELECT new.payment_id, new.payment_number, o.order_number, new.transaction_id
+        FROM pages_order o WHERE o.order_id = new.order_id;
+    END""",
+    'pages_search_payment_au': """AFTER UPDATE OF payment_number, order_id, transaction_id ON pages_payment BEGIN
+        DELETE FROM pages_search_payment WHERE rowid = old.payment_id;
+        INSERT INTO pages_search_payment(rowid, payment_number, order_number, transaction_id)
+        SELECT new.payment_id, new.payment_number, o.order_number, new.transaction_id
+        FROM pages_order o WHERE o.order_id = new.order_id;
+    END""",
+    'pages_search_payment_ad': """AFTER DELETE ON pages_payment BEGIN
+        DELETE FROM pages_search_payment WHERE rowid = old.payment_id;
+    END""",
+}
+
+# Every row inserted, updated or deleted bumps its table's counter, whatever
+# wrote it: save(), bulk UPDATEs, cascades and raw SQL alike
+VERSION_TRIGGERS = {
+    f'{table}_version_{suffix}': f"AFTER {event} ON {table} BEGIN {_bump(table)} END"
+    for table in VERSIONED_TABLES
+    for suffix, event in (('ai', 'INSERT'), ('au', 'UPDATE'), ('ad', 'DELETE'))
+}
+
+CATALOG_TRIGGERS = {
+    'pages_product_catalog_ai': f"AFTER INSERT ON pages_product BEGIN {_bump('pages_product:catalog')} END",
+    'pages_product_catalog_ad': f"AFTER DELETE ON pages_product BEGIN {_bump('pages_product:catalog')} END",
+    'pages_product_catalog_au': (
+        "AFTER UPDATE ON pages_product WHEN "
+        + ' OR '.join(f'OLD.{column} IS NOT NEW.{column}' for column in _CATALOG_COLUMNS)
+        + f" BEGIN {_bump('pages_product:catalog')} END"
+    ),
+}
+
+# Migration that introduces each group -> its triggers
+TRIGGER_GROUPS = {
+    '0007_search_index': SEARCH_TRIGGERS,
+    '0010_table_versions': VERSION_TRIGGERS,
+    '0011_catalog_version': CATALOG_TRIGGERS,
+}
+
+
+def installed_triggers(connection):
+    """Names of the triggers in the database of `connection`"""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+        return {row[0] for row in cursor.fetchall()}
+
+
+def install(connection, triggers):
+    """Create the `triggers` ({name: definition}) that are missing"""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, definition in triggers.items():
+            cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {name} {definition}')
+
+
+def uninstall(connection, triggers):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name in triggers:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+
+
+def _applied_groups(connection):
+    applied = {name for app, name in MigrationRecorder(connection).applied_migrations() if app == 'pages'}
+    return [triggers for migration, triggers in TRIGGER_GROUPS.items() if migration in applied]
+
+
+def create_triggers(apps, schema_editor):
+    """RunPython operation: create the missing triggers of every applied group"""
+    for triggers in _applied_groups(schema_editor.connection):
+        install(schema_editor.connection, triggers)
+
+
+def drop_triggers(apps, schema_editor):
+    """RunPython operation: drop every trigger of the app, before a table rebuild"""
+    for triggers in TRIGGER_GROUPS.values():
+        uninstall(schema_editor.connection, triggers)
+
+
+def ensure_triggers(sender, using, **kwargs):
+    """post_migrate handler: put back the triggers a table rebuild dropped"""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    for triggers in _applied_groups(connection):
+        if set(triggers) - installed_triggers(connection):
+            install(connection, triggers)
@@ -26,13 +26,17 @@ urlpatterns = [
     # Customer
     path('ajax/customer/create/', views.customer_create_ajax, name='customer_create_ajax'),
     path('ajax/customers/list/', views.get_customers_ajax, name='get_customers_ajax'),
+    path('ajax/customers/lookup/', views.lookup_customers_ajax, name='lookup_customers_ajax'),
+    path('ajax/customer/<int:customer_id>/orders/', views.customer_orders_ajax, name='customer_orders_ajax'),
     
     # Product/Inventory
     path('ajax/product/create/', views.product_create_ajax, name='product_create_ajax'),
     path('ajax/product/update-stock/', views.product_update_stock_ajax, name='product_update_stock_ajax'),
+    path('ajax/product/bulk-update-stock/', views.product_bulk_update_stock_ajax, name='product_bulk_update_stock_ajax'),
     path('ajax/product/edit/', views.product_edit_ajax, name='product_edit_ajax'),
     path('ajax/product/delete/', views.product_delete_ajax, name='product_delete_ajax'),
     path('ajax/products/list/', views.get_products_ajax, name='get_products_ajax'),
+    path('ajax/products/lookup/', views.lookup_products_ajax, name='lookup_products_ajax'),
     
     # Orders
     path('ajax/order/create/', views.order_create_ajax, name='order_create_ajax'),
@@ -40,6 +44,15 @@ urlpatterns = [
     
     # Payments
     path('ajax/payment/update/', views.payment_update_ajax, name='payment_update_ajax'),
+    
+    # Reports
+    path('ajax/reports/calendar/', views.calendar_data_ajax, name='calendar_data_ajax'),
+
+    # CSV exports
+    path('exports/<str:name>.csv', views.export_csv, name='export_csv'),
+
+    # Metrics (Prometheus text format)
+    path('metrics/', views.metrics_view, name='metrics'),
 
      path('ajax/order/update-fulfilled/', views.order_update_fulfilled_ajax, name='order_update_fulfilled_ajax'),
 ]
\ No newline at end of file
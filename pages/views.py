@@ -2,15 +2,30 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
-from django.db.models import Sum, Count, Q, F, Avg, DecimalField
+from django.db import transaction
+from django.db.models import Sum, Count, Q, F, Avg, DecimalField, Prefetch
 from django.utils import timezone
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.cache import cache_control
 from datetime import timedelta, datetime
 from decimal import Decimal
+import hmac
 import json
-from .models import Customer, Product, Order, OrderItem, Payment, StockAlert
+from . import metrics
+from .catalog import get_catalog
+from .conditional import conditional_resource
+from .dashboard_stats import get_dashboard_stats
+from .db_routing import read_replica
+from .exports import ExportError, export_rows, parse_day, stream_csv
+from .json_lists import list_response, parse_bool, parse_fields, records_response, wants_stream
+from .ordering import OrderError, OutOfStock, change_order_status, place_order, set_stock_levels
+from .pagination import is_page_request, page_response, paginate_request
+from .query_inspection import query_budget
+from .search import filter_search, ranked_ids, ranked_matches
+from .models import Customer, Product, Order, OrderItem, Payment, StockAlert, DailySales, DailyPaymentMethodSales
 
 
 
@@ -88,75 +103,24 @@ def logout_view(request):
 # ============================================================================
 # DASHBOARD VIEW
 # ============================================================================
+@query_budget(10)
 @login_required(login_url='login')
+@read_replica
+@cache_control(private=True, no_cache=True)
+@conditional_resource('dashboard')
 def dashboard(request):
     """Dashboard with real-time statistics from database"""
    
-    # Get date ranges
-    today = timezone.now().date()
-    week_ago = today - timedelta(days=7)
-    month_ago = today - timedelta(days=30)
-   
-    # Calculate statistics from database
-    total_customers = Customer.objects.count()
-    total_products = Product.objects.filter(is_active=True).count()
-    total_orders = Order.objects.count()
-   
-    # Revenue calculations from actual payments
-    total_revenue = Payment.objects.filter(payment_status='completed').aggregate(
-        total=Sum('amount'))['total'] or Decimal('0.00')
-   
-    weekly_revenue = Payment.objects.filter(
-        payment_status='completed',
-        payment_date__gte=week_ago
-    ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-   
-    monthly_revenue = Payment.objects.filter(
-        payment_status='completed',
-        payment_date__gte=month_ago
-    ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-   
-    # Order statistics
-    pending_orders = Order.objects.filter(status='pending').count()
-    completed_orders = Order.objects.filter(status='completed').count()
-   
-    # Stock alerts
-    low_stock_count = Product.objects.filter(
-        is_active=True,
-        stock_quantity__lte=F('low_stock_threshold')
-    ).count()
-   
-    out_of_stock_count = Product.objects.filter(
-        is_active=True,
-        stock_quantity=0
-    ).count()
+    # Statistics block: one aggregate per table, cached briefly (see dashboard_stats)
+    context = get_dashboard_stats()
    
     # Recent orders from database
-    recent_orders = Order.objects.select_related('customer').order_by('-created_at')[:5]
+    context['recent_orders'] = Order.objects.select_related('customer').prefetch_related(
+        'items'
+    ).order_by('-created_at')[:5]
    
     # Active alerts from database
-    active_alerts = StockAlert.objects.filter(alert_status='active').select_related('product')[:10]
-   
-    # Notification data
-    new_customers = Customer.objects.filter(created_at__gte=today).count()
-    pending_payments = Payment.objects.filter(payment_status='pending').count()
-   
-    context = {
-        'total_customers': total_customers,
-        'total_products': total_products,
-        'total_orders': total_orders,
-        'total_revenue': total_revenue,
-        'weekly_revenue': weekly_revenue,
-        'monthly_revenue': monthly_revenue,
-        'pending_orders': pending_orders,
-        'completed_orders': completed_orders,
-        'low_stock_count': low_stock_count,
-        'out_of_stock_count': out_of_stock_count,
-        'recent_orders': recent_orders,
-        'active_alerts': active_alerts,
-        'new_customers_count': new_customers,
-        'pending_payments': pending_payments,
-    }
+    context['active_alerts'] = StockAlert.objects.filter(alert_status='active').select_related('product')[:10]
    
     return render(request, 'dashboard.html', context)
 
@@ -166,43 +130,36 @@ def dashboard(request):
 # ============================================================================
 # CUSTOMERS VIEWS - WITH AJAX SUPPORT
 # ============================================================================
-@login_required(login_url='login')
+@query_budget(8)
+@login_required
+@read_replica
+@cache_control(private=True, no_cache=True)
+@conditional_resource('customers_page')
 def customers(request):
-    """List all customers from database with search"""
+    """List customers from database with search, one keyset page at a time"""
    
     search_query = request.GET.get('search', '')
-    customers_list = Customer.objects.all()
+
+    # Totals come from the maintained CustomerSummary row, not per-row aggregation
+    customers_list = Customer.objects.select_related(
+        'summary',
+        'summary__latest_order'
+    ).prefetch_related(
+        'summary__latest_order__items'
+    )
    
     if search_query:
-        customers_list = customers_list.filter(
-            Q(first_name__icontains=search_query) |
-            Q(last_name__icontains=search_query) |
-            Q(email__icontains=search_query) |
-            Q(phone__icontains=search_query)
-        )
+        customers_list = filter_search(customers_list, search_query)
    
-    # Annotate with order count
-    customers_list = customers_list.annotate(
-        order_count=Count('orders')
-    ).order_by('-created_at')
-   
-    # Notification data
-    recent_orders = Order.objects.select_related('customer').order_by('-created_at')[:3]
-    low_stock_count = Product.objects.filter(
-        is_active=True,
-        stock_quantity__lte=F('low_stock_threshold')
-    ).count()
-    pending_payments = Payment.objects.filter(payment_status='pending').count()
+    page = paginate_request(request, customers_list, ('-created_at', '-pk'))
    
     context = {
-        'customers': customers_list,
+        'customers': page,
         'search_query': search_query,
-        'recent_orders': recent_orders,
-        'low_stock_count': low_stock_count,
-        'pending_payments': pending_payments,
-        'new_customers_count': Customer.objects.filter(created_at__gte=timezone.now().date()).count(),
     }
    
+    if is_page_request(request):
+        return page_response(request, 'partials/customer_rows.html', context, page)
     return render(request, 'customers.html', context)
 
 
@@ -249,9 +206,13 @@ def customer_create_ajax(request):
 # ============================================================================
 # INVENTORY VIEWS - WITH AJAX SUPPORT
 # ============================================================================
+@query_budget(6)
 @login_required(login_url='login')
+@read_replica
+@cache_control(private=True, no_cache=True)
+@conditional_resource('inventory_page')
 def inventory(request):
-    """List all products from database"""
+    """List products from database, one keyset page at a time"""
    
     search_query = request.GET.get('search', '')
     category_filter = request.GET.get('category', '')
@@ -264,10 +225,7 @@ def inventory(request):
     ).exclude(sku__startswith='CUSTOM-')
    
     if search_query:
-        products_list = products_list.filter(
-            Q(name__icontains=search_query) |
-            Q(sku__icontains=search_query)
-        )
+        products_list = filter_search(products_list, search_query)
    
     if category_filter:
         products_list = products_list.filter(category=category_filter)
@@ -276,34 +234,27 @@ def inventory(request):
         products_list = products_list.filter(stock_quantity__lte=F('low_stock_threshold'))
     elif stock_filter == 'out':
         products_list = products_list.filter(stock_quantity=0)
+    elif stock_filter == 'in':
+        products_list = products_list.filter(stock_quantity__gt=F('low_stock_threshold'))
    
-    products_list = products_list.order_by('category', 'name')
+    page = paginate_request(request, products_list, ('category', 'name', 'pk'))
    
-    # Notification data
-    recent_orders = Order.objects.select_related('customer').order_by('-created_at')[:3]
+    if is_page_request(request):
+        return page_response(request, 'partials/product_rows.html', {'products': page}, page)
+   
+    # Low stock preview (header counters come from the notifications context processor)
     low_stock_items = Product.objects.filter(
         is_active=True,
         category__in=['Flowers', 'Fillers'],
         stock_quantity__lte=F('low_stock_threshold')
     ).exclude(sku__startswith='CUSTOM-')[:5]
-    pending_payments = Payment.objects.filter(payment_status='pending').count()
-    new_customers_count = Customer.objects.filter(created_at__gte=timezone.now().date()).count()
-    low_stock_count = Product.objects.filter(
-        is_active=True,
-        category__in=['Flowers', 'Fillers'],
-        stock_quantity__lte=F('low_stock_threshold')
-    ).exclude(sku__startswith='CUSTOM-').count()
    
     context = {
-        'products': products_list,
+        'products': page,
         'search_query': search_query,
         'category_filter': category_filter,
-        'stock_filter': stock_filter,
-        'recent_orders': recent_orders,
+        'stock_status': stock_filter,
         'low_stock_items': low_stock_items,
-        'low_stock_count': low_stock_count,
-        'pending_payments': pending_payments,
-        'new_customers_count': new_customers_count,
     }
    
     return render(request, 'inventory.html', context)
@@ -340,7 +291,7 @@ def product_create_ajax(request):
         )
        
         # Check for stock alerts
-        StockAlert.check_and_create_alerts()
+        StockAlert.check_and_create_alerts([product.product_id])
        
         return JsonResponse({
             'success': True,
@@ -371,33 +322,23 @@ def product_update_stock_ajax(request):
         data = json.loads(request.body)
         product_id = data.get('product_id')
         new_stock = int(data.get('stock_quantity', 0))
-       
-        # Get product from database
-        product = Product.objects.get(product_id=product_id)
-        old_stock = product.stock_quantity
-       
-        # Update stock in database
-        product.stock_quantity = new_stock
-        product.save()
-       
-        # Check and create stock alerts
-        StockAlert.check_and_create_alerts()
-       
+
+        # A locked read-modify-write, so orders placed meanwhile are not overwritten
+        result = set_stock_levels([{'product_id': product_id, 'stock_quantity': new_stock}])[0]
+        if not result['success']:
+            status = 404 if result['message'] == 'Product not found' else 400
+            return JsonResponse({'success': False, 'message': result['message']}, status=status)
+
         return JsonResponse({
             'success': True,
-            'message': f'Stock updated for {product.name}: {old_stock} → {new_stock}',
+            'message': f"Stock updated for {result['name']}: {result['old_stock']} → {result['stock_quantity']}",
             'product': {
-                'id': product.product_id,
-                'name': product.name,
-                'stock_quantity': product.stock_quantity,
-                'stock_status': product.get_stock_status(),
+                'id': result['product_id'],
+                'name': result['name'],
+                'stock_quantity': result['stock_quantity'],
+                'stock_status': result['stock_status'],
             }
         })
-    except Product.DoesNotExist:
-        return JsonResponse({
-            'success': False,
-            'message': 'Product not found'
-        }, status=404)
     except Exception as e:
         return JsonResponse({
             'success': False,
@@ -405,6 +346,47 @@ def product_update_stock_ajax(request):
         }, status=400)
 
 
+# Most stock changes accepted by one bulk update request
+BULK_STOCK_MAX_ITEMS = 500
+
+
+@query_budget(12)
+@require_http_methods(["POST"])
+def product_bulk_update_stock_ajax(request):
+    """
+    AJAX endpoint to update the stock of many products at once (e.g. after a delivery)
+
+    POST {"items": [{"product_id": 1, "stock_quantity": 50}, {"product_id": 2, "delta": 24}, ...]}
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({
+            'success': False,
+            'message': 'Authentication required. Please log in.'
+        }, status=401)
+   
+    try:
+        items = json.loads(request.body).get('items')
+    except (ValueError, AttributeError):
+        items = None
+    if not isinstance(items, list) or not items:
+        return JsonResponse({'success': False, 'message': 'Send a non-empty list of items'}, status=400)
+    if len(items) > BULK_STOCK_MAX_ITEMS:
+        return JsonResponse({
+            'success': False,
+            'message': f'At most {BULK_STOCK_MAX_ITEMS} items can be updated at once'
+        }, status=400)
+   
+    results = set_stock_levels(items)
+    updated = sum(1 for result in results if result['success'])
+    return JsonResponse({
+        'success': updated == len(results),
+        'message': f'Stock updated for {updated} of {len(results)} items',
+        'updated': updated,
+        'failed': len(results) - updated,
+        'results': results,
+    })
+
+
 
 
 @require_http_methods(["POST"])
@@ -415,26 +397,45 @@ def product_edit_ajax(request):
         product_id = data.get('product_id')
         product = Product.objects.get(product_id=product_id)
 
+        new_stock = int(data['stock_quantity']) if 'stock_quantity' in data else None
+        if new_stock is not None and new_stock < 0:
+            return JsonResponse({'success': False, 'message': 'Stock cannot be negative'}, status=400)
+
+        fields = []
         if 'name' in data:
             product.name = data['name']
+            fields.append('name')
         if 'description' in data:
             product.description = data.get('description', '')
+            fields.append('description')
         if 'sku' in data:
             product.sku = data['sku']
+            fields.append('sku')
         if 'category' in data:
             product.category = data.get('category', '')
+            fields.append('category')
         if 'price' in data:
             product.price = Decimal(str(data['price']))
+            fields.append('price')
         if 'cost_price' in data and data['cost_price']:
             product.cost_price = Decimal(str(data['cost_price']))
-        if 'stock_quantity' in data:
-            product.stock_quantity = int(data['stock_quantity'])
+            fields.append('cost_price')
         if 'low_stock_threshold' in data:
             product.low_stock_threshold = int(data['low_stock_threshold'])
+            fields.append('low_stock_threshold')
         if 'unit' in data:
             product.unit = data.get('unit', 'pcs')
-        product.save()
-        StockAlert.check_and_create_alerts()
+            fields.append('unit')
+
+        with transaction.atomic():
+            # The stock level is left out: writing back the one read above would undo orders placed meanwhile
+            product.save(update_fields=fields + ['updated_at'])
+            if new_stock is not None and new_stock != product.stock_quantity:
+                product.stock_quantity = set_stock_levels(
+                    [{'product_id': product.pk, 'stock_quantity': new_stock}]
+                )[0]['stock_quantity']
+            else:
+                StockAlert.check_and_create_alerts([product.product_id])
         return JsonResponse({
             'success': True,
             'message': f'Product {product.name} updated successfully!',
@@ -467,55 +468,48 @@ def product_delete_ajax(request):
         return JsonResponse({'success': False, 'message': 'Product not found'}, status=404)
     except Exception as e:
         return JsonResponse({'success': False, 'message': f'Error deleting product: {str(e)}'}, status=400)
-@login_required(login_url='login')
+@query_budget(7)
+@login_required
+@read_replica
+@cache_control(private=True, no_cache=True)
+@conditional_resource('orders_page')
 def orders(request):
-    """List all orders from database"""
+    """List orders from database, one keyset page at a time"""
    
     search_query = request.GET.get('search', '')
     status_filter = request.GET.get('status', '')
    
+    # The completed orders modal pages through completed orders only
+    completed_view = request.GET.get('view') == 'completed'
+    if completed_view:
+        status_filter = 'completed'
+   
     # Get orders from database
-    orders_list = Order.objects.select_related('customer').prefetch_related('items__product')
+    orders_list = Order.objects.select_related('customer').prefetch_related('items', 'payments')
    
     if search_query:
-        orders_list = orders_list.filter(
-            Q(order_number__icontains=search_query) |
-            Q(customer__first_name__icontains=search_query) |
-            Q(customer__last_name__icontains=search_query) |
-            Q(customer__email__icontains=search_query)
-        )
+        orders_list = filter_search(orders_list, search_query)
    
     if status_filter:
         orders_list = orders_list.filter(status=status_filter)
    
-    orders_list = orders_list.order_by('-created_at')
-   
-    # Get all products for order creation
-    products = Product.objects.filter(is_active=True).order_by('name')
-   
-    # Notification data
-    new_customers = Customer.objects.filter(created_at__gte=timezone.now().date()).count()
-    low_stock_count = Product.objects.filter(
-        is_active=True,
-        stock_quantity__lte=F('low_stock_threshold')
-    ).count()
-    pending_payments = Payment.objects.filter(payment_status='pending').count()
+    page = paginate_request(request, orders_list, ('-created_at', '-pk'))
    
     context = {
-        'orders': orders_list,
-        'products': products,
+        'orders': page,
         'search_query': search_query,
         'status_filter': status_filter,
-        'new_customers_count': new_customers,
-        'low_stock_count': low_stock_count,
-        'pending_payments': pending_payments,
     }
    
+    if is_page_request(request):
+        rows_template = 'partials/completed_order_rows.html' if completed_view else 'partials/order_rows.html'
+        return page_response(request, rows_template, context, page)
     return render(request, 'orders.html', context)
 
 
 
 
+@query_budget(36)
 @require_http_methods(["POST"])
 def order_create_ajax(request):
     """
@@ -525,71 +519,48 @@ def order_create_ajax(request):
     3. Add Order Items
     4. Calculate Totals
     5. Auto-Create Payment
-    """
-    import sys
-    print('DEBUG: order_create_ajax called', file=sys.stderr)
    
+    All steps run in one transaction (see pages.ordering.place_order).
+    """
     # Check if user is authenticated
     if not request.user.is_authenticated:
-        print('DEBUG: User not authenticated', file=sys.stderr)
         return JsonResponse({
             'success': False,
             'message': 'Authentication required. Please log in.'
         }, status=401)
    
-    print(f'DEBUG: Authenticated user: {request.user}', file=sys.stderr)
-   
     try:
         data = json.loads(request.body)
-        print(f'DEBUG: Request data: {data}', file=sys.stderr)
        
         # Validate required fields
         required_fields = ['customer_email', 'customer_first_name', 'customer_phone', 'customer_address', 'items']
         for field in required_fields:
             if not data.get(field):
-                print(f'DEBUG: Missing field: {field}', file=sys.stderr)
                 return JsonResponse({
                     'success': False,
                     'message': f'Missing required field: {field}'
                 }, status=400)
        
-        # ======== STEP 1: CREATE OR GET CUSTOMER ========
-        import sys
-        customer_email = data.get('customer_email')
-        print(f'DEBUG: Creating/Getting customer with email: {customer_email}', file=sys.stderr)
-       
-        # Check if customer exists in database
-        customer, created = Customer.objects.get_or_create(
-            email=customer_email,
-            defaults={
-                'first_name': data.get('customer_first_name', ''),
-                'last_name': data.get('customer_last_name', ''),
-                'phone': data.get('customer_phone', ''),
-                'address': data.get('customer_address', ''),
-            }
-        )
-       
-        print(f'DEBUG: Customer created={created}, email={customer.email}', file=sys.stderr)
-        customer_created = created
-       
-        # ======== STEP 2: CREATE ORDER IN DATABASE ========
-        print('DEBUG: Creating order', file=sys.stderr)
-
-
         # Parse delivery date
         delivery_date_val = None
         raw_delivery_date = data.get('delivery_date', '')
         if raw_delivery_date:
             try:
-                from datetime import date
                 delivery_date_val = datetime.strptime(raw_delivery_date, '%Y-%m-%d').date()
             except ValueError:
                 pass
-
-
-        order = Order.objects.create(
-            customer=customer,
-            status='pending',
+       
+        order, payment, customer_created = place_order(
+            {
+                'email': data.get('customer_email'),
+                'first_name': data.get('customer_first_name', ''),
+                'last_name': data.get('customer_last_name', ''),
+                'phone': data.get('customer_phone', ''),
+                'address': data.get('customer_address', ''),
+            },
+            data.get('items', []),
+            payment_method=data.get('payment_method', 'cash'),
+            payment_status=data.get('payment_status', 'pending'),
             notes=data.get('notes', ''),
             tax=Decimal(str(data.get('tax', 0))),
             discount=Decimal(str(data.get('discount', 0))),
@@ -598,68 +569,9 @@ def order_create_ajax(request):
             customer_address=data.get('customer_address', ''),
             fulfilled_by=data.get('fulfilled_by', ''),
         )
-        print(f'DEBUG: Order created: {order.order_number}', file=sys.stderr)
-       
-        # ======== STEP 3: ADD ORDER ITEMS TO DATABASE ========
-        items_data = data.get('items', [])
-       
-        for item_data in items_data:
-            product_name = item_data.get('product_name', 'Custom Product')
-            unit_price = Decimal(str(item_data.get('unit_price', 0)))
-           
-            # Find product by name first, then by ID, otherwise create it
-            product = None
-            product_id = item_data.get('product_id')
-           
-            # Try to find by name (case-insensitive)
-            product = Product.objects.filter(name__iexact=product_name, is_active=True).first()
-           
-            # Try by ID as fallback
-            if not product and product_id:
-                try:
-                    product = Product.objects.get(product_id=product_id)
-                except Product.DoesNotExist:
-                    pass
-           
-            # Create a new product record if still not found
-            if not product:
-                import time
-                product = Product.objects.create(
-                    name=product_name,
-                    sku=f'CUSTOM-{int(time.time())}',
-                    price=unit_price if unit_price > 0 else Decimal('0.00'),
-                    stock_quantity=9999,
-                    low_stock_threshold=0,
-                    is_active=True
-                )
-           
-            if unit_price <= 0:
-                unit_price = product.price
-           
-            OrderItem.objects.create(
-                order=order,
-                product=product,
-                quantity=int(item_data.get('quantity', 1)),
-                unit_price=unit_price
-            )
-       
-        # ======== STEP 4: CALCULATE TOTALS ========
-        order.calculate_totals()
-       
-        # ======== STEP 5: AUTO-CREATE PAYMENT IN DATABASE ========
-        payment_method = data.get('payment_method', 'cash')
-        payment_status = data.get('payment_status', 'pending')
-       
-        payment = Payment.objects.create(
-            order=order,
-            amount=order.total,
-            payment_method=payment_method,
-            payment_status=payment_status,
-            notes=f'Auto-generated payment for order {order.order_number}'
-        )
+        customer = order.customer
        
         # Prepare response with all created data
-        import sys
         response_data = {
             'success': True,
             'message': f'Order {order.order_number} created successfully! Payment {payment.payment_number} generated.',
@@ -682,21 +594,20 @@ def order_create_ajax(request):
             }
         }
        
-        print(f'DEBUG: Returning success response: {response_data}', file=sys.stderr)
         return JsonResponse(response_data)
        
-    except Product.DoesNotExist as e:
-        import sys
-        print(f'DEBUG: Product not found error: {str(e)}', file=sys.stderr)
+    except OutOfStock as e:
         return JsonResponse({
             'success': False,
-            'message': 'Product not found in database'
-        }, status=404)
+            'message': str(e),
+            'shortages': e.shortages,
+        }, status=409)
+    except OrderError as e:
+        return JsonResponse({
+            'success': False,
+            'message': str(e)
+        }, status=400)
     except Exception as e:
-        import sys
-        import traceback
-        print(f'DEBUG: Generic exception error: {str(e)}', file=sys.stderr)
-        print(f'DEBUG: Traceback: {traceback.format_exc()}', file=sys.stderr)
         return JsonResponse({
             'success': False,
             'message': f'Error creating order: {str(e)}'
@@ -744,23 +655,23 @@ def order_update_status_ajax(request):
 # ============================================================================
 # PAYMENTS VIEWS - WITH AJAX SUPPORT
 # ============================================================================
-@login_required(login_url='login')
+@query_budget(9)
+@login_required
+@read_replica
+@cache_control(private=True, no_cache=True)
+@conditional_resource('payments_page')
 def payments(request):
-    """List all payments from database"""
+    """List payments from database, one keyset page at a time"""
    
     search_query = request.GET.get('search', '')
     status_filter = request.GET.get('status', '')
     method_filter = request.GET.get('method', '')
    
     # Get payments from database
-    payments_list = Payment.objects.select_related('order', 'order__customer')
+    payments_list = Payment.objects.select_related('order__customer')
    
     if search_query:
-        payments_list = payments_list.filter(
-            Q(payment_number__icontains=search_query) |
-            Q(order__order_number__icontains=search_query) |
-            Q(transaction_id__icontains=search_query)
-        )
+        payments_list = filter_search(payments_list, search_query)
    
     if status_filter:
         payments_list = payments_list.filter(payment_status=status_filter)
@@ -768,31 +679,27 @@ def payments(request):
     if method_filter:
         payments_list = payments_list.filter(payment_method=method_filter)
    
-    payments_list = payments_list.order_by('-payment_date')
-   
-    # Calculate totals from database
-    total_payments = payments_list.filter(payment_status='completed').aggregate(
-        total=Sum('amount'))['total'] or Decimal('0.00')
-   
-    # Notification data
-    recent_orders = Order.objects.select_related('customer').order_by('-created_at')[:3]
-    new_customers = Customer.objects.filter(created_at__gte=timezone.now().date()).count()
-    low_stock_count = Product.objects.filter(
-        is_active=True,
-        stock_quantity__lte=F('low_stock_threshold')
-    ).count()
+    page = paginate_request(request, payments_list, ('-payment_date', '-pk'))
    
     context = {
-        'payments': payments_list,
-        'total_payments': total_payments,
+        'payments': page,
         'search_query': search_query,
         'status_filter': status_filter,
         'method_filter': method_filter,
-        'recent_orders': recent_orders,
-        'new_customers_count': new_customers,
-        'low_stock_count': low_stock_count,
     }
    
+    if is_page_request(request):
+        return page_response(request, 'partials/payment_rows.html', context, page)
+   
+    # Summary cards cover every payment, not just the current page
+    context.update({
+        'total_revenue': Payment.objects.filter(payment_status='completed').aggregate(
+            total=Sum('amount'))['total'] or Decimal('0.00'),
+        'pending_payments_count': Payment.objects.filter(payment_status='pending').count(),
+        'customers_transacted': Customer.objects.filter(orders__payments__isnull=False).distinct().count(),
+        'orders_completed': Order.objects.filter(status='completed').count(),
+    })
+   
     return render(request, 'payments.html', context)
 
 
@@ -840,122 +747,66 @@ def payment_update_ajax(request):
 # ============================================================================
 # REPORTS VIEW - PULLING DATA FROM DATABASE
 # ============================================================================
+@query_budget(13)
 @login_required(login_url='login')
+@read_replica
+@cache_control(private=True, no_cache=True)
+@conditional_resource('reports')
 def reports(request):
     """Generate comprehensive reports from database with strict separation of sales and inventory"""
    
-    # Get date ranges
-    today = timezone.now().date()
+    # Get date ranges (business days in the shop's timezone)
+    today = timezone.localdate()
     week_ago = today - timedelta(days=7)
     month_ago = today - timedelta(days=30)
    
-    # ======== SALES OVERVIEW - FROM ORDER MODEL ONLY ========
-    # Total sales from all completed orders
-    total_sales = Order.objects.filter(
-        status='completed'
-    ).aggregate(total=Sum('total'))['total'] or Decimal('0.00')
-   
-    # Daily sales from total_amount (Order.total)
-    daily_sales = Order.objects.filter(
-        created_at__date=today,
-        status='completed'
-    ).aggregate(
-        total_orders=Count('order_id'),
-        total_revenue=Sum('total')
-    )
-    daily_sales['total_orders'] = daily_sales['total_orders'] or 0
-    daily_sales['total_revenue'] = daily_sales['total_revenue'] or Decimal('0.00')
-   
-    # Weekly sales from Order.total
-    weekly_sales = Order.objects.filter(
-        created_at__date__gte=week_ago,
-        status='completed'
-    ).aggregate(
-        total_orders=Count('order_id'),
-        total_revenue=Sum('total')
+    # ======== SALES OVERVIEW - FROM THE DAILY SALES ROLLUP ========
+    # One pass over the pre-aggregated days instead of scanning Order
+    sales = DailySales.objects.aggregate(
+        total_sales=Sum('revenue'),
+        daily_orders=Sum('order_count', filter=Q(business_date=today)),
+        daily_revenue=Sum('revenue', filter=Q(business_date=today)),
+        weekly_orders=Sum('order_count', filter=Q(business_date__gte=week_ago)),
+        weekly_revenue=Sum('revenue', filter=Q(business_date__gte=week_ago)),
+        monthly_orders=Sum('order_count', filter=Q(business_date__gte=month_ago)),
+        monthly_revenue=Sum('revenue', filter=Q(business_date__gte=month_ago)),
     )
-    weekly_sales['total_orders'] = weekly_sales['total_orders'] or 0
-    weekly_sales['total_revenue'] = weekly_sales['total_revenue'] or Decimal('0.00')
-   
-    # Monthly sales from Order.total
-    monthly_sales = Order.objects.filter(
-        created_at__date__gte=month_ago,
-        status='completed'
-    ).aggregate(
-        total_orders=Count('order_id'),
-        total_revenue=Sum('total')
-    )
-    monthly_sales['total_orders'] = monthly_sales['total_orders'] or 0
-    monthly_sales['total_revenue'] = monthly_sales['total_revenue'] or Decimal('0.00')
+    total_sales = sales['total_sales'] or Decimal('0.00')
+    daily_sales = {
+        'total_orders': sales['daily_orders'] or 0,
+        'total_revenue': sales['daily_revenue'] or Decimal('0.00'),
+    }
+    weekly_sales = {
+        'total_orders': sales['weekly_orders'] or 0,
+        'total_revenue': sales['weekly_revenue'] or Decimal('0.00'),
+    }
+    monthly_sales = {
+        'total_orders': sales['monthly_orders'] or 0,
+        'total_revenue': sales['monthly_revenue'] or Decimal('0.00'),
+    }
    
-    # ======== COLLECT MONTHLY SALES DATA BY DAY FOR CALENDAR ========
-    import json as json_module
-    from datetime import date as date_class
+    # ======== MONTH TOTALS FOR THE CALENDAR ========
+    # Only 12 numbers go into the page; day and order details are fetched
+    # per month from calendar_data_ajax when the calendar is opened
+    from django.db.models.functions import ExtractMonth
     
-    monthly_sales_by_day = {}
-    monthly_orders_by_day = {}
     month_names = ['January', 'February', 'March', 'April', 'May', 'June',
                    'July', 'August', 'September', 'October', 'November', 'December']
     current_year = today.year
+    monthly_totals = {month_name: 0 for month_name in month_names}
+    month_rows = DailySales.objects.filter(
+        business_date__year=current_year
+    ).annotate(month=ExtractMonth('business_date')).order_by().values('month').annotate(
+        revenue=Sum('revenue')
+    )
+    for row in month_rows:
+        monthly_totals[month_names[row['month'] - 1]] = float(row['revenue'] or 0)
+    monthly_totals_json = json.dumps(monthly_totals)
    
-    for month_num in range(1, 13):
-        month_name = month_names[month_num - 1]
-        daily_totals = {}
-        daily_orders_list = {}
-       
-        # Get all COMPLETED orders for this specific month and year
-        # Filter by date range to ensure exact matching
-        month_start = date_class(current_year, month_num, 1)
-        if month_num == 12:
-            month_end = date_class(current_year + 1, 1, 1) - timedelta(days=1)
-        else:
-            month_end = date_class(current_year, month_num + 1, 1) - timedelta(days=1)
-       
-        orders_in_month = Order.objects.filter(
-            created_at__date__gte=month_start,
-            created_at__date__lte=month_end + timedelta(days=1),
-            status='completed'
-        ).select_related('customer').order_by('created_at')
-       
-        # Group orders by their exact date (use localtime to respect PH timezone)
-        for order in orders_in_month:
-            order_date = timezone.localtime(order.created_at).date() if hasattr(order.created_at, 'date') else order.created_at
-            day = order_date.day
-            day_str = str(day)
-           
-            if day_str not in daily_totals:
-                daily_totals[day_str] = 0
-                daily_orders_list[day_str] = []
-           
-            daily_totals[day_str] += float(order.total or 0)
-            daily_orders_list[day_str].append({
-                'order_number': order.order_number,
-                'customer_name': f"{order.customer.first_name} {order.customer.last_name}",
-                'total': float(order.total or 0),
-                'order_id': order.order_id,
-                'order_date': order_date.isoformat()
-            })
-            
-            # Skip orders that fall outside this month after local conversion
-            if order_date < month_start or order_date > month_end:
-                daily_totals[day_str] -= float(order.total or 0)
-                daily_orders_list[day_str].pop()
-                if not daily_orders_list[day_str]:
-                    del daily_orders_list[day_str]
-                    del daily_totals[day_str]
-       
-        monthly_sales_by_day[month_name] = daily_totals
-        monthly_orders_by_day[month_name] = daily_orders_list
-   
-    monthly_sales_json = json_module.dumps(monthly_sales_by_day)
-    monthly_orders_json = json_module.dumps(monthly_orders_by_day)
-   
-    # ======== SALES BREAKDOWN - PAYMENT METHOD DISTRIBUTION (FROM PAYMENT MODEL) ========
-    payment_methods = Payment.objects.filter(
-        payment_status='completed'
-    ).values('payment_method').annotate(
+    # ======== SALES BREAKDOWN - PAYMENT METHOD DISTRIBUTION (FROM PAYMENT ROLLUP) ========
+    payment_methods = DailyPaymentMethodSales.objects.values('payment_method').annotate(
         total=Sum('amount'),
-        count=Count('payment_id')
+        count=Sum('payment_count')
     ).order_by('-total')
    
     # ======== SALES PERFORMANCE OVERVIEW - TOP SELLING BOUQUETS (FROM ORDERITEM MODEL) ========
@@ -1020,8 +871,8 @@ def reports(request):
         'daily_sales': daily_sales,
         'weekly_sales': weekly_sales,
         'monthly_sales': monthly_sales,
-        'monthly_sales_by_day_json': monthly_sales_json,
-        'monthly_orders_by_day_json': monthly_orders_json,
+        'monthly_totals_json': monthly_totals_json,
+        'calendar_year': current_year,
         
         # Sales Breakdown
         'payment_methods': payment_methods,
@@ -1045,24 +896,301 @@ def reports(request):
 # ============================================================================
 # API ENDPOINTS FOR GETTING DATA
 # ============================================================================
+PRODUCT_LIST_FIELDS = (
+    'product_id', 'name', 'sku', 'category', 'price', 'cost_price', 'stock_quantity',
+    'low_stock_threshold', 'unit', 'is_active', 'created_at', 'updated_at',
+)
+PRODUCT_LIST_DEFAULT_FIELDS = ('product_id', 'name', 'sku', 'price', 'stock_quantity', 'category')
+
+CUSTOMER_LIST_FIELDS = (
+    'customer_id', 'first_name', 'last_name', 'email', 'phone',
+    'address', 'city', 'state', 'zip_code', 'created_at', 'updated_at',
+)
+CUSTOMER_LIST_DEFAULT_FIELDS = ('customer_id', 'first_name', 'last_name', 'email', 'phone')
+
+
+@query_budget(6)
 @require_http_methods(["GET"])
+@read_replica
+@cache_control(private=True, no_cache=True)
+@conditional_resource('products')
 def get_products_ajax(request):
-    """Get all products as JSON"""
-    products = Product.objects.filter(is_active=True).values(
-        'product_id', 'name', 'sku', 'price', 'stock_quantity', 'category'
-    )
-    return JsonResponse(list(products), safe=False)
+    """
+    Get products as JSON, one keyset page at a time.
+
+    GET ?fields=a,b&category=&active=true|false|all&search=&limit=&cursor=
+    GET ...&stream=1   -> every matching product as one streamed JSON array
+   
+    Pages are served from the in-process catalog snapshot, with the stock
+    levels (and updated_at) of their rows read from the table.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({
+            'success': False,
+            'message': 'Authentication required. Please log in.'
+        }, status=401)
+   
+    try:
+        fields = parse_fields(request, PRODUCT_LIST_FIELDS, PRODUCT_LIST_DEFAULT_FIELDS)
+        active = parse_bool(request.GET.get('active', 'true'))
+    except ValueError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+   
+    category = request.GET.get('category', '')
+    search_query = request.GET.get('search', '')
+   
+    if wants_stream(request):
+        products = Product.objects.all()
+        if active is not None:
+            products = products.filter(is_active=active)
+        if category:
+            products = products.filter(category=category)
+        if search_query:
+            products = filter_search(products, search_query)
+        return list_response(request, products, fields, ('pk',))
+   
+    records = get_catalog().records
+    if active is not None:
+        records = [record for record in records if record.is_active == active]
+    if category:
+        records = [record for record in records if record.category == category]
+    if search_query:
+        matches = set(filter_search(Product.objects.all(), search_query).values_list('pk', flat=True))
+        records = [record for record in records if record.product_id in matches]
+    return records_response(request, records, fields, Product)
 
 
 
 
+@query_budget(4)
 @require_http_methods(["GET"])
+@read_replica
+@cache_control(private=True, no_cache=True)
+@conditional_resource('customers')
 def get_customers_ajax(request):
-    """Get all customers as JSON"""
-    customers = Customer.objects.all().values(
-        'customer_id', 'first_name', 'last_name', 'email', 'phone'
+    """
+    Get customers as JSON, one keyset page at a time.
+
+    GET ?fields=a,b&search=&limit=&cursor=
+    GET ...&stream=1   -> every matching customer as one streamed JSON array
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({
+            'success': False,
+            'message': 'Authentication required. Please log in.'
+        }, status=401)
+   
+    try:
+        fields = parse_fields(request, CUSTOMER_LIST_FIELDS, CUSTOMER_LIST_DEFAULT_FIELDS)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+   
+    customers = Customer.objects.all()
+   
+    search_query = request.GET.get('search', '')
+    if search_query:
+        customers = filter_search(customers, search_query)
+   
+    return list_response(request, customers, fields, ('pk',))
+
+
+
+
+LOOKUP_DEFAULT_LIMIT = 8
+LOOKUP_MAX_LIMIT = 20
+
+
+def _lookup_limit(request):
+    try:
+        return min(max(int(request.GET.get('limit', LOOKUP_DEFAULT_LIMIT)), 1), LOOKUP_MAX_LIMIT)
+    except ValueError:
+        return LOOKUP_DEFAULT_LIMIT
+
+
+@query_budget(4)
+@require_http_methods(["GET"])
+@read_replica
+def lookup_products_ajax(request):
+    """
+    Type-ahead for the order form: best matching active products by name/SKU prefix.
+
+    GET ?q=ros&limit=8
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({
+            'success': False,
+            'message': 'Authentication required. Please log in.'
+        }, status=401)
+   
+    # Rank through the search index, then read those rows for live stock levels
+    ids = ranked_ids(Product, request.GET.get('q', ''), _lookup_limit(request), Product.objects.filter(is_active=True))
+    rows = Product.objects.only('name', 'sku', 'price', 'stock_quantity', 'unit').in_bulk(ids)
+    products = [rows[pk] for pk in ids if pk in rows]
+    return JsonResponse({
+        'success': True,
+        'results': [{
+            'product_id': product.product_id,
+            'name': product.name,
+            'sku': product.sku,
+            'price': float(product.price),
+            'stock_quantity': product.stock_quantity,
+            'unit': product.unit,
+        } for product in products],
+    })
+
+
+
+
+@query_budget(4)
+@require_http_methods(["GET"])
+@read_replica
+def lookup_customers_ajax(request):
+    """
+    Type-ahead for the order form: best matching customers by name/email/phone prefix.
+
+    GET ?q=mar&limit=8
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({
+            'success': False,
+            'message': 'Authentication required. Please log in.'
+        }, status=401)
+   
+    customers = ranked_matches(
+        Customer.objects.only('customer_id', 'first_name', 'last_name', 'email', 'phone', 'address'),
+        request.GET.get('q', ''),
+        _lookup_limit(request)
     )
-    return JsonResponse(list(customers), safe=False)
+    return JsonResponse({
+        'success': True,
+        'results': [{
+            'customer_id': customer.customer_id,
+            'first_name': customer.first_name,
+            'last_name': customer.last_name,
+            'email': customer.email,
+            'phone': customer.phone,
+            'address': customer.address,
+        } for customer in customers],
+    })
+
+
+
+
+@query_budget(4)
+@require_http_methods(["GET"])
+@read_replica
+def customer_orders_ajax(request, customer_id):
+    """
+    Order history of one customer for the profile modal, newest first.
+
+    GET ajax/customer/<id>/orders/
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({
+            'success': False,
+            'message': 'Authentication required. Please log in.'
+        }, status=401)
+   
+    orders = Order.objects.filter(customer_id=customer_id).only(
+        'order_id', 'order_number', 'status', 'created_at'
+    ).prefetch_related(
+        Prefetch('items', queryset=OrderItem.objects.only('order_id', 'product_name').order_by('pk'))
+    ).order_by('-created_at', '-pk')
+    return JsonResponse({
+        'success': True,
+        'orders': [{
+            'order_number': order.order_number,
+            'status': order.status,
+            'created_at': order.created_at,
+            'items': [item.product_name for item in order.items.all()],
+        } for order in orders],
+    })
+
+
+
+
+@query_budget(4)
+@require_http_methods(["GET"])
+@read_replica
+@cache_control(private=True, no_cache=True)
+@conditional_resource('calendar')
+def calendar_data_ajax(request):
+    """
+    Calendar data for the reports page, one month (or one day) at a time.
+
+    GET ?year=YYYY&month=M            -> per-day order count and revenue from the rollup
+    GET ?year=YYYY&month=M&day=D      -> completed orders of that business day
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({
+            'success': False,
+            'message': 'Authentication required. Please log in.'
+        }, status=401)
+   
+    from datetime import date as date_class
+    from django.db.models.functions import TruncDate
+   
+    try:
+        year = int(request.GET.get('year') or timezone.localdate().year)
+        month = int(request.GET.get('month', ''))
+        day = request.GET.get('day')
+        if day:
+            first_day = last_day = date_class(year, month, int(day))
+        else:
+            first_day = date_class(year, month, 1)
+            last_day = date_class(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    except (ValueError, OverflowError):
+        return JsonResponse({
+            'success': False,
+            'message': 'Invalid year, month or day'
+        }, status=400)
+   
+    if not day:
+        days = {
+            str(row['business_date'].day): {
+                'orders': row['order_count'],
+                'revenue': float(row['revenue']),
+            }
+            for row in DailySales.objects.filter(
+                business_date__gte=first_day,
+                business_date__lte=last_day,
+                order_count__gt=0
+            ).values('business_date', 'order_count', 'revenue')
+        }
+        return JsonResponse({
+            'success': True,
+            'year': year,
+            'month': month,
+            'days': days,
+        })
+   
+    start, end = DailySales.day_bounds(first_day)
+    orders = Order.objects.filter(
+        status='completed',
+        created_at__gte=start,
+        created_at__lt=end
+    ).annotate(
+        order_date=TruncDate('created_at', tzinfo=timezone.get_current_timezone())
+    ).order_by('created_at').values(
+        'order_id', 'order_number', 'total', 'order_date',
+        'customer__first_name', 'customer__last_name'
+    )
+    return JsonResponse({
+        'success': True,
+        'year': year,
+        'month': month,
+        'day': first_day.day,
+        'orders': [
+            {
+                'order_number': order['order_number'],
+                'customer_name': f"{order['customer__first_name']} {order['customer__last_name']}",
+                'total': float(order['total'] or 0),
+                'order_id': order['order_id'],
+                'order_date': order['order_date'].isoformat(),
+            }
+            for order in orders
+        ],
+    })
 
 
 
@@ -1081,69 +1209,9 @@ def features(request):
     """Features page"""
     return render(request, 'features.html')
 
-# ── Helper: shared notification context ─────────────────────────────
-def get_notification_context():
-    from django.utils import timezone
-    today = timezone.now().date()
-    low_stock_count    = Product.objects.filter(is_active=True, stock_quantity__lte=10).count()
-    pending_payments   = Payment.objects.filter(payment_status='pending').count()
-    new_customers_count = Customer.objects.filter(created_at__date=today).count()
-    return {
-        'low_stock_count':    low_stock_count,
-        'pending_payments':   pending_payments,
-        'new_customers_count': new_customers_count,
-    }
-
-
-# ── Orders page ──────────────────────────────────────────────────────
-@login_required
-def orders(request):
-    orders = Order.objects.all().prefetch_related(
-        'items', 'customer', 'payments'
-    ).order_by('created_at')   
-    ctx = get_notification_context()
-    ctx['orders'] = orders
-    return render(request, 'orders.html', ctx)
-
-
-# ── Customers page ───────────────────────────────────────────────────
-@login_required
-def customers(request):
-    customers = Customer.objects.prefetch_related(
-        'orders__items__product',
-        'orders__payments'
-    ).order_by('-created_at')
-    ctx = get_notification_context()
-    ctx['customers'] = customers
-    return render(request, 'customers.html', ctx)
-
-
-# ── Payments page ────────────────────────────────────────────────────
-@login_required
-def payments(request):
-    from django.db.models import Sum
-
-    all_payments = Payment.objects.select_related(
-        'order__customer'
-    ).order_by('-payment_date')
-
-    total_revenue        = Payment.objects.filter(payment_status='completed').aggregate(t=Sum('amount'))['t'] or 0
-    pending_payments_count = Payment.objects.filter(payment_status='pending').count()
-    customers_transacted = Customer.objects.filter(orders__payments__isnull=False).distinct().count()
-    orders_completed     = Order.objects.filter(status='completed').count()
-
-    ctx = get_notification_context()
-    ctx.update({
-        'payments':              all_payments,
-        'total_revenue':         total_revenue,
-        'pending_payments_count': pending_payments_count,
-        'customers_transacted':  customers_transacted,
-        'orders_completed':      orders_completed,
-    })
-    return render(request, 'payments.html', ctx)
-
 
 # ── AJAX: Update order status ────────────────────────────────────────
+@query_budget(20)
 @login_required
 @require_http_methods(["POST"])
 def order_update_status_ajax(request):
@@ -1156,13 +1224,13 @@ def order_update_status_ajax(request):
         if not order_id or not new_status:
             return JsonResponse({'success': False, 'message': 'Missing order_id or status'}, status=400)
 
-        valid_statuses = ['pending', 'processing', 'completed']
+        valid_statuses = ['pending', 'processing', 'completed', 'cancelled']
         if new_status not in valid_statuses:
             return JsonResponse({'success': False, 'message': f'Invalid status. Must be one of: {", ".join(valid_statuses)}'}, status=400)
 
+        # Cancelling puts the items back into stock, reopening reserves them again
         order = Order.objects.get(order_id=order_id)
-        order.status = new_status
-        order.save()
+        change_order_status(order, new_status)
 
         return JsonResponse({
             'success': True,
@@ -1172,6 +1240,8 @@ def order_update_status_ajax(request):
 
     except Order.DoesNotExist:
         return JsonResponse({'success': False, 'message': 'Order not found'}, status=404)
+    except OutOfStock as e:
+        return JsonResponse({'success': False, 'message': str(e), 'shortages': e.shortages}, status=409)
     except Exception as e:
         return JsonResponse({'success': False, 'message': str(e)}, status=500)
     
@@ -1193,4 +1263,53 @@ def order_update_fulfilled_ajax(request):
     except Order.DoesNotExist:
         return JsonResponse({'success': False, 'message': 'Order not found'}, status=404)
     except Exception as e:
-        return JsonResponse({'success': False, 'message': str(e)}, status=500)
\ No newline at end of file
+        return JsonResponse({'success': False, 'message': str(e)}, status=500)
+
+
+
+
+# ============================================================================
+# CSV EXPORTS
+# ============================================================================
+@query_budget(3)
+@login_required(login_url='login')
+@read_replica
+def export_csv(request, name):
+    """
+    Download orders, payments, customers or inventory as CSV, streamed row by row
+
+    GET /exports/orders.csv?since=2026-01-01&until=2026-01-31&status=completed
+    """
+    try:
+        header, rows = export_rows(
+            name,
+            since=parse_day(request.GET.get('since'), 'since'),
+            until=parse_day(request.GET.get('until'), 'until'),
+            status=request.GET.get('status') or None,
+        )
+    except ExportError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+   
+    response = StreamingHttpResponse(stream_csv(header, rows), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{name}-{timezone.localdate().isoformat()}.csv"'
+    return response
+
+
+# ============================================================================
+# METRICS
+# ============================================================================
+@require_http_methods(["GET"])
+def metrics_view(request):
+    """
+    Counters and latency histograms of every worker, in the Prometheus text format
+
+    Scrapers send "Authorization: Bearer <METRICS_TOKEN>"; staff can also open it logged in.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    authorized = bool(token) and hmac.compare_digest(supplied.encode(), token.encode())
+    if not authorized and not request.user.is_staff:
+        return HttpResponseForbidden('Metrics require a token or a staff login')
+
+    metrics.flush()
+    return HttpResponse(metrics.render(metrics.collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -132,24 +132,30 @@ document.addEventListener('DOMContentLoaded', function() {
 });
 
 function loadProductsFromDatabase() {
-    fetch('/ajax/products/list/')
-        .then(response => response.json())
-        .then(products => {
-            // Populate product dropdown
-            const productSelect = document.getElementById('itemSelect');
-            if (productSelect) {
-                productSelect.innerHTML = '<option value="">Select Product</option>';
-                products.forEach(product => {
+    const productSelect = document.getElementById('itemSelect');
+    if (!productSelect) return;
+    productSelect.innerHTML = '<option value="">Select Product</option>';
+
+    // Follow the cursor until every page of products is in the dropdown
+    const loadPage = (cursor) => {
+        const params = new URLSearchParams({ fields: 'product_id,name,stock_quantity', limit: '100' });
+        if (cursor) params.set('cursor', cursor);
+        return fetch('/ajax/products/list/?' + params, { cache: 'no-cache' })
+            .then(response => response.json())
+            .then(data => {
+                data.results.forEach(product => {
                     const option = document.createElement('option');
                     option.value = product.product_id;
                     option.textContent = `${product.name} (Stock: ${product.stock_quantity})`;
                     productSelect.appendChild(option);
                 });
-            }
-        })
-        .catch(error => {
-            console.error('Error loading products:', error);
-        });
+                if (data.has_next) return loadPage(data.next_cursor);
+            });
+    };
+
+    loadPage(null).catch(error => {
+        console.error('Error loading products:', error);
+    });
 }
 
 // ============================================================================
@@ -0,0 +1,60 @@
+// keyset-pagination.js — "Load more" and server-side filters for the list pages
+
+// ── Load more ─────────────────────────────────────────────────────────────────
+// The button carries the cursor of the next page, the tbody to append to
+// (data-target) and optionally the URL to page through (data-url, defaults to
+// the current page so its search/filter parameters are kept).
+function loadMoreRows(button) {
+    const target = document.querySelector(button.dataset.target);
+    const url = new URL(button.dataset.url || window.location.href, window.location.origin);
+    url.searchParams.delete('cursor');
+    if (button.dataset.cursor) url.searchParams.set('cursor', button.dataset.cursor);
+
+    button.disabled = true;
+    // 'no-cache' revalidates with the stored ETag, so an unchanged page comes back as a 304
+    return fetch(url, {
+        headers: { 'X-Requested-With': 'XMLHttpRequest' },
+        credentials: 'same-origin',
+        cache: 'no-cache',
+    })
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) throw new Error(data.error || 'Could not load rows');
+            target.insertAdjacentHTML('beforeend', data.html);
+            button.dataset.loaded = 'true';
+            if (data.has_next) {
+                button.dataset.cursor = data.next_cursor;
+                button.disabled = false;
+                button.style.display = '';
+            } else {
+                button.style.display = 'none';
+            }
+            target.dispatchEvent(new CustomEvent('rows-loaded', { bubbles: true }));
+            return data;
+        })
+        .catch(error => {
+            console.error('Error loading rows:', error);
+            button.disabled = false;
+        });
+}
+
+// ── Server-side filters ───────────────────────────────────────────────────────
+// Reload the page with the given query parameters (empty values are removed)
+// starting again from the first page.
+function applyListFilters(params) {
+    const url = new URL(window.location.href);
+    url.searchParams.delete('cursor');
+    Object.entries(params).forEach(([key, value]) => {
+        if (value && value !== 'all') url.searchParams.set(key, value);
+        else url.searchParams.delete(key);
+    });
+    window.location.href = url.toString();
+}
+
+function debounce(fn, wait) {
+    let timer = null;
+    return function(...args) {
+        clearTimeout(timer);
+        timer = setTimeout(() => fn.apply(this, args), wait);
+    };
+}
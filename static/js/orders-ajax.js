@@ -171,24 +171,11 @@ document.addEventListener('click', function(e) {
 document.addEventListener('DOMContentLoaded', function() {
     const statusFilter = document.getElementById('statusFilter');
     if (statusFilter) {
+        // Filtering happens server-side so it covers every page, not just the loaded rows
         statusFilter.addEventListener('change', function() {
-            const selected = this.value.toLowerCase();
-            document.querySelectorAll('.orders-table tbody tr').forEach(row => {
-                const rowStatus = row.getAttribute('data-status');
-                row.style.display = (selected === 'all' || rowStatus === selected) ? '' : 'none';
-            });
+            applyListFilters({ status: this.value.toLowerCase() });
         });
     }
-
-    const filter = sessionStorage.getItem('orderFilter');
-    if (filter) {
-        document.querySelectorAll('.orders-table tbody tr').forEach(row => {
-            const badge  = row.querySelector('.status-badge');
-            const status = badge ? badge.textContent.trim().toLowerCase() : '';
-            row.style.display = (status === filter) ? '' : 'none';
-        });
-        window.addEventListener('beforeunload', () => sessionStorage.removeItem('orderFilter'));
-    }
 });
 
 // ── Close modals on outside click ────────────────────────────────────────────
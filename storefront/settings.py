@@ -10,12 +10,18 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 
+def env_int(name, default):
+    """Read an integer setting from the environment"""
+    return int(os.environ.get(name, default))
+
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/6.0/howto/deployment/checklist/
 
@@ -41,20 +47,26 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'pages.request_timing.RequestTimingMiddleware',
+    'pages.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'pages.query_inspection.QueryInspectionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'pages.db_routing.StickyPrimaryMiddleware',
+    'pages.profiling.ProfilerMiddleware',
 ]
 
 ROOT_URLCONF = 'storefront.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates that reports render time to RequestTimingMiddleware
+        'BACKEND': 'pages.request_timing.TimedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -63,6 +75,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'pages.context_processors.notifications',
             ],
         },
     },
@@ -77,10 +90,44 @@ WSGI_APPLICATION = 'storefront.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('DJANGO_DB_PATH', BASE_DIR / 'db.sqlite3'),
+        # Keep connections open between requests; health checks replace broken ones
+        'CONN_MAX_AGE': env_int('DJANGO_CONN_MAX_AGE', 600),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Take the write lock when a transaction starts, so it waits (busy_timeout)
+            # instead of failing with "database is locked" when it upgrades to a write
+            'transaction_mode': os.environ.get('SQLITE_TRANSACTION_MODE', 'IMMEDIATE'),
+        },
     }
 }
 
+# Optional read replica for reports, the dashboard and the list views (see
+# pages/db_routing.py). Locally this is a second SQLite file kept up to date
+# with `manage.py sync_replica --interval 30`.
+if os.environ.get('DJANGO_REPLICA_DB_PATH'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ['DJANGO_REPLICA_DB_PATH'],
+        'OPTIONS': {},
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['pages.db_routing.ReplicaRouter']
+
+# Seconds a browser keeps reading from the primary after it wrote something
+REPLICA_STICKY_SECONDS = env_int('REPLICA_STICKY_SECONDS', 10)
+
+# PRAGMAs applied to every new SQLite connection (see pages/db_tuning.py)
+SQLITE_PRAGMAS = {
+    'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': env_int('SQLITE_BUSY_TIMEOUT_MS', 5000),
+    'cache_size': env_int('SQLITE_CACHE_SIZE_KB', 65536) * -1,  # negative = KiB rather than pages
+    'mmap_size': env_int('SQLITE_MMAP_SIZE_MB', 256) * 1024 * 1024,
+    'temp_store': os.environ.get('SQLITE_TEMP_STORE', 'MEMORY'),
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -130,6 +177,59 @@ STATICFILES_DIRS = [
 # https://docs.djangoproject.com/en/6.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Dashboard statistics cache lifetime in seconds (also invalidated on writes; 0 disables caching)
+DASHBOARD_STATS_TTL = 30
+
+# Report N+1 query patterns and blown @query_budget limits: 'off', 'warn' (log) or 'raise'
+QUERY_INSPECTION = os.environ.get('QUERY_INSPECTION', 'warn' if DEBUG else 'off')
+
+# Times one query shape may run from the same place in a request before it counts as N+1
+QUERY_REPEAT_THRESHOLD = 3
+
+# Request timing: the slow request/query log, plus the Server-Timing header (view, db, tpl)
+REQUEST_TIMING = os.environ.get('REQUEST_TIMING', 'on') == 'on'
+
+# Who gets the Server-Timing header: 'staff', 'all' or 'off'. It reveals query
+# counts and timings, so keep it from anonymous visitors in production
+SERVER_TIMING_HEADER = os.environ.get('SERVER_TIMING_HEADER', 'staff')
+
+# Requests and single queries at least this slow (milliseconds) are logged
+SLOW_REQUEST_MS = env_int('SLOW_REQUEST_MS', 500)
+SLOW_QUERY_MS = env_int('SLOW_QUERY_MS', 100)
+
+# Request, query, cache and business metrics served at /metrics/ (see pages/metrics.py)
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'on') == 'on'
+
+# Directory shared by the worker processes; each writes its metrics there every
+# METRICS_FLUSH_SECONDS and /metrics/ adds them up. Unset = this process only.
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+METRICS_FLUSH_SECONDS = env_int('METRICS_FLUSH_SECONDS', 5)
+
+# Bearer token for scrapers (staff can open /metrics/ logged in)
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Superusers can profile a request with ?profile=1 or "X-Profile: 1" (see pages/profiling.py);
+# the newest PROFILE_MAX_CAPTURES captures are kept in PROFILE_DIR and listed at /admin/profiles/
+PROFILER_ENABLED = os.environ.get('PROFILER_ENABLED', 'on') == 'on'
+PROFILE_DIR = os.environ.get('PROFILE_DIR', BASE_DIR / 'profiles')
+PROFILE_MAX_CAPTURES = env_int('PROFILE_MAX_CAPTURES', 20)
+PROFILE_TOP_FUNCTIONS = 40
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'timestamped': {'format': '%(asctime)s %(levelname)s %(name)s: %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'timestamped'},
+    },
+    'loggers': {
+        'pages': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
+
 # Authentication settings
 LOGIN_URL = 'pages:login'
 LOGIN_REDIRECT_URL = 'pages:dashboard'
\ No newline at end of file
@@ -17,7 +17,13 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from pages.admin import profile_capture_view, profile_captures_view, profile_download_view
+
 urlpatterns = [
+    path('admin/profiles/', admin.site.admin_view(profile_captures_view), name='profile_captures'),
+    path('admin/profiles/<slug:capture_id>/', admin.site.admin_view(profile_capture_view), name='profile_capture'),
+    path('admin/profiles/<slug:capture_id>.prof', admin.site.admin_view(profile_download_view),
+         name='profile_download'),
     path('admin/', admin.site.urls),
     path('', include('pages.urls')),
 ]
\ No newline at end of file